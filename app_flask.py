@@ -10,17 +10,19 @@ warnings.filterwarnings('ignore', category=UserWarning, module='numba')
 
 from flask import Flask, render_template, request, session, redirect, url_for, jsonify
 from flask_socketio import SocketIO, emit
-import cv2
 import numpy as np
 import base64
-import face_recognition
 from database import DatabaseManager
-from facial_auth import FacialAuth
-from voice_auth import VoiceAuthChallenge
+from frame_ingestion import FrameIngestion
+from model_manager import model_manager
+from services import ServiceRegistry
 from config import Config
 import secrets
 import logging
+import multiprocessing
 import sys
+import threading
+import time
 from datetime import datetime
 
 app = Flask(__name__)
@@ -54,14 +56,150 @@ def log_and_print(message, level='info'):
     elif level == 'debug':
         logger.debug(message)
 
-# Inicializar servicios
-db = DatabaseManager()
-facial_auth = FacialAuth()
-voice_auth = VoiceAuthChallenge()
+def decode_frame(image):
+    """
+    Decodifica un frame JPEG recibido por Socket.IO.
+    Los clientes envían los bytes como adjunto binario; se aceptan también
+    data URLs base64 de clientes antiguos.
+    """
+    import cv2
+
+    if isinstance(image, str):
+        image = base64.b64decode(image.split(',', 1)[1])
+    return cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+
+def create_facial_auth():
+    """Motor facial (importa OpenCV y dlib)"""
+    from facial_auth import FacialAuth
+
+    facial_auth = FacialAuth()
+    if Config.FACE_DETECTION_BATCHING:
+        facial_auth.enable_detection_batching()
+    # Los trabajadores creados con 'spawn' reimportan este módulo: solo el proceso principal crea el pool
+    if Config.FACE_PROCESS_WORKERS > 0 and multiprocessing.parent_process() is None:
+        facial_auth.enable_process_pool()
+    return facial_auth
 
-# Variables globales para el proceso de verificación facial
+def create_face_index():
+    """Índice 1:N de rostros registrados para detectar duplicados"""
+    from face_index import FaceIndex
+
+    return FaceIndex.from_database(db, mode=Config.FACE_INDEX_MODE, encoder=Config.FACE_ENCODER)
+
+def create_voice_auth():
+    """Motor de voz (importa scipy, fastdtw y sounddevice)"""
+    from voice_auth import VoiceAuthChallenge
+
+    return VoiceAuthChallenge()
+
+# Inicializar servicios: los motores biométricos se cargan en el primer uso
+# o en segundo plano, así que importar este módulo no carga OpenCV ni librosa
+db = DatabaseManager()
+services = ServiceRegistry()
+facial_auth = services.register('facial_auth', create_facial_auth)
+face_index = services.register('face_index', create_face_index) if Config.FACE_DUPLICATE_SCREENING else None
+voice_auth = services.register('voice_auth', create_voice_auth)
+
+# Calentamiento (la sonda /ready informa de los tiempos); no en los trabajadores 'spawn'
+if multiprocessing.parent_process() is None:
+    if Config.SERVICES_WARMUP == 'eager':
+        services.warm_up_all()
+    elif Config.SERVICES_WARMUP == 'background':
+        services.start_background_warmup()
+
+# Estado de la verificación facial de cada conexión Socket.IO (sid -> estado)
 verification_state = {}
 
+# Plantillas faciales recogidas durante el registro (usuario -> estado)
+enrollment_state = {}
+
+# Ingestión de frames: solo se procesa el más reciente de cada sesión
+frame_ingestion = FrameIngestion(Config.FACE_FRAME_DEADLINE_MS)
+
+def new_enrollment_state():
+    """Estado de la recogida de plantillas de un registro facial"""
+    return {'templates': [], 'ready_frames': 0, 'attempts': 0, 'outliers': 0, 'started': None, 'hint': None}
+
+def collect_enrollment_template(enrollment, frame, face, face_chip):
+    """
+    Intenta añadir una plantilla de registro. Si la primera plantilla resulta
+    ser la atípica (las siguientes se descartan seguidas por quedar fuera de
+    la tolerancia) se reinicia la recogida con la toma actual. Retorna el
+    motivo del descarte o None
+    """
+    templates = enrollment['templates']
+    enrollment['attempts'] += 1
+
+    encoding = facial_auth._encode_face(frame, face, face_chip)
+    if encoding is None:
+        return 'encoding_failed'
+
+    reason = facial_auth.add_enrollment_template(templates, encoding)
+    if reason != 'outlier':
+        enrollment['outliers'] = 0
+        return reason
+
+    enrollment['outliers'] += 1
+    if len(templates) == 1 and enrollment['outliers'] >= Config.FACE_ENROLLMENT_OUTLIER_RESET:
+        templates[:] = [encoding]
+        enrollment['outliers'] = 0
+        return 'reset'
+    return reason
+
+def enrollment_collection_complete(enrollment):
+    """
+    Recogida terminada: plantillas suficientes o, si no se consiguen
+    (usuario inmóvil, frames descartados), tras el límite de intentos o de
+    tiempo, para capturar con las plantillas recogidas hasta el momento
+    """
+    if len(enrollment['templates']) >= Config.FACE_ENROLLMENT_TEMPLATES - 1:
+        return True
+    if enrollment['attempts'] >= Config.FACE_ENROLLMENT_MAX_ATTEMPTS:
+        return True
+    started = enrollment['started']
+    return started is not None and time.monotonic() - started >= Config.FACE_ENROLLMENT_TIMEOUT
+
+def verification_state_for(sid, username):
+    """
+    Estado de verificación de una conexión, creado con el primer frame. Cada
+    pestaña tiene su propio sid y por tanto su propio contexto de vivacidad.
+    Retorna None si el usuario no tiene rostro registrado
+    """
+    state = verification_state.get(sid)
+    if state is not None and state['username'] == username:
+        return state
+
+    stored_encoding = db.get_face_encoding(username)
+    if stored_encoding is None:
+        return None
+
+    release_verification_state(sid)
+    state = {
+        'username': username,
+        'identity_verified': False,
+        'stored_encoding': stored_encoding,
+        'liveness': facial_auth.context_pool.acquire(),
+        # Retenido mientras se procesa un frame: el contexto no se recicla a mitad de uso
+        'lock': threading.RLock(),
+        'released': False
+    }
+    current = verification_state.setdefault(sid, state)
+    if current is not state:
+        facial_auth.context_pool.release(state['liveness'])
+    return current
+
+def release_verification_state(sid):
+    """
+    Elimina el estado de verificación y recicla su contexto de vivacidad
+    cuando termina el frame que se esté procesando
+    """
+    state = verification_state.pop(sid, None)
+    if state is None:
+        return
+    with state['lock']:
+        state['released'] = True
+        facial_auth.context_pool.release(state['liveness'])
+
 @app.route('/')
 def index():
     """Página principal - redirige según autenticación"""
@@ -69,6 +207,23 @@ def index():
         return redirect(url_for('dashboard'))
     return redirect(url_for('login'))
 
+@app.route('/ready')
+def ready():
+    """Sonda de disponibilidad: subsistemas y modelos cargados y calentados, con sus tiempos"""
+    report = model_manager.report()
+    report['services'] = services.report()
+    report['template_cache'] = db.template_cache.stats()
+
+    errors = any(status.get('error') for status in list(report['models'].values()) + list(report['services'].values()))
+    if Config.SERVICES_WARMUP == 'lazy':
+        # Trabajadores de login/administración: listos mientras nada haya fallado
+        report['ready'] = not errors
+    else:
+        report['ready'] = report['ready'] and not errors and all(
+            status['warmup_ms'] is not None for status in report['services'].values()
+        )
+    return jsonify(report), 200 if report['ready'] else 503
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Página de login"""
@@ -164,15 +319,7 @@ def facial_verification():
     if stored_encoding is None:
         return redirect(url_for('verify_2fa'))
 
-    # Inicializar estado de verificación
-    verification_state[username] = {
-        'identity_verified': False,
-        'frames_verified': 0,
-        'blink_detected': False,
-        'mouth_detected': False,
-        'stored_encoding': stored_encoding
-    }
-
+    # El estado de verificación se crea con el primer frame de la conexión Socket.IO
     return render_template('facial_verification.html', username=username)
 
 @app.route('/facial_registration')
@@ -181,6 +328,9 @@ def facial_registration():
     if 'username' not in session:
         return redirect(url_for('login'))
 
+    # Empezar la recogida de plantillas desde cero
+    enrollment_state[session['username']] = new_enrollment_state()
+
     return render_template('facial_registration.html', username=session['username'])
 
 @app.route('/voice_verification')
@@ -281,6 +431,8 @@ def handle_connect():
 def handle_disconnect():
     """Cliente desconectado"""
     print(f"Cliente desconectado: {request.sid}")
+    frame_ingestion.discard(request.sid)
+    release_verification_state(request.sid)
 
 @socketio.on('video_frame')
 def handle_video_frame(data):
@@ -293,19 +445,39 @@ def handle_video_frame(data):
             return
 
         username = session['username']
+        sid = request.sid
 
-        if username not in verification_state:
-            emit('verification_error', {'error': 'Estado de verificación no inicializado'})
+        if verification_state_for(sid, username) is None:
+            emit('verification_error', {'error': 'No hay rostro registrado para este usuario'})
             return
 
-        state = verification_state[username]
+        # Si ya se está procesando un frame de esta sesión, este sustituye al pendiente
+        frame_ingestion.run(
+            (sid, 'video_frame'),
+            data,
+            lambda frame_data, dropped: process_video_frame(sid, username, frame_data, dropped)
+        )
 
-        # Decodificar imagen desde base64
-        img_data = base64.b64decode(data['image'].split(',')[1])
-        nparr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    except Exception as e:
+        print(f"Error procesando frame: {e}")
+        import traceback
+        traceback.print_exc()
+        emit('verification_error', {'error': str(e)})
 
-        if frame is None:
+def process_video_frame(sid, username, data, frames_dropped):
+    """Procesa el frame vigente de una sesión de verificación facial"""
+    state = verification_state.get(sid)
+    if state is None:
+        return
+
+    frame = decode_frame(data['image'])
+
+    if frame is None:
+        return
+
+    with state['lock']:
+        # La sesión terminó (desconexión o éxito) mientras se decodificaba el frame
+        if state['released']:
             return
 
         # Procesar frame con facial_auth
@@ -317,6 +489,7 @@ def handle_video_frame(data):
 
         # Enviar resultado al cliente (convertir numpy bool a Python bool)
         safe_result = {k: (bool(v) if isinstance(v, np.bool_) else v) for k, v in result.items()}
+        safe_result['frames_dropped'] = frames_dropped
         emit('verification_update', safe_result)
 
         # Si la verificación es exitosa, generar token temporal y marcar como autenticado
@@ -342,14 +515,7 @@ def handle_video_frame(data):
             })
 
             # Limpiar estado
-            if username in verification_state:
-                del verification_state[username]
-
-    except Exception as e:
-        print(f"Error procesando frame: {e}")
-        import traceback
-        traceback.print_exc()
-        emit('verification_error', {'error': str(e)})
+            release_verification_state(sid)
 
 @socketio.on('register_frame')
 def handle_register_frame(data):
@@ -363,33 +529,64 @@ def handle_register_frame(data):
 
         username = session['username']
 
-        # Decodificar imagen desde base64
-        img_data = base64.b64decode(data['image'].split(',')[1])
-        nparr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-
-        if frame is None:
-            return
-
-        # Detectar rostro
-        face = facial_auth._detect_face_dnn(frame)
-
-        if face:
-            x1, y1, x2, y2, conf = face
-            face_data = {
-                'detected': True,
-                'confidence': float(conf),
-                'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
-                'ready': bool(conf > 0.7)
-            }
-            emit('face_detected', face_data)
-        else:
-            emit('face_detected', {'detected': False})
+        frame_ingestion.run(
+            (request.sid, 'register_frame'), data,
+            lambda frame_data, dropped: process_register_frame(username, frame_data, dropped)
+        )
 
     except Exception as e:
         print(f"Error en registro: {e}")
         emit('registration_error', {'error': str(e)})
 
+def process_register_frame(username, data, frames_dropped):
+    """Procesa el frame vigente de una sesión de registro facial"""
+    frame = decode_frame(data['image'])
+
+    if frame is None:
+        return
+
+    # Detectar rostro
+    face = facial_auth._detect_face_dnn(frame)
+    enrollment = enrollment_state.setdefault(username, new_enrollment_state())
+    templates = enrollment['templates']
+
+    if face:
+        x1, y1, x2, y2, conf = face
+
+        # Filtro de calidad: no dar el rostro por listo con frames inservibles
+        face_chip = facial_auth._extract_face_chip(frame, face)
+        quality_issue = facial_auth._assess_face_quality(face, face_chip)
+        ready = bool(conf > 0.7) and quality_issue is None
+
+        # Recoger plantillas adicionales mientras el usuario se coloca
+        # (la captura final aporta la última)
+        collection_complete = enrollment_collection_complete(enrollment)
+        if ready and not collection_complete:
+            if enrollment['started'] is None:
+                enrollment['started'] = time.monotonic()
+            enrollment['ready_frames'] += 1
+            if enrollment['ready_frames'] % Config.FACE_ENROLLMENT_FRAME_STRIDE == 0:
+                enrollment['hint'] = collect_enrollment_template(enrollment, frame, face, face_chip)
+                collection_complete = enrollment_collection_complete(enrollment)
+
+        face_data = {
+            'detected': True,
+            'confidence': float(conf),
+            'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
+            'ready': ready,
+            'templates_collected': len(templates),
+            'templates_required': Config.FACE_ENROLLMENT_TEMPLATES,
+            'collection_complete': collection_complete,
+            'quality_hint': quality_issue,
+            'enrollment_hint': enrollment['hint'],
+            'message': facial_auth.QUALITY_HINTS.get(quality_issue) or
+                       (None if collection_complete else facial_auth.ENROLLMENT_HINTS.get(enrollment['hint'])),
+            'frames_dropped': frames_dropped
+        }
+        emit('face_detected', face_data)
+    else:
+        emit('face_detected', {'detected': False, 'frames_dropped': frames_dropped})
+
 @socketio.on('capture_face')
 def handle_capture_face(data):
     """
@@ -402,25 +599,55 @@ def handle_capture_face(data):
 
         username = session['username']
 
-        # Decodificar imagen desde base64
-        img_data = base64.b64decode(data['image'].split(',')[1])
-        nparr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = decode_frame(data['image'])
 
         if frame is None:
             emit('registration_error', {'error': 'Error al decodificar imagen'})
             return
 
-        # Extraer encoding
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        locations = face_recognition.face_locations(rgb, model="hog")
+        # Extraer encoding sobre el chip del rostro (HOG solo como respaldo)
+        face = facial_auth._detect_face_dnn(frame)
+        face_chip = facial_auth._extract_face_chip(frame, face)
+
+        quality_issue = facial_auth._assess_face_quality(face, face_chip)
+        if quality_issue is not None:
+            emit('registration_error', {'error': facial_auth.QUALITY_HINTS[quality_issue]})
+            return
+
+        rgb, locations = facial_auth._identity_input(frame, face, face_chip)
 
         if locations:
-            encodings = face_recognition.face_encodings(rgb, locations)
+            encodings = facial_auth._face_encodings(rgb, locations)
 
             if encodings:
-                encoding = encodings[0]
-                db.save_face_encoding(username, encoding)
+                # Plantillas recogidas durante el registro + la captura final
+                templates = list(enrollment_state.get(username, {}).get('templates', []))
+                reason = facial_auth.add_enrollment_template(templates, encodings[0])
+                if reason == 'outlier':
+                    # Las plantillas recogidas no son del rostro capturado: recoger de nuevo
+                    print(f"⚠️ Captura final de {username} fuera de la tolerancia de sus plantillas")
+                    enrollment_state[username] = new_enrollment_state()
+                    emit('registration_error', {
+                        'error': 'El rostro capturado no coincide con las tomas previas. '
+                                 + facial_auth.ENROLLMENT_HINTS['outlier']
+                    })
+                    return
+                face_template = facial_auth.build_template_matrix(templates)
+
+                # Rechazar rostros ya registrados con otro usuario
+                if face_index is not None:
+                    # El índice guarda distancias brutas del encoder: escalar la tolerancia
+                    tolerance = facial_auth.tolerance * facial_auth.encoder.distance_scale
+                    for template in templates:
+                        duplicates = face_index.find_duplicates(template, tolerance, exclude=username)
+                        if duplicates:
+                            print(f"⚠️ Rostro de {username} coincide con {duplicates[0][0]} ({duplicates[0][1]:.3f})")
+                            emit('registration_error', {'error': 'Este rostro ya está registrado con otro usuario'})
+                            return
+
+                db.save_face_encoding(username, face_template)
+                enrollment_state.pop(username, None)
+                print(f"✅ {len(templates)} plantillas faciales ({facial_auth.encoder.name}) guardadas para {username}")
 
                 # Limpiar flag de registro si está registrándose
                 if session.get('registering'):
@@ -475,230 +702,68 @@ def handle_verify_voice(data):
 
         log_and_print(f"✓ Muestra de voz encontrada en BD", 'info')
 
-        # Decodificar audio desde base64
-        import base64
-        audio_data = base64.b64decode(data['audio'].split(',')[1])
-        log_and_print(f"✓ Audio decodificado: {len(audio_data)} bytes", 'info')
-
-        # Guardar temporalmente
-        import tempfile
-        with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_audio:
-            temp_audio.write(audio_data)
-            temp_path = temp_audio.name
-
-        log_and_print(f"✓ Audio guardado temporalmente: {temp_path}", 'debug')
-
-        # Convertir webm a wav usando ffmpeg o librosa
-        import librosa
-        import soundfile as sf
-
-        audio, sr = librosa.load(temp_path, sr=16000)
-        log_and_print(f"✓ Audio cargado: {len(audio)/sr:.2f}s a {sr}Hz", 'info')
-
-        # Guardar como wav temporal
-        wav_path = temp_path.replace('.webm', '.wav')
-        sf.write(wav_path, audio, sr)
-        log_and_print(f"✓ Audio convertido a WAV: {wav_path}", 'debug')
-
-        # VALIDAR QUE EL USUARIO DIJO LOS NÚMEROS CORRECTOS DEL DESAFÍO
-        if 'challenge' in data:
-            expected_challenge = data['challenge']
-            log_and_print(f"\n🔐 VALIDANDO DESAFÍO DE NÚMEROS:", 'info')
-            log_and_print(f"  Desafío esperado: {expected_challenge}", 'info')
-
-            is_challenge_valid, transcription, extracted_nums = voice_auth._validate_challenge_response(audio, expected_challenge)
-
-            if transcription:
-                log_and_print(f"  Transcripción: \"{transcription}\"", 'info')
-                log_and_print(f"  Números extraídos: {extracted_nums}", 'info')
-
-            if not is_challenge_valid:
-                import os
-                os.remove(temp_path)
-                os.remove(wav_path)
-                db.log_login_attempt(username, False, "voice")
-                log_and_print(f"\n{'='*80}", 'error')
-                log_and_print(f"❌ VERIFICACIÓN RECHAZADA - Números pronunciados incorrectos", 'error')
-                log_and_print(f"{'='*80}\n", 'error')
-                emit('voice_verification_result', {
-                    'success': False,
-                    'message': f'Los números pronunciados no coinciden con el desafío. Transcripción: "{transcription if transcription else "No detectada"}"'
-                })
-                return
+        # Decodificar audio en memoria (WAV/PCM sin decodificador, WebM/Ogg con PyAV o ffmpeg)
+        audio = voice_auth.decoder.decode_upload(data['audio'])
+        log_and_print(f"✓ Audio decodificado: {len(audio)/voice_auth.sample_rate:.2f}s a {voice_auth.sample_rate}Hz", 'info')
 
-            log_and_print(f"  ✅ Números validados correctamente", 'info')
-        else:
+        expected_challenge = data.get('challenge')
+        if expected_challenge is None:
             log_and_print(f"  ⚠️  No se recibió desafío - omitiendo validación de números", 'warning')
 
-        # Procesar audio con voice_auth
-        import numpy as np
+        def on_stage(result):
+            """Registra cada etapa y la envía al cliente en cuanto termina"""
+            log_and_print(f"\n{'✅' if result['passed'] else '❌'} {result['label'].upper()}: {result['message']}",
+                          'info' if result['passed'] else 'warning')
+            for detail in result['details']:
+                log_and_print(f"  {detail}", 'info')
+            emit('voice_verification_progress', {
+                'stage': result['stage'],
+                'label': result['label'],
+                'passed': result['passed'],
+                'message': result['message'],
+                'completed': result['completed'],
+                'total': result['total'],
+            })
 
-        log_and_print(f"\n📊 PROCESANDO AUDIO:", 'info')
-        # Normalizar y procesar
-        audio = voice_auth._normalize_audio(audio)
-        log_and_print(f"  ✓ Después de normalizar: {len(audio)/voice_auth.sample_rate:.2f}s", 'info')
+        # Desafío (STT) y hablante (características, vivacidad, comparación) en
+        # paralelo: la primera etapa que falla rechaza sin esperar a las demás
+        log_and_print(f"\n⚡ VERIFICANDO DESAFÍO Y HABLANTE EN PARALELO:", 'info')
+        outcome = voice_auth.verification.run(audio, stored_sample, expected_challenge, on_stage=on_stage)
 
-        audio = voice_auth._apply_bandpass_filter(audio)
-        log_and_print(f"  ✓ Después de filtro: {len(audio)/voice_auth.sample_rate:.2f}s", 'info')
+        log_and_print(f"\n{'='*80}", 'info')
+        if outcome['success']:
+            log_and_print(f"✅ RESULTADO FINAL: VERIFICACIÓN EXITOSA ({outcome['elapsed']*1000:.0f} ms)", 'info')
+        else:
+            log_and_print(f"❌ RESULTADO FINAL: VERIFICACIÓN RECHAZADA en etapa '{outcome['stage']}' "
+                          f"({outcome['elapsed']*1000:.0f} ms)", 'warning')
+        log_and_print(f"{'='*80}", 'info')
 
-        audio = voice_auth._remove_silence(audio)
-        log_and_print(f"  ✓ Después de eliminar silencio: {len(audio)/voice_auth.sample_rate:.2f}s", 'info')
+        if outcome['success']:
+            # Generar token temporal
+            import uuid
+            temp_token = str(uuid.uuid4())
 
-        # Extraer características
-        log_and_print(f"\n🔍 EXTRAYENDO CARACTERÍSTICAS:", 'info')
-        mfcc_features, speaker_embedding, prosodic_features = voice_auth._process_audio(audio)
+            if not hasattr(app, 'auth_tokens'):
+                app.auth_tokens = {}
+            app.auth_tokens[temp_token] = username
+
+            db.log_login_attempt(username, True, "voice")
+            db.update_last_login(username)
 
-        if mfcc_features is None:
-            import os
-            os.remove(temp_path)
-            os.remove(wav_path)
-            log_and_print(f"❌ RECHAZADO: Audio muy corto o inválido", 'error')
+            log_and_print(f"\n🎉 Usuario {username} AUTENTICADO con éxito", 'info')
+            log_and_print(f"Token generado: {temp_token[:8]}...", 'debug')
             emit('voice_verification_result', {
-                'success': False,
-                'message': 'Audio muy corto o inválido'
+                'success': bool(True),
+                'redirect': str(url_for('verify_token', token=temp_token))
             })
-            return
-
-        log_and_print(f"  ✓ MFCC features extraídos: {mfcc_features.shape}", 'info')
-        log_and_print(f"  ✓ Speaker embedding extraído: {speaker_embedding.shape}", 'info')
-
-        # Verificar vivacidad
-        log_and_print(f"\n🔒 VERIFICANDO VIVACIDAD (Anti-Spoofing):", 'info')
-        if voice_auth.enable_liveness:
-            is_live, confidence, messages = voice_auth._check_liveness(prosodic_features)
-            log_and_print(f"  Resultado: {'✓ VIVO' if is_live else '❌ SINTÉTICO/GRABACIÓN'}", 'warning' if not is_live else 'info')
-            log_and_print(f"  Confianza: {confidence*100:.1f}%", 'info')
-            for msg in messages:
-                log_and_print(f"    {msg}", 'info')
-
-            # CRÍTICO: Si falla la verificación de vivacidad, rechazar inmediatamente
-            if not is_live:
-                import os
-                os.remove(temp_path)
-                os.remove(wav_path)
-                db.log_login_attempt(username, False, "voice")
-                log_and_print(f"\n{'='*80}", 'error')
-                log_and_print(f"❌ VERIFICACIÓN RECHAZADA - Detección de vivacidad falló", 'error')
-                log_and_print(f"{'='*80}\n", 'error')
-                emit('voice_verification_result', {
-                    'success': False,
-                    'message': f'Detección de vivacidad falló - posible audio sintético o grabación (confianza: {confidence*100:.1f}%)'
-                })
-                return
         else:
-            log_and_print(f"  ⚠️  Verificación de vivacidad DESHABILITADA", 'warning')
-
-        # Comparar con muestras almacenadas
-        log_and_print(f"\n🔬 COMPARANDO CON PERFIL DE VOZ ALMACENADO:", 'info')
-        version = stored_sample.get('version', 'unknown')
-        stored_samples = stored_sample.get('samples', [])
-        log_and_print(f"  Versión del perfil: {version}", 'info')
-        log_and_print(f"  Muestras almacenadas: {len(stored_samples)}", 'info')
-
-        similarities = []
-        use_embeddings = version == 'challenge-response-v2'
-        log_and_print(f"  Método de comparación: {'Speaker Embeddings' if use_embeddings else 'DTW sobre MFCC'}", 'info')
-
-        for idx, sample in enumerate(stored_samples):
-            if use_embeddings and 'embedding' in sample:
-                stored_embedding = sample['embedding']
-                similarity = voice_auth._compare_embeddings(speaker_embedding, stored_embedding)
-            else:
-                stored_mfcc = sample['mfcc']
-                similarity, _ = voice_auth._compare_features_dtw(mfcc_features, stored_mfcc)
-
-            similarities.append(similarity)
-            log_and_print(f"    Muestra {idx+1}: {similarity*100:.2f}%", 'info')
-
-        # Calcular similitud final con múltiples métricas
-        log_and_print(f"\n📈 ANÁLISIS DE SIMILITUD:", 'info')
-        if similarities:
-
-            # Calcular métricas
-            top_3_similarities = sorted(similarities, reverse=True)[:3]
-            avg_similarity = np.mean(similarities)
-            top_3_avg = np.mean(top_3_similarities)
-            max_similarity = np.max(similarities)
-            min_similarity = np.min(similarities)
-
-            # Usar el promedio de las 3 mejores como similitud final
-            final_similarity = top_3_avg
-
-            log_and_print(f"  Promedio general: {avg_similarity*100:.2f}%", 'info')
-            log_and_print(f"  Promedio top-3: {top_3_avg*100:.2f}%", 'info')
-            log_and_print(f"  Máxima: {max_similarity*100:.2f}%", 'info')
-            log_and_print(f"  Mínima: {min_similarity*100:.2f}%", 'info')
-            log_and_print(f"  Umbral requerido: {voice_auth.similarity_threshold*100:.2f}%", 'info')
-
-            # Verificaciones de seguridad ajustadas para distancia euclidiana
-            log_and_print(f"\n🔐 VERIFICACIONES DE SEGURIDAD MULTI-CAPA:", 'info')
-            log_and_print(f"  (Configuración actual en config.py: VOICE_SIMILARITY_THRESHOLD={voice_auth.similarity_threshold})", 'info')
-
-            # Umbrales ajustados para distancia euclidiana (rango 30-62% vs antiguo 80-99%)
-            # Usuario legítimo: ~58-62%, impostor: ~30%
-            high_similarity_45 = sum(1 for s in similarities if s >= 0.45)  # Ajustado de 80% a 45%
-            high_similarity_50 = sum(1 for s in similarities if s >= 0.50)  # Ajustado de 85% a 50%
-            std_dev = np.std(similarities)
-
-            check1 = final_similarity >= voice_auth.similarity_threshold
-            check2 = high_similarity_45 >= 4  # Al menos 4 de 5 muestras >= 45%
-            check3 = high_similarity_50 >= 3  # Al menos 3 de 5 muestras >= 50%
-            check4 = std_dev < 0.12  # Relajado de 0.08 a 0.12 para distancia euclidiana
-
-            log_and_print(f"  [{'✓' if check1 else '❌'}] Similitud promedio top-3 >= {voice_auth.similarity_threshold*100:.0f}%: {final_similarity*100:.2f}%", 'info')
-            log_and_print(f"  [{'✓' if check2 else '❌'}] Al menos 4 de 5 muestras >= 45%: {high_similarity_45}/5", 'info')
-            log_and_print(f"  [{'✓' if check3 else '❌'}] Al menos 3 de 5 muestras >= 50%: {high_similarity_50}/5", 'info')
-            log_and_print(f"  [{'✓' if check4 else '❌'}] Alta consistencia (std < 0.12): {std_dev:.3f}", 'info')
-
-            is_match = check1 and check2 and check3 and check4
-
-            log_and_print(f"\n{'='*80}", 'info')
-            if is_match:
-                log_and_print(f"✅ RESULTADO FINAL: VERIFICACIÓN EXITOSA", 'info')
-            else:
-                log_and_print(f"❌ RESULTADO FINAL: VERIFICACIÓN RECHAZADA", 'warning')
-            log_and_print(f"{'='*80}", 'info')
-
-            # Limpiar archivos temporales
-            import os
-            os.remove(temp_path)
-            os.remove(wav_path)
-            log_and_print(f"✓ Archivos temporales eliminados", 'debug')
-
-            if is_match:
-                # Generar token temporal
-                import uuid
-                temp_token = str(uuid.uuid4())
-
-                if not hasattr(app, 'auth_tokens'):
-                    app.auth_tokens = {}
-                app.auth_tokens[temp_token] = username
-
-                db.log_login_attempt(username, True, "voice")
-                db.update_last_login(username)
-
-                log_and_print(f"\n🎉 Usuario {username} AUTENTICADO con éxito", 'info')
-                log_and_print(f"Token generado: {temp_token[:8]}...", 'debug')
-                emit('voice_verification_result', {
-                    'success': bool(True),
-                    'redirect': str(url_for('verify_token', token=temp_token))
-                })
-            else:
-                db.log_login_attempt(username, False, "voice")
-                log_and_print(f"\n⛔ Usuario {username} - Acceso DENEGADO", 'warning')
-                log_and_print(f"Razón: Similitud insuficiente ({final_similarity*100:.2f}%)", 'warning')
-                emit('voice_verification_result', {
-                    'success': bool(False),
-                    'message': f'Similitud insuficiente ({float(final_similarity)*100:.2f}%)'
-                })
-        else:
-            import os
-            os.remove(temp_path)
-            os.remove(wav_path)
-            log_and_print(f"❌ Error: No se pudieron calcular similitudes", 'error')
+            db.log_login_attempt(username, False, "voice")
+            log_and_print(f"\n⛔ Usuario {username} - Acceso DENEGADO", 'warning')
+            log_and_print(f"Razón: {outcome['message']}", 'warning')
             emit('voice_verification_result', {
-                'success': False,
-                'message': 'Error en comparación de voz'
+                'success': bool(False),
+                'stage': outcome['stage'],
+                'message': str(outcome['message'])
             })
 
     except Exception as e:
@@ -728,37 +793,19 @@ def handle_register_voice(data):
             emit('voice_error', {'error': 'Se requieren 5 muestras'})
             return
 
-        import base64
-        import tempfile
-        import librosa
-        import soundfile as sf
-        import numpy as np
-
         processed_samples = []
 
         for idx, sample_data in enumerate(samples_data):
-            # Decodificar audio
-            audio_data = base64.b64decode(sample_data['audio'].split(',')[1])
-
-            # Guardar temporalmente
-            with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_audio:
-                temp_audio.write(audio_data)
-                temp_path = temp_audio.name
+            # Decodificar audio en memoria, sin archivos temporales
+            audio = voice_auth.decoder.decode_upload(sample_data['audio'])
 
-            # Convertir a wav
-            audio, sr = librosa.load(temp_path, sr=16000)
-
-            # Procesar audio
-            audio = voice_auth._normalize_audio(audio)
-            audio = voice_auth._apply_bandpass_filter(audio)
-            audio = voice_auth._remove_silence(audio)
+            # Procesar audio (cada etapa una sola vez)
+            audio = voice_auth.preprocess(audio)
 
             # Extraer características
             mfcc_features, speaker_embedding, prosodic_features = voice_auth._process_audio(audio)
 
             if mfcc_features is None:
-                import os
-                os.remove(temp_path)
                 emit('voice_error', {'error': f'Muestra {idx+1} inválida'})
                 return
 
@@ -781,10 +828,6 @@ def handle_register_voice(data):
                 'challenge': sample_data['challenge']
             })
 
-            # Limpiar
-            import os
-            os.remove(temp_path)
-
             print(f"Processed sample {idx+1}/5 - Quality: {quality:.2f}")
 
         # Guardar todas las muestras
@@ -0,0 +1,188 @@
+"""
+Ingesta de audio en memoria
+Las grabaciones recibidas por Socket.IO se decodifican directamente a float32
+mono a la frecuencia de voz, sin archivos temporales:
+- WAV y PCM crudo: ruta rápida, las muestras se leen de los bytes sin decodificador
+- WebM/Opus, Ogg y demás contenedores: PyAV (FFmpeg dentro del proceso, sin
+  lanzar nada por petición) si está instalado, o ffmpeg por tubería
+  (stdin -> stdout) en su defecto
+
+PCM crudo se indica con el tipo MIME 'audio/pcm', con parámetros opcionales
+rate (Hz), channels y format ('s16le' o 'f32le'), p. ej.
+'audio/pcm;rate=48000;format=f32le'.
+"""
+
+import base64
+import io
+import shutil
+import subprocess
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+PCM_FORMATS = {'s16le': '<i2', 'f32le': '<f4'}
+
+
+class AudioDecodeError(ValueError):
+    """Audio con formato no reconocido o que el decodificador no pudo leer"""
+
+
+def read_upload(payload):
+    """
+    Bytes y tipo MIME de una subida: data URL base64 (clientes web) o bytes
+    enviados como adjunto binario de Socket.IO. Retorna (bytes, mime o None)
+    """
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return bytes(payload), None
+
+    header, _, encoded = payload.partition(',')
+    if not encoded:
+        return base64.b64decode(header), None
+    mime = header[len('data:'):].split(';base64')[0] if header.startswith('data:') else None
+    return base64.b64decode(encoded), mime
+
+
+def _mime_params(mime):
+    """'audio/pcm;rate=48000' -> ('audio/pcm', {'rate': '48000'})"""
+    if not mime:
+        return None, {}
+    kind, *params = [part.strip() for part in mime.split(';')]
+    return kind.lower(), dict(param.split('=', 1) for param in params if '=' in param)
+
+
+def sniff_format(data, mime=None):
+    """Formato por la firma de los primeros bytes: 'wav', 'webm', 'ogg', 'pcm' o None"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+        return 'wav'
+    if data[:4] == b'\x1a\x45\xdf\xa3':
+        return 'webm'
+    if data[:4] == b'OggS':
+        return 'ogg'
+    kind, _ = _mime_params(mime)
+    if kind in ('audio/pcm', 'audio/x-pcm', 'audio/raw'):
+        return 'pcm'
+    return None
+
+
+def to_float32_mono(audio, rate, sample_rate):
+    """Enteros a [-1, 1], mezcla de canales y remuestreo a sample_rate"""
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if np.issubdtype(audio.dtype, np.unsignedinteger):
+        # WAV de 8 bits: sin signo centrado en 128
+        audio = (audio.astype(np.float32) - 128) / 128.0
+    elif np.issubdtype(audio.dtype, np.integer):
+        audio = audio / float(np.iinfo(audio.dtype).max)
+    if rate != sample_rate:
+        audio = resample_poly(audio, sample_rate, rate)
+    return np.asarray(audio, dtype=np.float32)
+
+
+class AudioDecoder:
+    """
+    Decodificador de grabaciones en memoria. El backend de los formatos
+    comprimidos se elige una vez: 'pyav', 'ffmpeg' o 'auto' (el primero
+    disponible); sin ninguno solo se aceptan WAV y PCM
+    """
+
+    def __init__(self, sample_rate, backend='auto', timeout=10.0):
+        self.sample_rate = sample_rate
+        self.timeout = timeout
+        self._av = None
+        self._ffmpeg = None
+        self.backend = self._resolve_backend(backend)
+
+    def _resolve_backend(self, backend):
+        if backend in ('auto', 'pyav'):
+            try:
+                import av
+                self._av = av
+                return 'pyav'
+            except ImportError:
+                if backend == 'pyav':
+                    raise AudioDecodeError("PyAV no está instalado (pip install av)")
+
+        if backend in ('auto', 'ffmpeg'):
+            self._ffmpeg = shutil.which('ffmpeg')
+            if self._ffmpeg:
+                return 'ffmpeg'
+            if backend == 'ffmpeg':
+                raise AudioDecodeError("No se encontró ffmpeg en el PATH")
+
+        if backend not in ('auto', 'pyav', 'ffmpeg'):
+            raise AudioDecodeError(f"Decodificador de audio desconocido: {backend}")
+        return None
+
+    def decode_upload(self, payload):
+        """Decodifica una subida (data URL o bytes) a float32 mono"""
+        data, mime = read_upload(payload)
+        return self.decode(data, mime)
+
+    def decode(self, data, mime=None):
+        """Bytes de audio a float32 mono a self.sample_rate"""
+        if not data:
+            raise AudioDecodeError("Audio vacío")
+
+        audio_format = sniff_format(data, mime)
+        if audio_format == 'wav':
+            return self.decode_wav(data)
+        if audio_format == 'pcm':
+            _, params = _mime_params(mime)
+            return self.decode_pcm(data, int(params.get('rate', self.sample_rate)),
+                                   int(params.get('channels', 1)), params.get('format', 's16le'))
+
+        if self.backend == 'pyav':
+            return self._decode_pyav(data)
+        if self.backend == 'ffmpeg':
+            return self._decode_ffmpeg(data)
+        raise AudioDecodeError(
+            f"Formato {audio_format or mime or 'desconocido'} no soportado sin PyAV ni ffmpeg")
+
+    def decode_wav(self, data):
+        """WAV sin decodificador: lectura directa de las muestras"""
+        try:
+            rate, audio = wavfile.read(io.BytesIO(data))
+        except ValueError as e:
+            raise AudioDecodeError(f"WAV inválido: {e}")
+        return to_float32_mono(audio, rate, self.sample_rate)
+
+    def decode_pcm(self, data, rate, channels=1, sample_format='s16le'):
+        """PCM crudo intercalado sin cabecera"""
+        if sample_format not in PCM_FORMATS:
+            raise AudioDecodeError(f"Formato PCM no soportado: {sample_format}")
+        dtype = np.dtype(PCM_FORMATS[sample_format])
+        usable = len(data) - len(data) % (dtype.itemsize * channels)
+        audio = np.frombuffer(data, dtype=dtype, count=usable // dtype.itemsize)
+        return to_float32_mono(audio.reshape(-1, channels) if channels > 1 else audio, rate, self.sample_rate)
+
+    def _decode_pyav(self, data):
+        """Demuxer, decodificador y remuestreador de FFmpeg dentro del proceso"""
+        av = self._av
+        chunks = []
+        try:
+            with av.open(io.BytesIO(data), mode='r') as container:
+                if not container.streams.audio:
+                    raise AudioDecodeError("El archivo no contiene audio")
+                resampler = av.AudioResampler(format='flt', layout='mono', rate=self.sample_rate)
+                for frame in container.decode(container.streams.audio[0]):
+                    chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+                chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+        except av.error.FFmpegError as e:
+            raise AudioDecodeError(f"No se pudo decodificar el audio: {e}")
+        return np.concatenate(chunks).astype(np.float32, copy=False) if chunks else np.zeros(0, np.float32)
+
+    def _decode_ffmpeg(self, data):
+        """Un proceso ffmpeg por tubería: bytes por stdin, float32 por stdout"""
+        command = [
+            self._ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-i', 'pipe:0',
+            '-f', 'f32le', '-ac', '1', '-ar', str(self.sample_rate), 'pipe:1',
+        ]
+        try:
+            result = subprocess.run(command, input=data, capture_output=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise AudioDecodeError("ffmpeg no terminó a tiempo")
+        if result.returncode != 0:
+            raise AudioDecodeError(f"ffmpeg: {result.stderr.decode(errors='replace').strip()}")
+        return np.frombuffer(result.stdout, dtype='<f4')
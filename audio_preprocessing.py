@@ -0,0 +1,125 @@
+"""
+Preprocesamiento de audio de voz en una sola pasada
+Normalización, filtro pasabanda y recorte de silencios se aplican como
+etapas registradas en el propio buffer, así ninguna se ejecuta dos veces
+aunque el audio pase por varias capas (manejador web y _process_audio).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import butter, sosfiltfilt
+
+# Etapas en orden de aplicación y su texto para los logs
+STAGES = ('normalize', 'bandpass', 'trim_silence')
+STAGE_LABELS = {
+    'normalize': "Normalizado",
+    'bandpass': "Filtrado",
+    'trim_silence': "Silencios eliminados",
+}
+
+
+@lru_cache(maxsize=16)
+def bandpass_sos(sample_rate, lowcut, highcut, order=4):
+    """Diseño Butterworth en secciones de segundo orden, cacheado por frecuencia de muestreo"""
+    nyquist = sample_rate / 2
+    return butter(order, [lowcut / nyquist, highcut / nyquist], btype='band', output='sos')
+
+
+class AudioBuffer:
+    """Muestras de audio junto con las etapas de preprocesamiento ya aplicadas"""
+
+    def __init__(self, samples, sample_rate, stages=()):
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.stages = tuple(stages)
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class PreprocessingPipeline:
+    """Cadena normalizar -> pasabanda -> recortar silencios"""
+
+    def __init__(self, sample_rate, lowcut=300, highcut=3400, order=4,
+                 silence_threshold=0.01, window_seconds=0.02, min_seconds=0.5):
+        self.sample_rate = sample_rate
+        self.lowcut = lowcut
+        self.highcut = highcut
+        self.order = order
+        self.silence_threshold = silence_threshold
+        self.window_seconds = window_seconds
+        self.min_seconds = min_seconds
+
+    def run(self, audio, on_stage=None):
+        """
+        Aplica las etapas que falten. Acepta un array (sin etapas) o un
+        AudioBuffer; on_stage(etapa, buffer) se llama tras cada etapa aplicada
+        """
+        if isinstance(audio, AudioBuffer):
+            buffer = audio
+        else:
+            buffer = AudioBuffer(audio, self.sample_rate)
+
+        for stage in STAGES:
+            if stage in buffer.stages:
+                continue
+            samples = getattr(self, stage)(buffer.samples, buffer.sample_rate)
+            buffer = AudioBuffer(samples, buffer.sample_rate, buffer.stages + (stage,))
+            if on_stage:
+                on_stage(stage, buffer)
+        return buffer
+
+    def normalize(self, audio, sample_rate=None):
+        """Normaliza el audio al rango [-1, 1]"""
+        audio = np.asarray(audio, dtype=np.float32)
+        max_val = np.max(np.abs(audio)) if len(audio) else 0
+        if max_val > 0:
+            audio = audio / max_val
+        return audio
+
+    def bandpass(self, audio, sample_rate=None):
+        """Filtro pasabanda de fase cero para voz humana"""
+        sos = bandpass_sos(sample_rate or self.sample_rate, self.lowcut, self.highcut, self.order)
+        return sosfiltfilt(sos, audio)
+
+    def trim_silence(self, audio, sample_rate=None):
+        """
+        Elimina silencios del inicio y final: energía por ventanas de 20 ms
+        calculada de una vez sobre una vista (ventanas, muestras) del audio
+        """
+        sample_rate = sample_rate or self.sample_rate
+        window_size = int(sample_rate * self.window_seconds)
+
+        # Si el audio es muy corto, no procesar
+        if len(audio) < window_size * 2:
+            return audio
+
+        n_windows = len(range(0, len(audio) - window_size, window_size))
+        windows = audio[:n_windows * window_size].reshape(n_windows, window_size)
+        energy = np.einsum('ij,ij->i', windows, windows)
+
+        if np.max(energy) > 0:
+            energy = energy / np.max(energy)
+
+        voice_indices = np.flatnonzero(energy > self.silence_threshold)
+
+        # Si no hay suficientes índices, retornar audio completo
+        if len(voice_indices) == 0:
+            return audio
+
+        # Añadir margen para no cortar demasiado
+        start_idx = max(0, (voice_indices[0] - 1) * window_size)
+        end_idx = min(len(audio), (voice_indices[-1] + 2) * window_size)
+
+        trimmed_audio = audio[start_idx:end_idx]
+
+        # Asegurar que el audio resultante no sea demasiado corto
+        if len(trimmed_audio) < sample_rate * self.min_seconds:
+            return audio
+
+        return trimmed_audio
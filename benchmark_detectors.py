@@ -0,0 +1,131 @@
+"""
+Informe de precisión y latencia de los backends del detector de rostros
+
+Uso:
+    python benchmark_detectors.py <directorio_imagenes>
+    python benchmark_detectors.py <directorio_imagenes> --annotations cajas.csv
+    python benchmark_detectors.py <directorio_imagenes> --configs ssd:300,ssd:160,yunet:320
+
+Sin anotaciones se asume un rostro por imagen y se informa la tasa de detección.
+Con un CSV (archivo,x1,y1,x2,y2) se informa el recall con IoU >= 0.5.
+"""
+
+import argparse
+import csv
+import os
+import time
+
+import cv2
+import numpy as np
+
+from config import Config
+from face_detectors import create_detector
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+DEFAULT_CONFIGS = "ssd:300,ssd:240,ssd:200,ssd:160,yunet:320,yunet:240"
+
+
+def load_images(directory):
+    """Carga las imágenes del directorio (nombre, frame BGR)"""
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        frame = cv2.imread(os.path.join(directory, name))
+        if frame is not None:
+            images.append((name, frame))
+    return images
+
+
+def load_annotations(path):
+    """Lee las cajas de referencia: archivo -> (x1, y1, x2, y2)"""
+    annotations = {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) != 5 or not row[1].strip().lstrip('-').isdigit():
+                continue  # Cabecera o fila mal formada
+            annotations[row[0]] = tuple(int(v) for v in row[1:])
+    return annotations
+
+
+def iou(a, b):
+    """Intersección sobre unión de dos cajas (x1, y1, x2, y2)"""
+    ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def benchmark(backend, input_size, images, annotations, target, min_face_size, repeats):
+    """Mide latencia por imagen y aciertos de un backend"""
+    detector = create_detector(backend, input_size=input_size, target=target,
+                               min_face_size=min_face_size)
+    if detector is None:
+        return None
+
+    # Calentamiento: la primera inferencia incluye la inicialización de la red
+    detector.detect_batch([images[0][1]])
+
+    latencies = []
+    hits = 0
+    for name, frame in images:
+        for _ in range(repeats):
+            start = time.perf_counter()
+            face = detector.detect_batch([frame])[0]
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        if face is None:
+            continue
+        if annotations:
+            reference = annotations.get(name)
+            if reference is not None and iou(face[:4], reference) >= 0.5:
+                hits += 1
+        else:
+            hits += 1
+
+    total = sum(1 for name, _ in images if name in annotations) if annotations else len(images)
+    latencies = np.asarray(latencies)
+    return {
+        'config': f"{backend}:{detector.input_size}",
+        'recall': hits / total if total else 0.0,
+        'mean_ms': float(latencies.mean()),
+        'p95_ms': float(np.percentile(latencies, 95)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precisión y latencia de los detectores de rostros")
+    parser.add_argument('images', help="Directorio con imágenes de prueba")
+    parser.add_argument('--annotations', help="CSV con archivo,x1,y1,x2,y2 por imagen")
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS,
+                        help="Lista backend:tamaño separada por comas")
+    parser.add_argument('--target', default=Config.FACE_DETECTOR_TARGET)
+    parser.add_argument('--min-face-size', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=3, help="Repeticiones por imagen")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        print(f"❌ No hay imágenes en {args.images}")
+        return
+
+    annotations = load_annotations(args.annotations) if args.annotations else {}
+
+    print(f"📊 {len(images)} imágenes, target {args.target}, {args.repeats} repeticiones\n")
+    print(f"{'Detector':<12} {'Recall':>8} {'Media ms':>10} {'p95 ms':>10} {'FPS':>8}")
+    print("-" * 52)
+
+    for entry in args.configs.split(','):
+        backend, _, size = entry.strip().partition(':')
+        result = benchmark(backend, int(size) if size else None, images, annotations,
+                           args.target, args.min_face_size, args.repeats)
+        if result is None:
+            print(f"{entry:<12} {'error':>8}")
+            continue
+        print(f"{result['config']:<12} {result['recall']:>8.1%} {result['mean_ms']:>10.1f} "
+              f"{result['p95_ms']:>10.1f} {1000 / result['mean_ms']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
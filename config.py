@@ -5,11 +5,94 @@ class Config:
 
     # Base de datos
     DATABASE_NAME = os.getenv("DATABASE_NAME", "users_2fa.db")
+    TEMPLATE_CACHE_SIZE = 256   # Plantillas biométricas deserializadas en memoria
+    TEMPLATE_CACHE_TTL = 300    # Segundos antes de releer una plantilla de la BD
     
     # Autenticación facial
     FACE_RECOGNITION_TOLERANCE = 0.5
     FACE_MOVEMENT_THRESHOLD = 50
     FACE_CENTER_THRESHOLD = 30
+    FACE_CHIP_SIZE = 200      # Tamaño fijo (px) del recorte del rostro para encoding y landmarks
+    FACE_CHIP_MARGIN = 0.25   # Margen relativo alrededor de la caja DNN
+
+    # Registro con varias plantillas (matriz n x 128 por usuario)
+    FACE_ENROLLMENT_TEMPLATES = 5        # Plantillas guardadas por usuario
+    FACE_ENROLLMENT_FRAME_STRIDE = 3     # Codificar 1 de cada N frames listos del registro
+    FACE_ENROLLMENT_MIN_SPREAD = 0.03    # Distancia mínima a las ya guardadas (evita repetidas)
+    FACE_ENROLLMENT_OUTLIER_RESET = 3    # Descartes seguidos frente a la primera plantilla antes de reiniciar con la actual
+    FACE_ENROLLMENT_MAX_ATTEMPTS = 15    # Intentos de codificación antes de permitir capturar con las recogidas
+    FACE_ENROLLMENT_TIMEOUT = 20         # Segundos de recogida antes de permitir capturar con las recogidas
+
+    # Confirmación secuencial de identidad (SPRT sobre la distancia de cada frame).
+    # Las distancias típicas del usuario legítimo y de otra persona se sitúan a
+    # FACE_SPRT_MARGIN por debajo y por encima de FACE_RECOGNITION_TOLERANCE:
+    # un frame a la distancia de la tolerancia no aporta evidencia en ningún sentido
+    FACE_SPRT_MARGIN = 0.15          # Separación de las medias respecto de la tolerancia
+    FACE_SPRT_STD = 0.10             # Dispersión de la distancia por frame
+    FACE_SPRT_ALPHA = 0.001          # Probabilidad máxima de aceptar a un impostor
+    FACE_SPRT_BETA = 0.01            # Probabilidad máxima de rechazar al usuario
+    FACE_SPRT_MIN_FRAMES = 2         # Frames mínimos antes de aceptar
+    FACE_SPRT_MAX_STEP = 4.0         # Evidencia máxima que aporta un solo frame
+
+    # Filtro de calidad previo al encoding (medido sobre el rostro en el chip)
+    FACE_QUALITY_GATE = True
+    FACE_MIN_SHARPNESS = 40.0     # Varianza del Laplaciano por debajo = borroso
+    FACE_MIN_BRIGHTNESS = 50      # Brillo medio (0-255) por debajo = poca luz
+    FACE_MAX_BRIGHTNESS = 210     # Brillo medio por encima = sobreexpuesto
+
+    # Gestos de vivacidad: secuencia configurable y umbrales con histéresis
+    # (se entra en el gesto al cruzar un umbral y se sale al cruzar el otro)
+    LIVENESS_GESTURES = os.getenv("LIVENESS_GESTURES", "blink,mouth")  # 'blink', 'mouth', 'head_turn'
+    LIVENESS_GESTURES_ORDERED = False   # True = completar los gestos en el orden indicado
+    LIVENESS_SMOOTHING_FRAMES = 1       # Media móvil de las señales (1 = sin suavizado)
+    LIVENESS_EAR_CLOSE = 0.14           # EAR por debajo = ojos cerrados
+    LIVENESS_EAR_OPEN = 0.17            # EAR por encima = ojos abiertos de nuevo
+    LIVENESS_MAR_OPEN = 0.21            # MAR por encima = boca abierta
+    LIVENESS_MAR_CLOSE = 0.18           # MAR por debajo = boca cerrada de nuevo
+    LIVENESS_YAW_TURN = 0.25            # Desplazamiento de la nariz (en distancias entre ojos) = giro
+    LIVENESS_YAW_CENTER = 0.10          # Por debajo = cabeza de nuevo al centro
+
+    # Índice 1:N de rostros registrados
+    FACE_DUPLICATE_SCREENING = True   # Rechazar un rostro ya registrado con otro usuario
+    FACE_INDEX_MODE = os.getenv("FACE_INDEX_MODE", "exact")  # 'exact' o 'approximate'
+
+    # Detector de rostros: 'ssd' (res10 Caffe) o 'yunet' (FaceDetectorYN, ONNX)
+    FACE_DETECTOR_BACKEND = os.getenv("FACE_DETECTOR_BACKEND", "ssd")
+    FACE_DETECTOR_INPUT_SIZE = int(os.getenv("FACE_DETECTOR_INPUT_SIZE", "0"))  # 0 = por defecto (ssd 300, yunet 320)
+    FACE_DETECTOR_TARGET = os.getenv("FACE_DETECTOR_TARGET", "cpu")  # 'cpu', 'opencl', 'opencl_fp16' o 'cuda'
+
+    # Encoder facial de los registros nuevos: 'dlib_large', 'dlib_small' (alineación
+    # con 5 puntos, más rápida) o 'sface' (FaceRecognizerSF de OpenCV alineado con los
+    # 5 puntos de YuNet, el más ligero en CPU)
+    FACE_ENCODER = os.getenv("FACE_ENCODER", "dlib_large")
+    FACE_ENCODER_JITTERS = int(os.getenv("FACE_ENCODER_JITTERS", "1"))  # Solo dlib
+    FACE_SFACE_DISTANCE_SCALE = 1.88   # Umbral L2 de SFace (1.128) / umbral estándar de dlib (0.6)
+
+    # Hilos de trabajo facial: tamaño del pool de detectores
+    FACE_WORKER_THREADS = int(os.getenv("FACE_WORKER_THREADS", "4"))
+
+    # Frames de video más antiguos que este plazo se descartan sin procesar
+    FACE_FRAME_DEADLINE_MS = int(os.getenv("FACE_FRAME_DEADLINE_MS", "500"))
+
+    # Fuente de video de los flujos de terminal: índice de cámara, archivo de
+    # video o directorio de imágenes (reproducción sin hardware)
+    FACE_VIDEO_SOURCE = os.getenv("FACE_VIDEO_SOURCE", "0")
+    FACE_REPLAY_REALTIME = os.getenv("FACE_REPLAY_REALTIME", "false").lower() == "true"  # Reproducir al FPS original
+    FACE_REPLAY_FPS = 30                 # FPS de los directorios de imágenes
+    FACE_CLI_HEADLESS = os.getenv("FACE_CLI_HEADLESS", "false").lower() == "true"  # Sin ventana ni teclado
+
+    # Seguimiento del rostro entre detecciones DNN
+    FACE_TRACKING = True
+    FACE_REDETECT_INTERVAL = 5   # Frames seguidos con tracker antes de volver al DNN
+
+    # Procesos trabajadores para encoding/landmarks (0 = en el hilo del socket)
+    FACE_PROCESS_WORKERS = int(os.getenv("FACE_PROCESS_WORKERS", "0"))
+
+    # Micro-batching del detector DNN entre sesiones Socket.IO
+    FACE_DETECTION_BATCHING = True
+    FACE_DETECTION_BATCH_WINDOW_MS = 5   # Ventana de agrupación
+    FACE_DETECTION_MAX_BATCH = 16        # Frames máximos por forward
+    FACE_DETECTION_TIMEOUT = 2.0         # Segundos de espera por el batch antes de dar error
     
     # Autenticación de voz
     VOICE_SAMPLE_RATE = 16000  # Reducido para mejor procesamiento
@@ -23,6 +106,24 @@ class Config:
     VOICE_MIN_ENERGY_VARIANCE = 0.012  # MUY ESTRICTO (antes 0.008)
     VOICE_MIN_ZCR_VARIANCE = 0.0015    # MUY ESTRICTO (antes 0.001)
     VOICE_MIN_PITCH_VARIANCE = 8       # MUY ESTRICTO (antes 5)
+
+    # Reconocimiento de los dígitos del desafío: 'local' (plantillas MFCC + DTW,
+    # sin red) o 'google'. El alternativo se usa si el principal no entiende el audio.
+    # Sin plantillas de dígitos, 'local' se sustituye por 'google'
+    VOICE_STT_BACKEND = os.getenv("VOICE_STT_BACKEND", "local")
+    VOICE_STT_FALLBACK = os.getenv("VOICE_STT_FALLBACK", "")   # '' = ninguno
+    VOICE_DIGIT_TEMPLATES = os.getenv("VOICE_DIGIT_TEMPLATES", "")  # '' = <MODEL_DIR>/digit_templates.npz
+    VOICE_STT_AMBIENT_NOISE_SECONDS = 0.0   # Calibración de ruido antes de Google (0 = desactivada)
+    VOICE_STT_TIMEOUT = 8                   # Segundos máximos de la petición a Google
+
+    # Decodificación en memoria de WebM/Ogg del navegador (WAV y PCM no lo necesitan):
+    # 'auto' (PyAV si está instalado, si no ffmpeg por tubería), 'pyav' o 'ffmpeg'
+    VOICE_AUDIO_DECODER = os.getenv("VOICE_AUDIO_DECODER", "auto")
+
+    # Verificación web: desafío y hablante en paralelo; la primera etapa que falla decide
+    VOICE_VERIFICATION_WORKERS = int(os.getenv("VOICE_VERIFICATION_WORKERS", "4"))  # Hilos de cada rama (desafío y hablante)
+    VOICE_VERIFICATION_TIMEOUT = 30   # segundos
+    VOICE_MIN_RMS = 0.001             # Energía mínima; por debajo se considera silencio
     
     # Sistema
     PLATFORM = os.sys.platform
@@ -30,6 +131,14 @@ class Config:
     
     # Directorios
     DATA_DIR = "data"
+
+    # Carga de los motores facial y de voz: 'background' (hilo al arrancar),
+    # 'eager' (bloquea el arranque) o 'lazy' (primer uso; workers de login/admin)
+    SERVICES_WARMUP = os.getenv("SERVICES_WARMUP", "background")
+
+    # Paquete local de modelos (ver model_manager.py); sin descargas en ejecución salvo que se habilite
+    MODEL_DIR = os.getenv("MODEL_DIR", "models")
+    MODEL_ALLOW_DOWNLOAD = os.getenv("MODEL_ALLOW_DOWNLOAD", "false").lower() == "true"
     
     @classmethod
     def ensure_directories(cls):
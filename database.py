@@ -1,14 +1,91 @@
 import sqlite3
 import bcrypt
 import pickle
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
 from config import Config
 
+class TemplateCache:
+    """
+    Caché LRU con caducidad (TTL) de plantillas biométricas ya deserializadas.
+    Los valores se comparten entre llamadas: no deben modificarse.
+    Cada clave lleva un contador de generación que invalidate() incrementa:
+    una lectura de la BD iniciada antes de invalidar no vuelve a guardar la
+    plantilla antigua.
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_size=256, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna el valor en caché o TemplateCache._MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return self._MISSING
+
+    def generation(self, key):
+        """Generación actual de la clave; tomarla antes de leer la BD"""
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def put(self, key, value, generation=None):
+        """
+        Guarda un valor y expulsa el menos usado si se supera el tamaño.
+        Con generation, no guarda nada si la clave se invalidó desde entonces.
+        Retorna si se guardó
+        """
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                return False
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def invalidate(self, key):
+        """Elimina una entrada (tras guardar una nueva plantilla)"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def stats(self):
+        """Contadores de aciertos y fallos de la caché"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': self.hits / total * 100 if total > 0 else 0
+            }
+
+
 class DatabaseManager:
     """Gestión de la base de datos de usuarios"""
     
     def __init__(self, db_name=None):
         self.db_name = db_name or Config.DATABASE_NAME
+        self.template_cache = TemplateCache(Config.TEMPLATE_CACHE_SIZE, Config.TEMPLATE_CACHE_TTL)
+        self.face_index = None  # Índice 1:N opcional, se actualiza al guardar encodings
         self.init_database()
     
     def init_database(self):
@@ -97,9 +174,18 @@ class DatabaseManager:
         )
         conn.commit()
         conn.close()
+        self.template_cache.invalidate(('face', username))
+
+        if self.face_index is not None:
+            self.face_index.upsert(username, encoding)
     
     def get_face_encoding(self, username):
-        """Obtiene el encoding facial del usuario"""
+        """Obtiene el encoding facial del usuario (con caché)"""
+        cached = self.template_cache.get(('face', username))
+        if cached is not TemplateCache._MISSING:
+            return cached
+        generation = self.template_cache.generation(('face', username))
+
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
@@ -107,9 +193,20 @@ class DatabaseManager:
         result = cursor.fetchone()
         conn.close()
         
-        if result and result[0]:
-            return pickle.loads(result[0])
-        return None
+        encoding = pickle.loads(result[0]) if result and result[0] else None
+        self.template_cache.put(('face', username), encoding, generation)
+        return encoding
+    
+    def get_all_face_encodings(self):
+        """Obtiene (usuario, encoding) de todos los usuarios con rostro registrado"""
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT username, face_encoding FROM users WHERE face_encoding IS NOT NULL')
+        results = cursor.fetchall()
+        conn.close()
+        
+        return [(username, pickle.loads(blob)) for username, blob in results]
     
     def save_voice_sample(self, username, voice_features):
         """Guarda las características de voz del usuario"""
@@ -123,9 +220,15 @@ class DatabaseManager:
         )
         conn.commit()
         conn.close()
+        self.template_cache.invalidate(('voice', username))
     
     def get_voice_sample(self, username):
-        """Obtiene las características de voz del usuario"""
+        """Obtiene las características de voz del usuario (con caché)"""
+        cached = self.template_cache.get(('voice', username))
+        if cached is not TemplateCache._MISSING:
+            return cached
+        generation = self.template_cache.generation(('voice', username))
+
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
@@ -133,9 +236,9 @@ class DatabaseManager:
         result = cursor.fetchone()
         conn.close()
         
-        if result and result[0]:
-            return pickle.loads(result[0])
-        return None
+        voice_sample = pickle.loads(result[0]) if result and result[0] else None
+        self.template_cache.put(('voice', username), voice_sample, generation)
+        return voice_sample
     
     def update_last_login(self, username):
         """Actualiza la fecha del último inicio de sesión"""
@@ -0,0 +1,172 @@
+"""
+Backends del detector de rostros
+Todos exponen detect_batch(frames) y retornan, por cada frame, el rostro de
+mayor confianza (x1, y1, x2, y2, conf) o None
+"""
+
+import cv2
+import numpy as np
+
+from model_manager import model_manager
+
+
+def dnn_target(name):
+    """Traduce el nombre de Config a la pareja (backend, target) de cv2.dnn"""
+    targets = {
+        'cpu': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_CPU'),
+        'opencl': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL'),
+        'opencl_fp16': ('DNN_BACKEND_OPENCV', 'DNN_TARGET_OPENCL_FP16'),
+        'cuda': ('DNN_BACKEND_CUDA', 'DNN_TARGET_CUDA'),
+    }
+    if name not in targets:
+        raise ValueError(f"Target de detector desconocido: {name}")
+    backend, target = targets[name]
+    return getattr(cv2.dnn, backend), getattr(cv2.dnn, target)
+
+
+def select_best_faces(boxes, confidences, image_ids, sizes, confidence_threshold, min_face_size):
+    """
+    Filtra detecciones (cajas en píxeles) de forma vectorizada y retorna, por
+    cada imagen, el rostro de mayor confianza (x1, y1, x2, y2, conf) o None
+    """
+    sizes = np.asarray(sizes, dtype=np.float32).reshape(-1, 2)
+    results = [None] * len(sizes)
+
+    valid = (confidences > confidence_threshold) & (image_ids >= 0) & (image_ids < len(sizes))
+    boxes, image_ids, confidences = boxes[valid], image_ids[valid], confidences[valid]
+
+    # Recortar a los límites de cada imagen
+    wh = sizes[image_ids].astype(int)
+    boxes = boxes.astype(int)
+    boxes[:, :2] = np.maximum(boxes[:, :2], 0)
+    boxes[:, 2:] = np.minimum(boxes[:, 2:], wh)
+
+    large = ((boxes[:, 2] - boxes[:, 0]) >= min_face_size) & \
+            ((boxes[:, 3] - boxes[:, 1]) >= min_face_size)
+    boxes, image_ids, confidences = boxes[large], image_ids[large], confidences[large]
+
+    # Primera aparición de cada imagen tras ordenar por confianza = mejor rostro
+    order = np.argsort(-confidences, kind='stable')
+    _, first = np.unique(image_ids[order], return_index=True)
+    for idx in order[first]:
+        x1, y1, x2, y2 = boxes[idx]
+        results[image_ids[idx]] = (x1, y1, x2, y2, confidences[idx])
+
+    return results
+
+
+class SSDFaceDetector:
+    """
+    Detector res10 SSD (Caffe). Admite tamaños de entrada menores que el
+    original de 300x300 a cambio de perder rostros pequeños o lejanos.
+    """
+
+    name = 'ssd'
+    default_input_size = 300
+
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, input_size=None, target='cpu', confidence_threshold=0.6, min_face_size=100):
+        self.input_size = input_size or self.default_input_size
+        self.confidence_threshold = confidence_threshold
+        self.min_face_size = min_face_size
+
+        prototxt_path = model_manager.model_path("deploy.prototxt")
+        model_path = model_manager.model_path("res10_300x300_ssd_iter_140000.caffemodel")
+
+        self.net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
+        backend, target_id = dnn_target(target)
+        self.net.setPreferableBackend(backend)
+        self.net.setPreferableTarget(target_id)
+
+    def detect_batch(self, frames):
+        # blobFromImages reescala cada frame al tamaño de entrada: sin resize previo
+        size = (self.input_size, self.input_size)
+        blob = cv2.dnn.blobFromImages(frames, 1.0, size, self.MEAN)
+
+        self.net.setInput(blob)
+        rows = self.net.forward().reshape(-1, 7)
+
+        # Coordenadas normalizadas -> píxeles de cada frame
+        image_ids = rows[:, 0].astype(int)
+        sizes = np.asarray([(frame.shape[1], frame.shape[0]) for frame in frames], dtype=np.float32)
+        wh = sizes[np.clip(image_ids, 0, len(frames) - 1)]
+        boxes = rows[:, 3:7] * np.hstack([wh, wh])
+
+        return select_best_faces(boxes, rows[:, 2], image_ids, sizes,
+                                 self.confidence_threshold, self.min_face_size)
+
+
+class YuNetFaceDetector:
+    """
+    Detector YuNet (cv2.FaceDetectorYN, ONNX). Más ligero que el SSD en CPU;
+    procesa los frames de uno en uno reescalados a input_size por el lado mayor.
+    """
+
+    name = 'yunet'
+    default_input_size = 320
+
+    def __init__(self, input_size=None, target='cpu', confidence_threshold=0.6, min_face_size=100):
+        self.input_size = input_size or self.default_input_size
+        self.confidence_threshold = confidence_threshold
+        self.min_face_size = min_face_size
+
+        model_path = model_manager.model_path("face_detection_yunet_2023mar.onnx")
+        backend, target_id = dnn_target(target)
+        self.detector = cv2.FaceDetectorYN.create(
+            model_path, "", (self.input_size, self.input_size),
+            confidence_threshold, 0.3, 50, backend, target_id
+        )
+
+    def detect_batch(self, frames):
+        all_boxes, all_confidences, all_ids = [], [], []
+
+        for image_id, frame in enumerate(frames):
+            h, w = frame.shape[:2]
+            scale = self.input_size / max(h, w)
+            small = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))),
+                               interpolation=cv2.INTER_AREA)
+
+            self.detector.setInputSize((small.shape[1], small.shape[0]))
+            _, faces = self.detector.detect(small)
+            if faces is None or len(faces) == 0:
+                continue
+
+            # Filas: x, y, ancho, alto, 5 puntos faciales, confianza
+            xywh = faces[:, :4] / scale
+            all_boxes.append(np.hstack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]]))
+            all_confidences.append(faces[:, 14])
+            all_ids.append(np.full(len(faces), image_id))
+
+        sizes = [(frame.shape[1], frame.shape[0]) for frame in frames]
+        if not all_boxes:
+            return [None] * len(frames)
+
+        return select_best_faces(np.vstack(all_boxes), np.concatenate(all_confidences),
+                                 np.concatenate(all_ids), sizes,
+                                 self.confidence_threshold, self.min_face_size)
+
+
+DETECTOR_BACKENDS = {
+    SSDFaceDetector.name: SSDFaceDetector,
+    YuNetFaceDetector.name: YuNetFaceDetector,
+}
+
+
+def create_detector(backend, input_size=None, target='cpu', confidence_threshold=0.6, min_face_size=100):
+    """Instancia el backend indicado; retorna None si el modelo no se pudo cargar"""
+    if backend not in DETECTOR_BACKENDS:
+        raise ValueError(f"Backend de detector desconocido: {backend}")
+
+    try:
+        detector = DETECTOR_BACKENDS[backend](
+            input_size=input_size,
+            target=target,
+            confidence_threshold=confidence_threshold,
+            min_face_size=min_face_size
+        )
+        print(f"✅ Detector {backend} cargado ({detector.input_size}px, {target})")
+        return detector
+    except Exception as e:
+        print(f"⚠️ Error al cargar el detector {backend}: {e}")
+        return None
@@ -0,0 +1,191 @@
+"""
+Índice 1:N de encodings faciales en memoria
+Responde "¿qué usuario registrado es este rostro?" con un único cálculo
+vectorizado de distancias sobre una matriz float32 contigua
+"""
+
+import threading
+
+import numpy as np
+
+# Encoder de las plantillas guardadas antes de etiquetarlas (face_recognition por defecto)
+LEGACY_FACE_ENCODER = 'dlib_large'
+
+
+def pack_face_template(encoder, templates):
+    """Plantilla almacenable: matriz de encodings etiquetada con el encoder que la produjo"""
+    return {'encoder': encoder, 'templates': np.atleast_2d(np.asarray(templates, dtype=np.float32))}
+
+
+def unpack_face_template(template):
+    """Retorna (encoder, matriz n x d); acepta también encodings sin etiquetar"""
+    if isinstance(template, dict):
+        return template['encoder'], np.atleast_2d(template['templates'])
+    return LEGACY_FACE_ENCODER, np.atleast_2d(template)
+
+
+class FaceIndex:
+    """
+    Matriz contigua con todos los encodings registrados (una fila por encoding).
+    Modo 'exact': distancia euclídea completa sobre todas las filas.
+    Modo 'approximate': búsqueda gruesa sobre una proyección aleatoria de baja
+    dimensión y re-ranking exacto de los mejores candidatos.
+    Solo indexa plantillas de un encoder: las de otros espacios no son comparables.
+    """
+
+    def __init__(self, dim=128, mode='exact', projection_dim=32, initial_capacity=1024,
+                 encoder=LEGACY_FACE_ENCODER):
+        if mode not in ('exact', 'approximate'):
+            raise ValueError(f"Modo de índice desconocido: {mode}")
+
+        self.dim = dim
+        self.mode = mode
+        self.encoder = encoder
+        self._lock = threading.Lock()
+
+        self._matrix = np.empty((initial_capacity, dim), dtype=np.float32)
+        self._sq_norms = np.empty(initial_capacity, dtype=np.float32)
+        self._owners = []       # usuario de cada fila
+        self._rows = {}         # usuario -> filas que ocupa
+        self._max_rows_per_user = 1
+
+        if mode == 'approximate':
+            # Proyección ortonormal fija: conserva aproximadamente las distancias
+            rng = np.random.default_rng(0)
+            q, _ = np.linalg.qr(rng.standard_normal((dim, projection_dim)))
+            self._projection = q.astype(np.float32)
+            self._projected = np.empty((initial_capacity, projection_dim), dtype=np.float32)
+            self._projected_sq_norms = np.empty(initial_capacity, dtype=np.float32)
+
+    @classmethod
+    def from_database(cls, db, mode='exact', encoder=LEGACY_FACE_ENCODER):
+        """Construye el índice con todos los encodings y lo enlaza a la BD para actualizarse al guardar"""
+        users = db.get_all_face_encodings()
+        index = cls(mode=mode, initial_capacity=max(1024, 2 * len(users)), encoder=encoder)
+        for username, encoding in users:
+            index.upsert(username, encoding)
+        db.face_index = index
+        print(f"✅ Índice facial cargado: {len(index)} usuarios ({mode}, {encoder})")
+        return index
+
+    def __len__(self):
+        return len(self._rows)
+
+    def upsert(self, username, encodings):
+        """Añade o reemplaza los encodings de un usuario (plantilla etiquetada o matriz)"""
+        encoder, rows = unpack_face_template(encodings)
+        rows = rows.astype(np.float32, copy=False)
+        with self._lock:
+            self._remove(username)
+            if encoder != self.encoder:
+                return
+            for row in rows:
+                self._append(username, row)
+            self._max_rows_per_user = max(self._max_rows_per_user, len(rows))
+
+    def remove(self, username):
+        """Elimina los encodings de un usuario"""
+        with self._lock:
+            self._remove(username)
+
+    def search(self, encoding, k=5):
+        """
+        Retorna hasta k tuplas (usuario, distancia) ordenadas de menor a mayor,
+        usando la mejor fila de cada usuario
+        """
+        query = np.asarray(encoding, dtype=np.float32).reshape(-1)
+
+        with self._lock:
+            size = len(self._owners)
+            if size == 0:
+                return []
+
+            # Filas suficientes para cubrir k usuarios distintos
+            wanted = min(size, k * self._max_rows_per_user)
+
+            if self.mode == 'approximate':
+                candidates = self._coarse_candidates(query, size, max(wanted * 8, 64))
+                distances = self._distances(query, candidates)
+            else:
+                candidates = np.arange(size)
+                distances = self._distances(query, slice(0, size))
+
+            if wanted < len(distances):
+                top = np.argpartition(distances, wanted - 1)[:wanted]
+            else:
+                top = np.arange(len(distances))
+            top = top[np.argsort(distances[top])]
+
+            results = []
+            seen = set()
+            for idx in top:
+                owner = self._owners[candidates[idx]]
+                if owner in seen:
+                    continue
+                seen.add(owner)
+                results.append((owner, float(distances[idx])))
+                if len(results) == k:
+                    break
+            return results
+
+    def find_duplicates(self, encoding, tolerance, exclude=None):
+        """Usuarios (distintos de 'exclude') cuyo rostro está dentro de la tolerancia"""
+        return [
+            (owner, distance)
+            for owner, distance in self.search(encoding, k=5)
+            if distance < tolerance and owner != exclude
+        ]
+
+    def _distances(self, query, rows):
+        """Distancia euclídea vía ||m||² - 2·m·q + ||q||² (un único producto matricial)"""
+        sq = self._sq_norms[rows] - 2.0 * (self._matrix[rows] @ query) + float(query @ query)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def _coarse_candidates(self, query, size, count):
+        """Filas más cercanas en el espacio proyectado"""
+        if count >= size:
+            return np.arange(size)
+        projected_query = query @ self._projection
+        sq = (self._projected_sq_norms[:size]
+              - 2.0 * (self._projected[:size] @ projected_query)
+              + float(projected_query @ projected_query))
+        return np.argpartition(sq, count - 1)[:count]
+
+    def _append(self, username, row):
+        size = len(self._owners)
+        if size == len(self._matrix):
+            self._grow()
+
+        self._matrix[size] = row
+        self._sq_norms[size] = row @ row
+        if self.mode == 'approximate':
+            projected = row @ self._projection
+            self._projected[size] = projected
+            self._projected_sq_norms[size] = projected @ projected
+
+        self._owners.append(username)
+        self._rows.setdefault(username, []).append(size)
+
+    def _remove(self, username):
+        # Borrado por intercambio con la última fila para mantener la matriz contigua
+        for idx in sorted(self._rows.pop(username, []), reverse=True):
+            last = len(self._owners) - 1
+            if idx != last:
+                moved = self._owners[last]
+                self._matrix[idx] = self._matrix[last]
+                self._sq_norms[idx] = self._sq_norms[last]
+                if self.mode == 'approximate':
+                    self._projected[idx] = self._projected[last]
+                    self._projected_sq_norms[idx] = self._projected_sq_norms[last]
+                self._owners[idx] = moved
+                moved_rows = self._rows[moved]
+                moved_rows[moved_rows.index(last)] = idx
+            self._owners.pop()
+
+    def _grow(self):
+        capacity = len(self._matrix) * 2
+        self._matrix = np.resize(self._matrix, (capacity, self.dim))
+        self._sq_norms = np.resize(self._sq_norms, capacity)
+        if self.mode == 'approximate':
+            self._projected = np.resize(self._projected, (capacity, self._projected.shape[1]))
+            self._projected_sq_norms = np.resize(self._projected_sq_norms, capacity)
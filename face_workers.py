@@ -0,0 +1,139 @@
+"""
+Ejecución opcional de encoding y landmarks faciales en procesos trabajadores
+Los frames se entregan a través de memoria compartida en lugar de serializarse,
+de modo que el proceso principal queda libre para atender los sockets
+"""
+
+import atexit
+import queue
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Módulo face_recognition cargado en cada proceso trabajador
+_face_recognition = None
+
+# Bloques de memoria compartida ya abiertos por este trabajador (nombre -> bloque)
+_attached = {}
+
+
+def _init_worker():
+    """Precarga los modelos de dlib al arrancar cada proceso trabajador"""
+    global _face_recognition
+    import face_recognition
+    _face_recognition = face_recognition
+
+
+def _attach(shm_name):
+    """
+    Abre un bloque creado por el proceso principal sin que el resource_tracker
+    del trabajador lo adopte: antes de Python 3.13 lo registraría como propio,
+    avisaría de una fuga o lo eliminaría al terminar el trabajador
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=shm_name, track=False)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _run_job(job, shm_name, shape, dtype, locations, persistent, options=None):
+    """Ejecuta un trabajo sobre la imagen alojada en memoria compartida"""
+    if _face_recognition is None:
+        _init_worker()
+
+    shm = _attached.get(shm_name)
+    if shm is None:
+        shm = _attach(shm_name)
+        if persistent:
+            _attached[shm_name] = shm
+
+    image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    try:
+        if job == 'encode':
+            return _face_recognition.face_encodings(image, locations, **(options or {}))
+        return _face_recognition.face_landmarks(image, locations)
+    finally:
+        del image
+        if not persistent:
+            shm.close()
+
+
+def _ping():
+    """Trabajo vacío para forzar el arranque (y la precarga) de los procesos"""
+    return True
+
+
+class FaceWorkerPool:
+    """
+    Pool de procesos con modelos precargados para face_encodings y
+    face_landmarks. Los chips del rostro (tamaño fijo) viajan por bloques de
+    memoria compartida reutilizables; imágenes mayores usan un bloque temporal.
+    """
+
+    def __init__(self, processes, buffer_bytes):
+        self.processes = processes
+        self.buffer_bytes = buffer_bytes
+        self._executor = ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
+
+        # Dos bloques por proceso: uno en uso y otro preparándose
+        self._owned = [
+            shared_memory.SharedMemory(create=True, size=buffer_bytes)
+            for _ in range(processes * 2)
+        ]
+        self._buffers = queue.Queue()
+        for shm in self._owned:
+            self._buffers.put(shm)
+
+        # Arrancar todos los procesos ahora para no pagar la carga en el primer frame
+        for future in [self._executor.submit(_ping) for _ in range(processes)]:
+            future.result()
+
+        atexit.register(self.shutdown)
+
+    def face_encodings(self, image, locations, options=None):
+        """Equivalente a face_recognition.face_encodings (con sus opciones) en un proceso trabajador"""
+        return self._submit('encode', image, locations, options)
+
+    def face_landmarks(self, image, locations):
+        """Equivalente a face_recognition.face_landmarks en un proceso trabajador"""
+        return self._submit('landmarks', image, locations)
+
+    def _submit(self, job, image, locations, options=None):
+        image = np.ascontiguousarray(image)
+        persistent = image.nbytes <= self.buffer_bytes
+
+        if persistent:
+            shm = self._buffers.get()
+        else:
+            shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+
+        try:
+            view = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+            view[...] = image
+            del view
+
+            future = self._executor.submit(
+                _run_job, job, shm.name, image.shape, image.dtype.str, locations, persistent, options
+            )
+            return future.result()
+        finally:
+            if persistent:
+                self._buffers.put(shm)
+            else:
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        """Detiene los procesos y libera la memoria compartida"""
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+        for shm in self._owned:
+            shm.close()
+            shm.unlink()
+        self._owned = []
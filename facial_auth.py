@@ -4,10 +4,449 @@ import cv2
 import face_recognition
 import numpy as np
 from config import Config
-import os
-import urllib.request
-from scipy.spatial import distance as dist
+from face_detectors import create_detector, dnn_target
+from model_manager import model_manager
+from face_index import pack_face_template, unpack_face_template
+from gesture_engine import GestureEngine
+from video_sources import open_video_source
+import math
+from abc import ABC, abstractmethod
 from collections import deque
+from contextlib import contextmanager
+import queue
+import threading
+import time
+
+
+class DetectionTimeout(RuntimeError):
+    """El planificador de detección no respondió a tiempo (no equivale a 'sin rostro')"""
+
+
+class FaceDetectionBatcher:
+    """
+    Planificador de detección: agrupa durante unos milisegundos los frames de
+    todas las sesiones activas y los procesa en un único forward del DNN
+    """
+
+    def __init__(self, detect_batch_fn, window_ms=5, max_batch=16, workers=1):
+        self._detect_batch = detect_batch_fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+
+        # Un hilo por red del pool: varios batches pueden ejecutarse en paralelo
+        self._workers = [
+            threading.Thread(target=self._run, name=f"face-detection-batcher-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def detect(self, frame, timeout=None):
+        """
+        Encola un frame y espera el resultado de su batch. Si no llega a
+        tiempo lanza DetectionTimeout: un planificador atascado no debe
+        confundirse con una cámara sin rostro
+        """
+        timeout = timeout or Config.FACE_DETECTION_TIMEOUT
+        request = {'frame': frame, 'done': threading.Event(), 'result': None, 'error': None,
+                   'abandoned': False}
+        self._queue.put(request)
+
+        if not request['done'].wait(timeout):
+            # Si aún no entró en un batch, los hilos lo descartan
+            request['abandoned'] = True
+            print(f"⚠️ Detección facial sin respuesta en {timeout:.1f}s "
+                  f"({self._queue.qsize()} frames en cola)")
+            raise DetectionTimeout(f"La detección facial no respondió en {timeout:.1f}s")
+        if request['error'] is not None:
+            raise request['error']
+        return request['result']
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+
+            # Reunir frames hasta agotar la ventana o llenar el batch
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            batch = [request for request in batch if not request['abandoned']]
+            if not batch:
+                continue
+
+            try:
+                results = self._detect_batch([request['frame'] for request in batch])
+                for request, result in zip(batch, results):
+                    request['result'] = result
+            except Exception as e:
+                for request in batch:
+                    request['error'] = e
+            finally:
+                for request in batch:
+                    request['done'].set()
+
+
+class FaceTracker:
+    """
+    Seguimiento barato del rostro entre detecciones DNN mediante flujo óptico
+    (Lucas-Kanade) sobre unos pocos puntos característicos de la caja
+    """
+
+    def __init__(self, max_points=30, min_points=8, max_fb_error=1.5):
+        self.max_points = max_points
+        self.min_points = min_points
+        self.max_fb_error = max_fb_error
+        self.reset()
+
+    def reset(self):
+        """Descarta el seguimiento actual"""
+        self.points = None
+        self.prev_gray = None
+        self.box = None
+        self.confidence = 0.0
+        self.frames_since_detection = 0
+
+    @property
+    def active(self):
+        return self.points is not None
+
+    def start(self, frame, face):
+        """Inicializa el seguimiento a partir de una detección DNN"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        x1, y1, x2, y2 = [int(v) for v in face[:4]]
+
+        mask = np.zeros_like(gray)
+        mask[y1:y2, x1:x2] = 255
+        points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 7, mask=mask)
+
+        if points is None or len(points) < self.min_points:
+            self.reset()
+            return
+
+        self.points = points
+        self.prev_gray = gray
+        self.box = np.array([x1, y1, x2, y2], dtype=np.float32)
+        self.confidence = float(face[4])
+        self.frames_since_detection = 0
+
+    def update(self, frame):
+        """
+        Propaga la caja al nuevo frame. Retorna (x1, y1, x2, y2, conf) o None
+        si el seguimiento pierde confianza (pocos puntos fiables)
+        """
+        if not self.active:
+            return None
+
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        lk_params = dict(winSize=(21, 21), maxLevel=3)
+
+        # Flujo hacia delante y hacia atrás: descartar puntos inconsistentes
+        new_points, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, self.points, None, **lk_params)
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, new_points, None, **lk_params)
+
+        fb_error = np.linalg.norm((self.points - back_points).reshape(-1, 2), axis=1)
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < self.max_fb_error)
+
+        if good.sum() < self.min_points:
+            self.reset()
+            return None
+
+        old = self.points.reshape(-1, 2)[good]
+        new = new_points.reshape(-1, 2)[good]
+
+        # Traslación y escala robustas (medianas)
+        shift = np.median(new - old, axis=0)
+        old_spread = np.median(np.linalg.norm(old - old.mean(axis=0), axis=1))
+        new_spread = np.median(np.linalg.norm(new - new.mean(axis=0), axis=1))
+        scale = new_spread / old_spread if old_spread > 0 else 1.0
+
+        cx, cy = (self.box[:2] + self.box[2:]) / 2 + shift
+        half_w, half_h = (self.box[2:] - self.box[:2]) / 2 * scale
+        self.box = np.array([cx - half_w, cy - half_h, cx + half_w, cy + half_h], dtype=np.float32)
+
+        h, w = gray.shape[:2]
+        x1, y1 = max(0, int(self.box[0])), max(0, int(self.box[1]))
+        x2, y2 = min(w, int(self.box[2])), min(h, int(self.box[3]))
+        if x2 <= x1 or y2 <= y1:
+            self.reset()
+            return None
+
+        self.points = new.reshape(-1, 1, 2)
+        self.prev_gray = gray
+        self.frames_since_detection += 1
+
+        return (x1, y1, x2, y2, self.confidence)
+
+
+class SequentialIdentityTest:
+    """
+    Prueba secuencial de razón de verosimilitud (SPRT) sobre la distancia
+    facial de cada frame. Modela la distancia como normal con media distinta
+    para el usuario legítimo y para un impostor, acumula el logaritmo de la
+    razón de verosimilitud y decide en cuanto cruza un límite de error.
+    Con from_config las medias quedan a ambos lados de la tolerancia de
+    reconocimiento, así que FACE_RECOGNITION_TOLERANCE también gobierna esta prueba.
+    """
+
+    ACCEPT = 'accept'
+    REJECT = 'reject'
+    CONTINUE = 'continue'
+
+    def __init__(self, genuine_mean, impostor_mean, std, alpha, beta,
+                 min_frames=2, max_step=4.0):
+        self.genuine_mean = genuine_mean
+        self.impostor_mean = impostor_mean
+        self.variance = std * std
+        self.min_frames = min_frames
+        self.max_step = max_step
+
+        # Límites de Wald
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+
+        self.reset()
+
+    @classmethod
+    def from_config(cls, tolerance=None):
+        if tolerance is None:
+            tolerance = Config.FACE_RECOGNITION_TOLERANCE
+        return cls(
+            tolerance - Config.FACE_SPRT_MARGIN,
+            tolerance + Config.FACE_SPRT_MARGIN,
+            Config.FACE_SPRT_STD,
+            Config.FACE_SPRT_ALPHA,
+            Config.FACE_SPRT_BETA,
+            Config.FACE_SPRT_MIN_FRAMES,
+            Config.FACE_SPRT_MAX_STEP
+        )
+
+    def reset(self):
+        self.llr = 0.0
+        self.frames = 0
+
+    def update(self, distance):
+        """Añade la distancia de un frame y retorna ACCEPT, REJECT o CONTINUE"""
+        step = ((distance - self.impostor_mean) ** 2
+                - (distance - self.genuine_mean) ** 2) / (2 * self.variance)
+
+        # Un único frame atípico no puede decidir por sí solo
+        self.llr += max(-self.max_step, min(self.max_step, step))
+        self.frames += 1
+
+        if self.llr >= self.upper and self.frames >= self.min_frames:
+            return self.ACCEPT
+        if self.llr <= self.lower:
+            return self.REJECT
+        return self.CONTINUE
+
+    @property
+    def progress(self):
+        """Fracción (0-1) de la evidencia necesaria para aceptar"""
+        return max(0.0, min(1.0, self.llr / self.upper))
+
+
+class LivenessContext:
+    """Estado de suavizado, seguimiento, identidad y gestos de una sesión de verificación"""
+
+    def __init__(self, tolerance=None):
+        self.face_buffer = deque(maxlen=3)
+        self.gestures = GestureEngine.from_config()
+        self.tracker = FaceTracker()
+        self.identity = SequentialIdentityTest.from_config(tolerance)
+
+    def reset(self):
+        """Limpia el estado para reutilizar el contexto en otra sesión"""
+        self.face_buffer.clear()
+        self.gestures.reset()
+        self.tracker.reset()
+        self.identity.reset()
+
+
+class LivenessContextPool:
+    """Pool de contextos de vivacidad reciclables entre sesiones"""
+
+    def __init__(self, max_idle=64, tolerance=None):
+        self.max_idle = max_idle
+        self.tolerance = tolerance
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Entrega un contexto limpio (reutilizado si hay alguno libre)"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return LivenessContext(self.tolerance)
+
+    def release(self, context):
+        """Devuelve un contexto al pool tras limpiarlo"""
+        if context is None:
+            return
+        context.reset()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(context)
+
+
+class DetectorPool:
+    """
+    Pool de detectores de rostros. Las redes de cv2.dnn no son seguras entre
+    hilos, así que cada hilo de trabajo toma su propia instancia.
+    """
+
+    def __init__(self, factory, size):
+        self._nets = queue.Queue()
+        self.size = 0
+
+        for _ in range(max(1, size)):
+            net = factory()
+            if net is None:
+                break
+            self._nets.put(net)
+            self.size += 1
+
+    @contextmanager
+    def acquire(self):
+        """Toma un detector del pool durante el bloque 'with'"""
+        net = self._nets.get()
+        try:
+            yield net
+        finally:
+            self._nets.put(net)
+
+
+class FaceEncoder(ABC):
+    """
+    Interfaz de los encoders faciales. Las distancias se devuelven divididas
+    por distance_scale para que la tolerancia y los umbrales de Config (en
+    unidades de dlib) sirvan para cualquier encoder.
+    """
+
+    name = None
+    distance_scale = 1.0
+    uses_worker_pool = False
+
+    @abstractmethod
+    def encode(self, rgb, locations):
+        """Encodings de los rostros en 'locations' (top, right, bottom, left) de la imagen RGB"""
+
+    def distances(self, templates, encoding):
+        """Distancias normalizadas del encoding a cada fila de la matriz de plantillas"""
+        templates = np.atleast_2d(templates)
+        return np.linalg.norm(templates - encoding, axis=1) / self.distance_scale
+
+
+class DlibFaceEncoder(FaceEncoder):
+    """
+    Encoder ResNet de dlib (face_recognition). 'large' alinea con 68 landmarks,
+    'small' con 5 (más rápido); num_jitters > 1 promedia recortes perturbados.
+    """
+
+    uses_worker_pool = True
+
+    def __init__(self, model='large', num_jitters=1):
+        self.name = f'dlib_{model}'
+        self.options = {'model': model, 'num_jitters': num_jitters}
+
+    def encode(self, rgb, locations):
+        return face_recognition.face_encodings(rgb, locations, **self.options)
+
+
+class SFaceEncoder(FaceEncoder):
+    """
+    Encoder SFace de OpenCV (cv2.FaceRecognizerSF). Cada rostro se alinea con
+    alignCrop a partir de los 5 puntos faciales de YuNet, la entrada con la
+    que se entrenó el modelo y para la que vale su umbral L2 de 1.128.
+    """
+
+    name = 'sface'
+
+    def __init__(self, target='cpu', distance_scale=1.88):
+        self.distance_scale = distance_scale
+        self.target = target
+        self.model_path = model_manager.model_path("face_recognition_sface_2021dec.onnx")
+        self.landmarks_model_path = model_manager.model_path("face_detection_yunet_2023mar.onnx")
+
+        # Ni FaceRecognizerSF ni FaceDetectorYN son seguros entre hilos: una pareja por hilo
+        self._local = threading.local()
+        self._models()
+
+    def _models(self):
+        models = getattr(self._local, 'models', None)
+        if models is None:
+            backend, target_id = dnn_target(self.target)
+            recognizer = cv2.FaceRecognizerSF.create(self.model_path, "", backend, target_id)
+            detector = cv2.FaceDetectorYN.create(
+                self.landmarks_model_path, "", (320, 320), 0.5, 0.3, 5, backend, target_id
+            )
+            # Primer forward fuera del camino crítico
+            recognizer.feature(np.zeros((112, 112, 3), dtype=np.uint8))
+            models = self._local.models = (recognizer, detector)
+        return models
+
+    def _face_row(self, detector, bgr, location):
+        """
+        Fila de YuNet (caja, 5 puntos faciales, confianza) del rostro en
+        'location', buscada en la caja ampliada; None si YuNet no lo encuentra
+        """
+        top, right, bottom, left = location
+        margin_x, margin_y = (right - left) // 4, (bottom - top) // 4
+        h, w = bgr.shape[:2]
+        x0, y0 = max(0, left - margin_x), max(0, top - margin_y)
+        x1, y1 = min(w, right + margin_x), min(h, bottom + margin_y)
+        region = bgr[y0:y1, x0:x1]
+        if region.size == 0:
+            return None
+
+        detector.setInputSize((region.shape[1], region.shape[0]))
+        _, faces = detector.detect(region)
+        if faces is None or len(faces) == 0:
+            return None
+
+        face = faces[np.argmax(faces[:, 14])].copy()
+        face[0:14:2] += x0  # x de la caja y de los 5 puntos
+        face[1:14:2] += y0  # y
+        return face
+
+    def encode(self, rgb, locations):
+        recognizer, detector = self._models()
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+
+        encodings = []
+        for location in locations:
+            face = self._face_row(detector, bgr, location)
+            if face is None:
+                continue
+            feature = recognizer.feature(recognizer.alignCrop(bgr, face)).reshape(-1)
+            # Normalizado: la distancia euclídea es la de match() con FR_NORM_L2
+            encodings.append(feature / np.linalg.norm(feature))
+        return encodings
+
+    def distances(self, templates, encoding):
+        recognizer, _ = self._models()
+        query = np.asarray(encoding, dtype=np.float32).reshape(1, -1)
+        return np.array([
+            recognizer.match(query, template.reshape(1, -1), cv2.FaceRecognizerSF_FR_NORM_L2)
+            for template in np.atleast_2d(templates).astype(np.float32)
+        ]) / self.distance_scale
+
+
+def create_encoder(name):
+    """Instancia el encoder facial por su nombre ('dlib_large', 'dlib_small' o 'sface')"""
+    if name in ('dlib_large', 'dlib_small'):
+        return DlibFaceEncoder(model=name.split('_')[1], num_jitters=Config.FACE_ENCODER_JITTERS)
+    if name == 'sface':
+        return SFaceEncoder(target=Config.FACE_DETECTOR_TARGET, distance_scale=Config.FACE_SFACE_DISTANCE_SCALE)
+    raise ValueError(f"Encoder facial desconocido: {name}")
+
 
 class FacialAuth:
     """Autenticación facial optimizada con detección de vivacidad mediante gestos simples"""
@@ -15,103 +454,361 @@ class FacialAuth:
     def __init__(self):
         self.tolerance = Config.FACE_RECOGNITION_TOLERANCE
         
-        # Optimización: usar búfer para suavizar detecciones
-        self.face_buffer = deque(maxlen=3)
-        self.encoding_buffer = deque(maxlen=3)
-        
         # Umbrales para detección de vivacidad
-        self.EAR_THRESHOLD = 0.14  # Umbral para parpadeo
-        self.MAR_THRESHOLD = 0.21  # Umbral para boca abierta
-        self.CONSECUTIVE_FRAMES = 3  # Frames necesarios para confirmar gesto
+        self.EAR_THRESHOLD = Config.LIVENESS_EAR_CLOSE  # Umbral para parpadeo
+        self.MAR_THRESHOLD = Config.LIVENESS_MAR_OPEN  # Umbral para boca abierta
         
-        # Estados para detectar transiciones
-        self.eye_state_history = deque(maxlen=10)  # Historia de estados de ojos
-        self.mouth_state_history = deque(maxlen=10)  # Historia de estados de boca
+        # Estados para detectar transiciones: un contexto por sesión
+        self.context_pool = LivenessContextPool(tolerance=self.tolerance)
+        self.context = LivenessContext(self.tolerance)  # Contexto de los flujos de terminal
         
-        # Cargar detector DNN
-        self.face_detector = self._load_dnn_detector()
+        # Cargar detector de rostros (una instancia por hilo de trabajo)
         self.confidence_threshold = 0.6
         self.min_face_size = 100
+        self.detector_backend = Config.FACE_DETECTOR_BACKEND
+        with model_manager.track('face_detector', 'load'):
+            self.detector_pool = DetectorPool(self._load_dnn_detector, Config.FACE_WORKER_THREADS)
+        if self.detector_pool.size == 0:
+            model_manager.fail('face_detector', 'load', 'no se pudo cargar ningún detector')
+        self.detection_batcher = None
+
+        # Seguimiento: el DNN solo se ejecuta cada N frames o al perder el rostro
+        self.tracking_enabled = Config.FACE_TRACKING
+        self.redetect_interval = Config.FACE_REDETECT_INTERVAL
+
+        # Chip del rostro: todo el trabajo de identidad y landmarks usa este tamaño
+        self.chip_size = Config.FACE_CHIP_SIZE
+        self.chip_margin = Config.FACE_CHIP_MARGIN
+
+        # Filtro de calidad: no codificar frames que no pueden tener éxito
+        self.quality_gate = Config.FACE_QUALITY_GATE
+        self.min_sharpness = Config.FACE_MIN_SHARPNESS
+        self.min_brightness = Config.FACE_MIN_BRIGHTNESS
+        self.max_brightness = Config.FACE_MAX_BRIGHTNESS
+
+        # Encoder de los registros nuevos; los de verificación siguen la etiqueta de cada plantilla
+        with model_manager.track('face_encoder', 'load'):
+            self.encoder = create_encoder(Config.FACE_ENCODER)
+        self._encoders = {self.encoder.name: self.encoder}
+        self._encoders_lock = threading.Lock()
+
+        # Pool de procesos opcional para encoding y landmarks
+        self.worker_pool = None
     
+    def warm_up(self):
+        """
+        Inferencia de calentamiento de cada modelo facial para que el primer
+        frame real no pague la inicialización perezosa de OpenCV y dlib
+        """
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        chip = np.full((self.chip_size, self.chip_size, 3), 128, dtype=np.uint8)
+        margin = int(self.chip_size * self.chip_margin / (1 + 2 * self.chip_margin))
+        location = (margin, self.chip_size - margin, self.chip_size - margin, margin)
+
+        if self.detector_pool.size:
+            with model_manager.track('face_detector', 'warmup'):
+                # El pool es FIFO: cada instancia se calienta una vez
+                for _ in range(self.detector_pool.size):
+                    with self.detector_pool.acquire() as detector:
+                        detector.detect_batch([frame])
+
+        with model_manager.track('face_encoder', 'warmup'):
+            self._face_encodings(chip, [location])
+
+        with model_manager.track('face_landmarks', 'warmup'):
+            self._face_landmarks(chip, [location])
+
     def _load_dnn_detector(self):
-        """Carga el detector DNN de rostros de OpenCV"""
-        model_dir = "models"
-        os.makedirs(model_dir, exist_ok=True)
-        
-        prototxt_path = os.path.join(model_dir, "deploy.prototxt")
-        model_path = os.path.join(model_dir, "res10_300x300_ssd_iter_140000.caffemodel")
-        
-        prototxt_url = "https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt"
-        model_url = "https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel"
-        
-        try:
-            if not os.path.exists(prototxt_path):
-                print("📥 Descargando modelo DNN (prototxt)...")
-                urllib.request.urlretrieve(prototxt_url, prototxt_path)
-            
-            if not os.path.exists(model_path):
-                print("📥 Descargando modelo DNN (caffemodel)...")
-                urllib.request.urlretrieve(model_url, model_path)
-            
-            net = cv2.dnn.readNetFromCaffe(prototxt_path, model_path)
-            print("✅ Detector DNN cargado")
-            return net
-        except Exception as e:
-            print(f"⚠️ Error al cargar DNN: {e}")
-            return None
+        """Carga el backend del detector de rostros configurado"""
+        return create_detector(
+            self.detector_backend,
+            input_size=Config.FACE_DETECTOR_INPUT_SIZE,
+            target=Config.FACE_DETECTOR_TARGET,
+            confidence_threshold=self.confidence_threshold,
+            min_face_size=self.min_face_size
+        )
     
     def _detect_face_dnn(self, frame):
         """Detecta el rostro principal usando DNN (optimizado)"""
-        if self.face_detector is None:
+        if self.detector_pool.size == 0:
             return None
-        
-        h, w = frame.shape[:2]
-        
-        # Reducir resolución para detección rápida
-        blob = cv2.dnn.blobFromImage(
-            cv2.resize(frame, (300, 300)), 
-            1.0, 
-            (300, 300), 
-            (104.0, 177.0, 123.0)
+
+        # Con micro-batching activo, el frame se agrupa con los de otras sesiones
+        if self.detection_batcher is not None:
+            return self.detection_batcher.detect(frame)
+
+        return self._detect_faces_dnn_batch([frame])[0]
+
+    def _detect_faces_dnn_batch(self, frames):
+        """Detecta el rostro principal de varios frames (un único forward con el backend SSD)"""
+        if self.detector_pool.size == 0:
+            return [None] * len(frames)
+
+        with self.detector_pool.acquire() as detector:
+            return detector.detect_batch(frames)
+
+    def _locate_face(self, frame, context):
+        """
+        Ubica el rostro usando el tracker de la sesión y recurre al DNN
+        cada redetect_interval frames o cuando el seguimiento se pierde
+        """
+        if not self.tracking_enabled:
+            return self._detect_face_dnn(frame)
+
+        tracker = context.tracker
+        if tracker.active and tracker.frames_since_detection < self.redetect_interval:
+            face = tracker.update(frame)
+            if face is not None:
+                return face
+
+        face = self._detect_face_dnn(frame)
+        if face is not None:
+            tracker.start(frame, face)
+        else:
+            tracker.reset()
+        return face
+
+    def enable_detection_batching(self, window_ms=None, max_batch=None):
+        """Activa el micro-batching del detector DNN entre sesiones concurrentes"""
+        if self.detector_pool.size == 0 or self.detection_batcher is not None:
+            return
+        self.detection_batcher = FaceDetectionBatcher(
+            self._detect_faces_dnn_batch,
+            window_ms=window_ms or Config.FACE_DETECTION_BATCH_WINDOW_MS,
+            max_batch=max_batch or Config.FACE_DETECTION_MAX_BATCH,
+            workers=self.detector_pool.size
         )
-        
-        self.face_detector.setInput(blob)
-        detections = self.face_detector.forward()
-        
-        # Encontrar el rostro con mayor confianza
-        best_face = None
-        max_confidence = 0
-        
-        for i in range(detections.shape[2]):
-            confidence = detections[0, 0, i, 2]
-            
-            if confidence > self.confidence_threshold and confidence > max_confidence:
-                box = detections[0, 0, i, 3:7] * np.array([w, h, w, h])
-                (x1, y1, x2, y2) = box.astype("int")
-                
-                x1, y1 = max(0, x1), max(0, y1)
-                x2, y2 = min(w, x2), min(h, y2)
-                
-                if (x2 - x1) >= self.min_face_size and (y2 - y1) >= self.min_face_size:
-                    best_face = (x1, y1, x2, y2, confidence)
-                    max_confidence = confidence
-        
-        return best_face
+        print("✅ Micro-batching del detector DNN activado")
     
-    def _smooth_face_location(self, face):
-        """Suaviza la ubicación del rostro usando un búfer"""
+    def _smooth_face_location(self, face, context=None):
+        """Suaviza la ubicación del rostro usando el búfer del contexto"""
         if face is None:
             return None
+
+        context = context or self.context
+        context.face_buffer.append(face[:4])
         
-        self.face_buffer.append(face[:4])
-        
-        if len(self.face_buffer) < 2:
+        if len(context.face_buffer) < 2:
             return face
         
         # Promediar las últimas detecciones
-        avg_face = np.mean(self.face_buffer, axis=0).astype(int)
+        avg_face = np.mean(context.face_buffer, axis=0).astype(int)
         return tuple(avg_face) + (face[4],)
-    
+
+    def _box_to_location(self, face, frame_shape):
+        """
+        Convierte la caja DNN (x1, y1, x2, y2) al formato de face_recognition
+        (top, right, bottom, left). Retorna None si la caja no es válida.
+        """
+        if face is None:
+            return None
+
+        h, w = frame_shape[:2]
+        x1, y1, x2, y2 = [int(v) for v in face[:4]]
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w, x2), min(h, y2)
+
+        # Rechazar cajas demasiado pequeñas o con proporciones imposibles
+        box_w, box_h = x2 - x1, y2 - y1
+        if box_w < self.min_face_size or box_h < self.min_face_size:
+            return None
+        if not (0.5 <= box_w / box_h <= 2.0):
+            return None
+
+        return (y1, x2, y2, x1)
+
+    def _extract_face_chip(self, frame, face):
+        """
+        Recorta la caja DNN con margen y la reescala a un tamaño fijo de trabajo.
+        Retorna (chip_rgb, ubicación en el chip, (offset_x, offset_y, escala))
+        o None si la caja DNN es rechazada.
+        """
+        location = self._box_to_location(face, frame.shape)
+        if location is None:
+            return None
+
+        h, w = frame.shape[:2]
+        top, right, bottom, left = location
+
+        # Margen alrededor de la caja para no recortar barbilla ni cejas
+        mx = int((right - left) * self.chip_margin)
+        my = int((bottom - top) * self.chip_margin)
+        cx1, cy1 = max(0, left - mx), max(0, top - my)
+        cx2, cy2 = min(w, right + mx), min(h, bottom + my)
+
+        scale = self.chip_size / max(cx2 - cx1, cy2 - cy1)
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        chip = cv2.resize(frame[cy1:cy2, cx1:cx2], None, fx=scale, fy=scale,
+                          interpolation=interpolation)
+        chip_rgb = cv2.cvtColor(chip, cv2.COLOR_BGR2RGB)
+
+        chip_location = (
+            int((top - cy1) * scale),
+            int((right - cx1) * scale),
+            int((bottom - cy1) * scale),
+            int((left - cx1) * scale)
+        )
+        return chip_rgb, chip_location, (cx1, cy1, scale)
+
+    def _chip_to_frame(self, points, transform):
+        """Mapea puntos (x, y) del chip de vuelta a coordenadas del frame"""
+        ox, oy, scale = transform
+        return [(int(x / scale + ox), int(y / scale + oy)) for (x, y) in points]
+
+    # Mensajes para el cliente cuando el frame no supera el filtro de calidad
+    QUALITY_HINTS = {
+        'too_small': 'Acércate más a la cámara',
+        'blurry': 'Imagen borrosa: mantente quieto',
+        'dark': 'Poca luz: busca un lugar más iluminado',
+        'bright': 'Demasiada luz: evita el contraluz o la luz directa',
+    }
+
+    def _assess_face_quality(self, face, face_chip):
+        """
+        Evaluación barata del rostro antes del encoding: tamaño de la caja,
+        nitidez (varianza del Laplaciano) y brillo medio sobre el rostro del chip.
+        Retorna None si el frame es válido o el código del problema encontrado.
+        """
+        if not self.quality_gate or face is None:
+            return None
+
+        if face_chip is None:
+            # Caja rechazada: solo es un problema de calidad si es demasiado pequeña
+            x1, y1, x2, y2 = face[:4]
+            if min(x2 - x1, y2 - y1) < self.min_face_size:
+                return 'too_small'
+            return None
+
+        chip_rgb, (top, right, bottom, left), _ = face_chip
+        gray = cv2.cvtColor(chip_rgb[top:bottom, left:right], cv2.COLOR_RGB2GRAY)
+        if gray.size == 0:
+            return None
+
+        brightness = float(gray.mean())
+        if brightness < self.min_brightness:
+            return 'dark'
+        if brightness > self.max_brightness:
+            return 'bright'
+
+        # El chip tiene tamaño fijo, así que la nitidez es comparable entre frames
+        if cv2.Laplacian(gray, cv2.CV_64F).var() < self.min_sharpness:
+            return 'blurry'
+
+        return None
+
+    def _identity_input(self, frame, face, face_chip=None):
+        """
+        Imagen RGB y ubicaciones para face_encodings.
+        Usa el chip del rostro (tamaño constante) con la caja DNN como ubicación
+        conocida; solo recurre a HOG sobre el frame completo si la caja es rechazada.
+        """
+        if face_chip is None:
+            face_chip = self._extract_face_chip(frame, face)
+        if face_chip is not None:
+            chip_rgb, chip_location, _ = face_chip
+            return chip_rgb, [chip_location]
+
+        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return rgb, face_recognition.face_locations(rgb, model="hog")
+
+    def _get_encoder(self, name):
+        """Encoder por nombre, cargado la primera vez que una plantilla lo requiere"""
+        encoder = self._encoders.get(name)
+        if encoder is None:
+            with self._encoders_lock:
+                encoder = self._encoders.get(name)
+                if encoder is None:
+                    encoder = create_encoder(name)
+                    self._encoders[name] = encoder
+                    print(f"✅ Encoder facial {name} cargado")
+        return encoder
+
+    def _template_encoder(self, stored_encoding):
+        """Encoder que produjo una plantilla almacenada"""
+        return self._get_encoder(unpack_face_template(stored_encoding)[0])
+
+    def _face_encodings(self, rgb, locations, encoder=None):
+        """Encodings del rostro con el encoder indicado (en el pool de procesos si aplica)"""
+        encoder = encoder or self.encoder
+        if self.worker_pool is not None and encoder.uses_worker_pool:
+            return self.worker_pool.face_encodings(rgb, locations, encoder.options)
+        return encoder.encode(rgb, locations)
+
+    def _encode_face(self, frame, face, face_chip=None):
+        """Encoding del rostro detectado en el frame, o None si no se pudo codificar o no supera el filtro de calidad"""
+        if face_chip is None:
+            face_chip = self._extract_face_chip(frame, face)
+        if self._assess_face_quality(face, face_chip) is not None:
+            return None
+
+        rgb, locations = self._identity_input(frame, face, face_chip)
+        if not locations:
+            return None
+        encodings = self._face_encodings(rgb, locations)
+        return encodings[0] if encodings else None
+
+    # Motivos por los que no se añade una plantilla de registro
+    ENROLLMENT_HINTS = {
+        'duplicate': 'Mueve ligeramente la cabeza para variar la toma',
+        'outlier': 'Mantén solo tu rostro frente a la cámara',
+        'encoding_failed': 'No se pudo procesar el rostro: mantente quieto',
+        'reset': 'Reiniciando la captura con la toma actual',
+    }
+
+    def add_enrollment_template(self, templates, encoding):
+        """
+        Añade un encoding a las plantillas de registro.
+        Descarta los casi idénticos a uno ya guardado (no aportan variedad) y los
+        que quedan fuera de la tolerancia (otra persona o un mal frame).
+        Retorna None si se añadió, o el motivo del descarte ('duplicate', 'outlier')
+        """
+        if templates:
+            distances = self.encoder.distances(np.asarray(templates), encoding)
+            if distances.min() < Config.FACE_ENROLLMENT_MIN_SPREAD:
+                return 'duplicate'
+            if distances.max() >= self.tolerance:
+                return 'outlier'
+
+        templates.append(encoding)
+        return None
+
+    def build_template_matrix(self, templates):
+        """
+        Plantilla almacenable: matriz compacta (n x d, float32) con todos los
+        encodings del usuario, etiquetada con el encoder actual
+        """
+        return pack_face_template(self.encoder.name, templates)
+
+    def _match_distance(self, stored_encoding, encoding):
+        """
+        Menor distancia del encoding a las plantillas almacenadas, en una sola
+        operación vectorizada. Acepta un encoding suelto (registros antiguos)
+        o una plantilla etiquetada; el encoding debe venir del mismo encoder.
+        """
+        encoder_name, templates = unpack_face_template(stored_encoding)
+        return float(self._get_encoder(encoder_name).distances(templates, encoding).min())
+
+    def _face_landmarks(self, rgb, locations=None):
+        """Landmarks del rostro, en el pool de procesos si está activo"""
+        if self.worker_pool is not None:
+            return self.worker_pool.face_landmarks(rgb, locations)
+        return face_recognition.face_landmarks(rgb, locations)
+
+    def enable_process_pool(self, processes=None):
+        """
+        Envía encoding y landmarks a procesos trabajadores con los modelos
+        precargados; los chips del rostro viajan por memoria compartida
+        """
+        if self.worker_pool is not None:
+            return
+
+        from face_workers import FaceWorkerPool
+
+        processes = processes or Config.FACE_PROCESS_WORKERS
+        chip_bytes = self.chip_size * self.chip_size * 3
+        self.worker_pool = FaceWorkerPool(processes, chip_bytes)
+        print(f"✅ Pool de procesos faciales activado ({processes} procesos)")
+
     def _draw_face_box(self, frame, box, label="", color=(0, 255, 0)):
         """Dibuja un rectángulo elegante alrededor del rostro"""
         x1, y1, x2, y2 = box[:4]
@@ -145,127 +842,55 @@ class FacialAuth:
             cv2.putText(frame, label, (x1 + 7, y1 - 7),
                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
-    def _detect_blink_transition(self, ear):
-        """Detecta una transición completa de ojos: abierto -> cerrado -> abierto"""
-        # Determinar estado actual
-        current_state = "open" if ear >= self.EAR_THRESHOLD else "closed"
-        self.eye_state_history.append(current_state)
-        
-        # Necesitamos al menos 7 estados para detectar una transición
-        if len(self.eye_state_history) < 7:
-            return False, "Inicializando..."
-        
-        # Buscar patrón: abierto -> cerrado -> abierto
-        states = list(self.eye_state_history)
-        
-        # Contar estados consecutivos al final
-        open_count_end = 0
-        for state in reversed(states):
-            if state == "open":
-                open_count_end += 1
-            else:
-                break
-        
-        # Si hay al menos 2 frames abiertos al final
-        if open_count_end >= 2:
-            # Buscar si hubo un cierre antes
-            closed_found = False
-            open_found_before = False
-            
-            for i in range(len(states) - open_count_end - 1, -1, -1):
-                if states[i] == "closed" and not closed_found:
-                    closed_found = True
-                elif states[i] == "open" and closed_found:
-                    open_found_before = True
-                    break
-            
-            if open_found_before and closed_found:
-                return True, "Parpadeo completo detectado!"
-        
-        # Estados de progreso
-        if current_state == "closed":
-            return False, "Cerrando ojos..."
-        elif open_count_end >= 1 and any(s == "closed" for s in states[:-open_count_end]):
-            return False, "Abriendo ojos..."
-        else:
-            return False, "Esperando parpadeo..."
+    # Pares de puntos de cada ratio sobre [ojo izq (6), ojo der (6), boca (24)]:
+    # dos distancias verticales y una horizontal por ojo y para la boca
+    RATIO_POINTS_A = np.array([1, 2, 0, 7, 8, 6, 14, 16, 12])
+    RATIO_POINTS_B = np.array([5, 4, 3, 11, 10, 9, 22, 20, 18])
+
+    def _aspect_ratios(self, left_eye, right_eye, mouth):
+        """
+        Calcula EAR de ambos ojos y MAR en una sola operación vectorizada.
+        Retorna (ear_izquierdo, ear_derecho, mar)
+        """
+        points = np.asarray(left_eye + right_eye + mouth, dtype=np.float32)
+        distances = np.linalg.norm(
+            points[self.RATIO_POINTS_A] - points[self.RATIO_POINTS_B], axis=1
+        ).reshape(3, 3)
+        ratios = (distances[:, 0] + distances[:, 1]) / (2.0 * distances[:, 2])
+        return float(ratios[0]), float(ratios[1]), float(ratios[2])
     
-    def _detect_mouth_transition(self, mar):
-        """Detecta una transición completa de boca: cerrada -> abierta -> cerrada (MÁS FLEXIBLE)"""
-        # Determinar estado actual
-        current_state = "open" if mar > self.MAR_THRESHOLD else "closed"
-        self.mouth_state_history.append(current_state)
-        
-        # Necesitamos al menos 5 estados (reducido de 7 para ser más flexible)
-        if len(self.mouth_state_history) < 5:
-            return False, "Inicializando..."
-        
-        # Buscar patrón: cerrada -> abierta -> cerrada
-        states = list(self.mouth_state_history)
-        
-        # Contar estados consecutivos al final
-        closed_count_end = 0
-        for state in reversed(states):
-            if state == "closed":
-                closed_count_end += 1
-            else:
-                break
-        
-        # Si hay al menos 1 frame cerrado al final (más flexible)
-        if closed_count_end >= 1:
-            # Buscar si hubo una apertura antes
-            open_found = False
-            closed_found_before = False
-            
-            for i in range(len(states) - closed_count_end - 1, -1, -1):
-                if states[i] == "open" and not open_found:
-                    open_found = True
-                elif states[i] == "closed" and open_found:
-                    closed_found_before = True
-                    break
-            
-            if closed_found_before and open_found:
-                return True, "Boca: transición completa!"
-        
-        # Estados de progreso
-        if current_state == "open":
-            return False, "Boca abierta, ahora cierra!"
-        elif closed_count_end >= 1 and any(s == "open" for s in states[:-closed_count_end]):
-            return False, "Cerrando boca..."
+    def _yaw_ratio(self, landmarks, left_eye, right_eye):
+        """
+        Aproximación del giro de cabeza: desplazamiento horizontal de la punta
+        de la nariz respecto al punto medio de los ojos, en distancias entre ojos
+        """
+        nose = landmarks.get('nose_tip')
+        if not nose:
+            return float('nan')
+        left_x = np.mean([p[0] for p in left_eye])
+        right_x = np.mean([p[0] for p in right_eye])
+        eye_distance = abs(right_x - left_x)
+        if eye_distance < 1e-6:
+            return float('nan')
+        nose_x = np.mean([p[0] for p in nose])
+        return float((nose_x - (left_x + right_x) / 2.0) / eye_distance)
+
+    def _detect_liveness_gesture(self, frame, face=None, draw_keypoints=False):
+        """
+        Detecta gestos de vivacidad: parpadeo o boca abierta.
+        Con una caja conocida (DNN o tracker) solo se extraen landmarks sobre
+        el chip del rostro; sin caja se recurre a la búsqueda HOG completa.
+        """
+        face_chip = self._extract_face_chip(frame, face) if face is not None else None
+
+        if face_chip is not None:
+            # Landmarks sobre el chip del rostro, luego se mapean al frame
+            chip_rgb, chip_location, transform = face_chip
+            landmarks = self._face_landmarks(chip_rgb, [chip_location])
         else:
-            return False, "Abre la boca ampliamente..."
-    
-    def _eye_aspect_ratio(self, eye):
-        """Calcula el EAR (Eye Aspect Ratio) para detectar parpadeos"""
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        return (A + B) / (2.0 * C)
-    
-    def _mouth_aspect_ratio(self, mouth):
-        """Calcula el MAR (Mouth Aspect Ratio) para detectar boca abierta"""
-        A = dist.euclidean(mouth[2], mouth[10])  # Vertical
-        B = dist.euclidean(mouth[4], mouth[8])   # Vertical
-        C = dist.euclidean(mouth[0], mouth[6])   # Horizontal
-        return (A + B) / (2.0 * C)
-    
-        """Calcula el EAR (Eye Aspect Ratio) para detectar parpadeos"""
-        A = dist.euclidean(eye[1], eye[5])
-        B = dist.euclidean(eye[2], eye[4])
-        C = dist.euclidean(eye[0], eye[3])
-        return (A + B) / (2.0 * C)
-    
-    def _mouth_aspect_ratio(self, mouth):
-        """Calcula el MAR (Mouth Aspect Ratio) para detectar boca abierta"""
-        A = dist.euclidean(mouth[2], mouth[10])  # Vertical
-        B = dist.euclidean(mouth[4], mouth[8])   # Vertical
-        C = dist.euclidean(mouth[0], mouth[6])   # Horizontal
-        return (A + B) / (2.0 * C)
-    
-    def _detect_liveness_gesture(self, frame, draw_keypoints=False):
-        """Detecta gestos de vivacidad: parpadeo o boca abierta"""
-        rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        landmarks = face_recognition.face_landmarks(rgb)
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            landmarks = self._face_landmarks(rgb)
+            transform = None
         
         if not landmarks:
             return None, 0.0, None
@@ -274,13 +899,16 @@ class FacialAuth:
         left_eye = landmarks[0]['left_eye']
         right_eye = landmarks[0]['right_eye']
         mouth = landmarks[0]['bottom_lip'] + landmarks[0]['top_lip']
-        
-        # Calcular ratios
-        left_ear = self._eye_aspect_ratio(left_eye)
-        right_ear = self._eye_aspect_ratio(right_eye)
+
+        # Calcular ratios (invariantes a escala: se calculan sobre el chip)
+        left_ear, right_ear, mar = self._aspect_ratios(left_eye, right_eye, mouth)
         ear = (left_ear + right_ear) / 2.0
-        
-        mar = self._mouth_aspect_ratio(mouth)
+        yaw = self._yaw_ratio(landmarks[0], left_eye, right_eye)
+
+        if transform is not None:
+            left_eye = self._chip_to_frame(left_eye, transform)
+            right_eye = self._chip_to_frame(right_eye, transform)
+            mouth = self._chip_to_frame(mouth, transform)
         
         # Preparar datos de keypoints
         keypoints_data = {
@@ -288,7 +916,8 @@ class FacialAuth:
             'right_eye': right_eye,
             'mouth': mouth,
             'ear': ear,
-            'mar': mar
+            'mar': mar,
+            'yaw': yaw
         }
         
         # Determinar gesto
@@ -357,24 +986,44 @@ class FacialAuth:
         cv2.putText(frame, f"Umbral boca: >{self.MAR_THRESHOLD:.2f}", (10, 90),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
     
-    def capture_and_encode_face(self, username):
-        """Captura la cara del usuario y guarda su encoding (OPTIMIZADO)"""
+    def _show(self, window, image):
+        """Muestra un frame de los flujos de terminal (nada en modo sin ventana)"""
+        if not Config.FACE_CLI_HEADLESS:
+            cv2.imshow(window, image)
+
+    def _wait_key(self, delay):
+        """Tecla pulsada (0xFF si no hay ninguna o no hay ventana)"""
+        if Config.FACE_CLI_HEADLESS:
+            return 0xFF
+        return cv2.waitKey(delay) & 0xFF
+
+    def _close_source(self, cap):
+        """Libera la fuente de video, cierra las ventanas y resume el rendimiento"""
+        cap.release()
+        if not Config.FACE_CLI_HEADLESS:
+            cv2.destroyAllWindows()
+            cv2.waitKey(1)
+        print(f"📊 {cap.frames} frames a {cap.fps:.1f} FPS ({cap.dropped} descartados)")
+
+    def capture_and_encode_face(self, username, source=None):
+        """
+        Captura la cara del usuario y guarda su encoding (OPTIMIZADO).
+        source: cámara, video o directorio (por defecto Config.FACE_VIDEO_SOURCE)
+        """
         print("\n📸 Capturando tu rostro para registro...")
         print("• Colócate frente a la cámara con buena iluminación")
         print("• Mantén el rostro dentro del recuadro verde")
         print("• Presiona 'ESPACIO' cuando el sistema esté listo")
         print("• Presiona 'q' para cancelar\n")
         
-        cap = cv2.VideoCapture(0)
+        # Lectura en segundo plano: la cámara no espera al procesamiento
+        cap = open_video_source(source)
         
         if not cap.isOpened():
             print("❌ No se pudo acceder a la cámara")
+            cap.release()
             return None
         
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Resolución reducida para fluidez
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        
         encoding = None
         frame_count = 0
         stable_frames = 0
@@ -427,26 +1076,26 @@ class FacialAuth:
                 cv2.putText(display, "Coloca tu rostro frente a la camara", 
                            (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
             
-            cv2.imshow('Registro Facial', display)
+            self._show('Registro Facial', display)
             
-            key = cv2.waitKey(1) & 0xFF
+            key = self._wait_key(1)
             
-            if key == ord(' ') and stable_frames >= required_stable:
+            # Sin ventana se captura en cuanto el rostro está estable
+            if (key == ord(' ') or Config.FACE_CLI_HEADLESS) and stable_frames >= required_stable:
                 print("⏳ Procesando captura...")
                 
                 # Mostrar mensaje de procesamiento
                 process = display.copy()
                 cv2.putText(process, "PROCESANDO...", (w//2 - 120, h//2),
                            cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 255, 255), 3)
-                cv2.imshow('Registro Facial', process)
-                cv2.waitKey(100)
+                self._show('Registro Facial', process)
+                self._wait_key(100)
                 
                 # Codificar rostro
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                locations = face_recognition.face_locations(rgb, model="hog")
+                rgb, locations = self._identity_input(frame, last_face)
                 
                 if locations:
-                    encodings = face_recognition.face_encodings(rgb, locations)
+                    encodings = self._face_encodings(rgb, locations)
                     if encodings:
                         encoding = encodings[0]
                         
@@ -472,8 +1121,8 @@ class FacialAuth:
                         cv2.line(success, (center_x - 3, center_y + 10), 
                                 (center_x + 15, center_y - 10), (255, 255, 255), 3)
                         
-                        cv2.imshow('Registro Facial', success)
-                        cv2.waitKey(1500)
+                        self._show('Registro Facial', success)
+                        self._wait_key(1500)
                         
                         print("✅ Rostro capturado correctamente")
                         break
@@ -485,13 +1134,11 @@ class FacialAuth:
                 print("❌ Captura cancelada")
                 break
         
-        cap.release()
-        cv2.destroyAllWindows()
-        cv2.waitKey(1)
+        self._close_source(cap)
         
-        return encoding
+        return self.build_template_matrix([encoding]) if encoding is not None else None
     
-    def verify_with_liveness(self, username, stored_encoding, skip_prompt=False):
+    def verify_with_liveness(self, username, stored_encoding, skip_prompt=False, source=None):
         """Verifica identidad con detección de vivacidad por TRANSICIONES (MEJORADO)"""
         print("\n🔍 Verificación facial con detección de vivacidad")
         print("\nInstrucciones:")
@@ -502,26 +1149,23 @@ class FacialAuth:
         print("\n🚨 IMPORTANTE: Se detectan MOVIMIENTOS, no estados estáticos")
         print("Presiona 'q' para cancelar\n")
 
-        if not skip_prompt:
+        if not skip_prompt and not Config.FACE_CLI_HEADLESS:
             input("Presiona ENTER para comenzar...")
         
-        cap = cv2.VideoCapture(0)
+        cap = open_video_source(source)
         
         if not cap.isOpened():
             print("❌ No se pudo acceder a la cámara")
+            cap.release()
             return False
         
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        cap.set(cv2.CAP_PROP_FPS, 30)
-        
         # Estados de verificación
         identity_verified = False
-        blink_transition_detected = False
-        mouth_transition_detected = False
         
-        frames_verified = 0
-        required_verified = 10
+        identity_rejected = False
+        identity = self.context.identity
+        gestures = self.context.gestures
+        template_encoder = self._template_encoder(stored_encoding)
         
         last_face = None
         frame_count = 0
@@ -529,11 +1173,7 @@ class FacialAuth:
         max_timeout = 900  # 30 segundos de timeout
         
         # Reiniciar historiales
-        self.eye_state_history.clear()
-        self.mouth_state_history.clear()
-        
-        blink_status_msg = "Esperando..."
-        mouth_status_msg = "Esperando..."
+        self.context.reset()
         
         print("⏳ Iniciando verificación...\n")
 
@@ -541,7 +1181,7 @@ class FacialAuth:
             try:
                 ret, frame = cap.read()
                 if not ret:
-                    print("DEBUG: cap.read() returned False")
+                    print("DEBUG: cap.read() returned False (fin de la fuente o cámara sin frames)")
                     break
             except Exception as e:
                 print(f"DEBUG: Error en cap.read(): {type(e).__name__}: {e}")
@@ -572,56 +1212,47 @@ class FacialAuth:
                     print(f"DEBUG: Error en _detect_face_dnn(): {type(e).__name__}: {e}")
                     break
             
-            # Verificar identidad si hay rostro detectado
-            if last_face and frame_count % 5 == 0:
+            # Verificar identidad (hasta que la prueba secuencial la acepte)
+            if last_face and not identity_verified and frame_count % 5 == 0:
                 try:
-                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                    rgb, locations = self._identity_input(frame, last_face)
                 except Exception as e:
-                    print(f"DEBUG: Error en cv2.cvtColor(): {type(e).__name__}: {e}")
-                    break
-
-                try:
-                    locations = face_recognition.face_locations(rgb, model="hog")
-                except Exception as e:
-                    print(f"DEBUG: Error en face_locations(): {type(e).__name__}: {e}")
+                    print(f"DEBUG: Error en _identity_input(): {type(e).__name__}: {e}")
                     break
 
                 if locations:
                     try:
-                        encodings = face_recognition.face_encodings(rgb, locations)
+                        encodings = self._face_encodings(rgb, locations, template_encoder)
                     except Exception as e:
                         print(f"DEBUG: Error en face_encodings(): {type(e).__name__}: {e}")
                         break
 
                     if encodings:
                         try:
-                            matches = face_recognition.compare_faces(
-                                [stored_encoding], encodings[0], tolerance=self.tolerance
-                            )
-                            distance = face_recognition.face_distance(
-                                [stored_encoding], encodings[0]
-                            )[0]
-
-                            if matches[0] and distance < self.tolerance:
+                            distance = self._match_distance(stored_encoding, encodings[0])
+                            decision = identity.update(distance)
+
+                            if decision == SequentialIdentityTest.ACCEPT:
                                 identity_verified = True
-                                frames_verified += 1
+                            elif decision == SequentialIdentityTest.REJECT:
+                                identity_rejected = True
+                                identity.reset()
                             else:
-                                identity_verified = False
-                                frames_verified = 0
+                                identity_rejected = False
                         except Exception as e:
-                            print(f"DEBUG: Error en compare_faces/face_distance(): {type(e).__name__}: {e}")
+                            print(f"DEBUG: Error en face_distance(): {type(e).__name__}: {e}")
                             break
             
             # Dibujar rostro y estado
             if last_face:
                 x1, y1, x2, y2, conf = last_face
                 
-                if identity_verified and frames_verified >= required_verified:
+                if identity_verified:
                     # Identidad confirmada, detectar transiciones
-                    if not (blink_transition_detected and mouth_transition_detected):
+                    if not gestures.complete:
                         # Detectar gestos en cada frame
                         try:
-                            gesture, value, keypoints = self._detect_liveness_gesture(frame)
+                            gesture, value, keypoints = self._detect_liveness_gesture(frame, last_face)
                         except Exception as e:
                             print(f"DEBUG: Error en _detect_liveness_gesture(): {type(e).__name__}: {e}")
                             break
@@ -634,51 +1265,25 @@ class FacialAuth:
                                 print(f"DEBUG: Error en _draw_keypoints(): {type(e).__name__}: {e}")
                                 break
                             
-                            ear = keypoints['ear']
-                            mar = keypoints['mar']
-                            
-                            # Detectar transición de parpadeo
-                            if not blink_transition_detected:
-                                blink_complete, blink_status_msg = self._detect_blink_transition(ear)
-                                if blink_complete:
-                                    blink_transition_detected = True
-                                    print("✅ Parpadeo completo detectado")
-                                    self.eye_state_history.clear()  # Limpiar para evitar re-detección
-                            
-                            # Detectar transición de boca
-                            if not mouth_transition_detected:
-                                mouth_complete, mouth_status_msg = self._detect_mouth_transition(mar)
-                                if mouth_complete:
-                                    mouth_transition_detected = True
-                                    print("✅ Apertura/cierre de boca completo detectado")
-                                    self.mouth_state_history.clear()  # Limpiar para evitar re-detección
+                            # Avanzar las máquinas de estado de los gestos pendientes
+                            for name in gestures.update(keypoints['ear'], keypoints['mar'], keypoints['yaw']):
+                                print(f"✅ Gesto completado: {name}")
                         
                         # Determinar mensaje principal
-                        if not blink_transition_detected and not mouth_transition_detected:
-                            color = (0, 165, 255)
-                            label = "Realiza ambos gestos"
-                        elif blink_transition_detected and not mouth_transition_detected:
-                            color = (0, 255, 255)
-                            label = "Ahora: Abre y cierra la BOCA"
-                        elif not blink_transition_detected and mouth_transition_detected:
-                            color = (0, 255, 255)
-                            label = "Ahora: PARPADEA"
+                        color = (0, 255, 255) if gestures.completed_count else (0, 165, 255)
+                        label = gestures.prompt()
                         
                         # Mostrar checklist con estados
                         check_y = y1 - 110
-
+                        
                         try:
-                            # Estado del parpadeo
-                            blink_icon = "✓" if blink_transition_detected else "⟳"
-                            blink_color = (0, 255, 0) if blink_transition_detected else (0, 165, 255)
-                            cv2.putText(display, f"{blink_icon} Parpadeo: {blink_status_msg}", (x1, check_y),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, blink_color, 2)
-
-                            # Estado de la boca
-                            mouth_icon = "✓" if mouth_transition_detected else "⟳"
-                            mouth_color = (0, 255, 0) if mouth_transition_detected else (0, 165, 255)
-                            cv2.putText(display, f"{mouth_icon} Boca: {mouth_status_msg}", (x1, check_y + 25),
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, mouth_color, 2)
+                            for i, spec in enumerate(gestures.specs):
+                                done = gestures.done(spec.name)
+                                icon = "✓" if done else "⟳"
+                                check_color = (0, 255, 0) if done else (0, 165, 255)
+                                cv2.putText(display, f"{icon} {spec.label}: {gestures.status(spec.name)}",
+                                           (x1, check_y + 25 * i),
+                                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, check_color, 2)
                         except Exception as e:
                             print(f"DEBUG: Error en cv2.putText() checklist: {type(e).__name__}: {e}")
                             break
@@ -693,8 +1298,8 @@ class FacialAuth:
                         print(f"DEBUG: Error en _draw_face_box(): {type(e).__name__}: {e}")
                         break
                     
-                    # Terminar si ambas transiciones fueron detectadas
-                    if blink_transition_detected and mouth_transition_detected:
+                    # Terminar cuando se completen todos los gestos
+                    if gestures.complete:
                         # Crear pantalla de éxito animada
                         success_frame = display.copy()
                         overlay = success_frame.copy()
@@ -719,33 +1324,29 @@ class FacialAuth:
                         cv2.line(success_frame, (center_x - 5, center_y + 15), 
                                 (center_x + 20, center_y - 15), (255, 255, 255), 4)
                         
-                        cv2.imshow('Verificacion Facial', success_frame)
-                        cv2.waitKey(2500)
+                        self._show('Verificacion Facial', success_frame)
+                        self._wait_key(2500)
                         break
                     
-                elif identity_verified:
+                elif not identity_rejected:
                     color = (0, 165, 255)
-                    label = f"Verificando identidad... {frames_verified}/{required_verified}"
+                    label = f"Verificando identidad... {int(identity.progress * 100)}%"
                     self._draw_face_box(display, (x1, y1, x2, y2), label, color)
                 else:
                     color = (0, 0, 255)
                     label = "Rostro no reconocido"
                     self._draw_face_box(display, (x1, y1, x2, y2), label, color)
-                    frames_verified = 0
             else:
                 cv2.putText(display, "Coloca tu rostro frente a la camara", 
                            (10, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-                frames_verified = 0
+                if not identity_verified:
+                    identity.reset()
             
             # Barra de progreso mejorada
-            if identity_verified and frames_verified >= required_verified:
-                progress = 33
-                if blink_transition_detected:
-                    progress += 33
-                if mouth_transition_detected:
-                    progress += 34
+            if identity_verified:
+                progress = 33 + 67 * gestures.progress
             else:
-                progress = min((frames_verified / required_verified) * 33, 33)
+                progress = identity.progress * 33
 
             try:
                 bar_w = int((progress / 100) * 600)
@@ -758,13 +1359,13 @@ class FacialAuth:
                 break
 
             try:
-                cv2.imshow('Verificacion Facial', display)
+                self._show('Verificacion Facial', display)
             except Exception as e:
                 print(f"DEBUG: Error en cv2.imshow(): {type(e).__name__}: {e}")
                 break
 
             try:
-                key_press = cv2.waitKey(1) & 0xFF
+                key_press = self._wait_key(1)
                 if key_press == ord('q'):
                     print("❌ Verificación cancelada")
                     break
@@ -772,11 +1373,9 @@ class FacialAuth:
                 print(f"DEBUG: Error en cv2.waitKey(): {type(e).__name__}: {e}")
                 break
         
-        cap.release()
-        cv2.destroyAllWindows()
-        cv2.waitKey(1)
+        self._close_source(cap)
         
-        success = identity_verified and blink_transition_detected and mouth_transition_detected
+        success = identity_verified and gestures.complete
         
         if success:
             print("\n" + "="*60)
@@ -787,10 +1386,9 @@ class FacialAuth:
             print("❌ VERIFICACIÓN FALLIDA")
             if not identity_verified:
                 print("   Motivo: Identidad no confirmada")
-            elif not blink_transition_detected:
-                print("   Motivo: No se detectó transición de parpadeo completa")
-            elif not mouth_transition_detected:
-                print("   Motivo: No se detectó transición de boca completa")
+            elif not gestures.complete:
+                pending = ", ".join(spec.label for spec in gestures.pending)
+                print(f"   Motivo: Gestos sin completar ({pending})")
             print("="*60)
         
         return success
@@ -800,27 +1398,30 @@ class FacialAuth:
         Procesa un frame individual para verificación en tiempo real (Flask + Socket.IO)
         Retorna el estado actual y si la verificación está completa
         """
-        # Detectar rostro
-        face = self._detect_face_dnn(frame)
+        # Contexto propio de la sesión (seguimiento e historiales de gestos)
+        if state.get('liveness') is None:
+            state['liveness'] = self.context_pool.acquire()
+        context = state['liveness']
+
+        # Detectar o seguir el rostro
+        face = self._locate_face(frame, context)
 
         if face is None:
             # Si ya verificó identidad, mantener el estado (puede ser gesto extremo)
             if state.get('identity_verified', False):
-                current_progress = 33
-                if state.get('blink_detected', False):
-                    current_progress += 33
-                if state.get('mouth_detected', False):
-                    current_progress += 34
-
+                gestures = context.gestures
                 return {
                     'face_detected': False,
                     'identity_verified': True,
                     'message': 'Rostro temporalmente no detectado (continúa con los gestos)',
-                    'progress': current_progress,
-                    'blink_detected': state.get('blink_detected', False),
-                    'mouth_detected': state.get('mouth_detected', False)
+                    'progress': 33 + int(67 * gestures.progress),
+                    'blink_detected': gestures.done('blink'),
+                    'mouth_detected': gestures.done('mouth'),
+                    'gestures': gestures.summary()
                 }
 
+            # La evidencia acumulada no debe contar para quien aparezca después
+            context.identity.reset()
             return {
                 'face_detected': False,
                 'message': 'Coloca tu rostro frente a la cámara',
@@ -831,177 +1432,102 @@ class FacialAuth:
 
         # Verificar identidad solo si aún no está verificada
         if not state.get('identity_verified', False):
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            locations = face_recognition.face_locations(rgb, model="hog")
+            box = {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
+            identity = context.identity
+            face_chip = self._extract_face_chip(frame, face)
+
+            # Filtro de calidad: saltar el encoding sin tocar la evidencia acumulada
+            quality_issue = self._assess_face_quality(face, face_chip)
+            if quality_issue is not None:
+                return {
+                    'face_detected': True,
+                    'identity_verified': False,
+                    'message': self.QUALITY_HINTS[quality_issue],
+                    'quality_hint': quality_issue,
+                    'progress': int(identity.progress * 33),
+                    'box': box
+                }
+
+            rgb, locations = self._identity_input(frame, face, face_chip)
 
             if not locations:
-                # No resetear si ya estamos cerca de verificar
-                if state.get('frames_verified', 0) < 5:
-                    return {
-                        'face_detected': True,
-                        'identity_verified': False,
-                        'message': 'No se puede reconocer el rostro',
-                        'progress': 0,
-                        'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-                    }
-                else:
-                    # Mantener progreso si ya verificamos varios frames
-                    progress = int((state['frames_verified'] / 10) * 33)
-                    return {
-                        'face_detected': True,
-                        'identity_verified': False,
-                        'message': f'Verificando identidad... {state["frames_verified"]}/10',
-                        'progress': progress,
-                        'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-                    }
-
-            encodings = face_recognition.face_encodings(rgb, locations)
+                return {
+                    'face_detected': True,
+                    'identity_verified': False,
+                    'message': 'No se puede reconocer el rostro',
+                    'progress': int(identity.progress * 33),
+                    'box': box
+                }
 
-            if not encodings:
-                # Igual que arriba, no resetear si estamos cerca
-                if state.get('frames_verified', 0) < 5:
-                    return {
-                        'face_detected': True,
-                        'identity_verified': False,
-                        'message': 'No se puede codificar el rostro',
-                        'progress': 0,
-                        'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-                    }
-                else:
-                    progress = int((state['frames_verified'] / 10) * 33)
-                    return {
-                        'face_detected': True,
-                        'identity_verified': False,
-                        'message': f'Verificando identidad... {state["frames_verified"]}/10',
-                        'progress': progress,
-                        'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-                    }
-
-            matches = face_recognition.compare_faces([stored_encoding], encodings[0], tolerance=self.tolerance)
-            distance = face_recognition.face_distance([stored_encoding], encodings[0])[0]
-
-            if matches[0] and distance < self.tolerance:
-                state['frames_verified'] += 1
-            else:
-                # Solo resetear si fallamos con baja confianza
-                if state.get('frames_verified', 0) < 5:
-                    state['frames_verified'] = 0
-                    return {
-                        'face_detected': True,
-                        'identity_verified': False,
-                        'message': 'Rostro no reconocido',
-                        'progress': 0,
-                        'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-                    }
-                # Si ya teníamos varios frames verificados, decrementar lentamente en lugar de resetear
-                else:
-                    state['frames_verified'] = max(0, state['frames_verified'] - 2)
+            encodings = self._face_encodings(rgb, locations, self._template_encoder(stored_encoding))
 
-            # Verificar si alcanzamos el umbral
-            if state['frames_verified'] >= 10:
-                state['identity_verified'] = True
-            else:
-                progress = int((state['frames_verified'] / 10) * 33)
+            if not encodings:
                 return {
                     'face_detected': True,
                     'identity_verified': False,
-                    'message': f'Verificando identidad... {state["frames_verified"]}/10',
-                    'progress': progress,
-                    'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
+                    'message': 'No se puede codificar el rostro',
+                    'progress': int(identity.progress * 33),
+                    'box': box
                 }
 
-        # Si la identidad está verificada, detectar gestos de vivacidad
-        if state.get('identity_verified', False):
-            state['identity_verified'] = True
-
-            # Detectar gestos
-            gesture, value, keypoints = self._detect_liveness_gesture(frame)
-
-            if keypoints:
-                ear = keypoints['ear']
-                mar = keypoints['mar']
-
-                # Detectar parpadeo
-                if not state['blink_detected']:
-                    # Inicializar historial en el estado si no existe
-                    if 'eye_history' not in state:
-                        state['eye_history'] = []
-
-                    current_state = "open" if ear >= self.EAR_THRESHOLD else "closed"
-                    state['eye_history'].append(current_state)
-
-                    if len(state['eye_history']) > 10:
-                        state['eye_history'].pop(0)
-
-                    # Detectar transición completa
-                    if len(state['eye_history']) >= 7:
-                        eye_hist = state['eye_history']
-                        if 'closed' in eye_hist[-5:] and eye_hist[-1] == 'open' and eye_hist[-2] == 'open':
-                            state['blink_detected'] = True
-
-                # Detectar boca
-                if not state['mouth_detected']:
-                    # Inicializar historial en el estado si no existe
-                    if 'mouth_history' not in state:
-                        state['mouth_history'] = []
-
-                    current_state = "open" if mar > self.MAR_THRESHOLD else "closed"
-                    state['mouth_history'].append(current_state)
-
-                    if len(state['mouth_history']) > 10:
-                        state['mouth_history'].pop(0)
-
-                    # Detectar transición completa
-                    if len(state['mouth_history']) >= 5:
-                        mouth_hist = state['mouth_history']
-                        if 'open' in mouth_hist[-4:] and mouth_hist[-1] == 'closed':
-                            state['mouth_detected'] = True
-
-            # Calcular progreso
-            progress = 33  # Identidad verificada
-            if state['blink_detected']:
-                progress += 33
-            if state['mouth_detected']:
-                progress += 34
-
-            # Verificar si está completo
-            if state['blink_detected'] and state['mouth_detected']:
+            # Acumular evidencia con la distancia a la plantilla más cercana del usuario
+            distance = self._match_distance(stored_encoding, encodings[0])
+            decision = identity.update(distance)
+
+            if decision == SequentialIdentityTest.REJECT:
+                identity.reset()
                 return {
                     'face_detected': True,
-                    'identity_verified': True,
-                    'blink_detected': True,
-                    'mouth_detected': True,
-                    'success': True,
-                    'message': '¡Verificación exitosa!',
-                    'progress': 100,
-                    'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
+                    'identity_verified': False,
+                    'message': 'Rostro no reconocido',
+                    'progress': 0,
+                    'box': box
                 }
 
-            # Mensaje según lo que falta
-            if not state['blink_detected'] and not state['mouth_detected']:
-                message = 'Parpadea y abre la boca'
-            elif state['blink_detected'] and not state['mouth_detected']:
-                message = 'Ahora abre y cierra la boca'
+            if decision == SequentialIdentityTest.ACCEPT:
+                print(f"✓ Identidad confirmada en {identity.frames} frames")
+                state['identity_verified'] = True
             else:
-                message = 'Ahora parpadea'
+                return {
+                    'face_detected': True,
+                    'identity_verified': False,
+                    'message': f'Verificando identidad... {int(identity.progress * 100)}%',
+                    'progress': int(identity.progress * 33),
+                    'box': box
+                }
+
+        # Identidad verificada: detectar gestos con una actualización O(1) del estado de la sesión
+        gesture, value, keypoints = self._detect_liveness_gesture(frame, face)
+        gestures = context.gestures
+
+        if keypoints:
+            gestures.update(keypoints['ear'], keypoints['mar'], keypoints['yaw'])
+
+        box = {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
 
+        # Verificar si está completo
+        if gestures.complete:
             return {
                 'face_detected': True,
                 'identity_verified': True,
-                'blink_detected': state['blink_detected'],
-                'mouth_detected': state['mouth_detected'],
-                'message': message,
-                'progress': progress,
-                'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)},
-                'ear': float(ear) if keypoints else 0,
-                'mar': float(mar) if keypoints else 0
+                'blink_detected': gestures.done('blink'),
+                'mouth_detected': gestures.done('mouth'),
+                'gestures': gestures.summary(),
+                'success': True,
+                'message': '¡Verificación exitosa!',
+                'progress': 100,
+                'box': box
             }
-        else:
-            progress = int((state['frames_verified'] / 10) * 33)
-            return {
-                'face_detected': True,
-                'identity_verified': False,
-                'message': f'Verificando identidad... {state["frames_verified"]}/10',
-                'progress': progress,
-                'box': {'x1': int(x1), 'y1': int(y1), 'x2': int(x2), 'y2': int(y2)}
-            }
\ No newline at end of file
+
+        return {
+            'face_detected': True,
+            'identity_verified': True,
+            'blink_detected': gestures.done('blink'),
+            'mouth_detected': gestures.done('mouth'),
+            'gestures': gestures.summary(),
+            'message': gestures.prompt(),
+            'progress': 33 + int(67 * gestures.progress),
+            'box': box,
+            'ear': float(keypoints['ear']) if keypoints else 0,
+            'mar': float(keypoints['mar']) if keypoints else 0
+        }
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Ingestión de frames de video por sesión con política "el último frame gana"
+Evita que se acumule una cola de frames cuando el servidor va más lento que el cliente
+"""
+
+import threading
+import time
+
+
+class LatestFrameSlot:
+    """
+    Ranura de una sesión: guarda solo el frame pendiente más reciente y
+    descarta los que superan el plazo máximo de antigüedad
+    """
+
+    def __init__(self, deadline_ms):
+        self.deadline_ms = deadline_ms
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._pending = None
+        self._busy = False
+
+        # Menor diferencia observada entre reloj del servidor y del cliente:
+        # estima el desfase de relojes más la latencia mínima de red
+        self._clock_offset = None
+
+    def offer(self, data):
+        """
+        Deposita un frame. Retorna True si quien llama debe procesarlo
+        (no había otro hilo procesando esta sesión)
+        """
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = data
+
+            if self._busy:
+                return False
+            self._busy = True
+            return True
+
+    def take(self):
+        """Retira el siguiente frame vigente, o None si ya no queda ninguno"""
+        with self._lock:
+            while True:
+                data = self._pending
+                self._pending = None
+
+                if data is None:
+                    self._busy = False
+                    return None
+
+                if self._is_stale(data):
+                    self.dropped += 1
+                    continue
+
+                return data
+
+    def abort(self):
+        """Libera la ranura tras un error de procesamiento"""
+        with self._lock:
+            self._pending = None
+            self._busy = False
+
+    def _is_stale(self, data):
+        """Compara la marca de tiempo del cliente (ms) con el plazo configurado"""
+        client_ts = data.get('ts') if isinstance(data, dict) else None
+        if client_ts is None:
+            return False
+
+        try:
+            offset = time.time() * 1000 - float(client_ts)
+        except (TypeError, ValueError):
+            return False
+
+        if self._clock_offset is None or offset < self._clock_offset:
+            self._clock_offset = offset
+
+        age = offset - self._clock_offset
+        return age > self.deadline_ms
+
+
+class FrameIngestion:
+    """Registro de ranuras por sesión Socket.IO"""
+
+    def __init__(self, deadline_ms):
+        self.deadline_ms = deadline_ms
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    def slot(self, key):
+        """Obtiene (o crea) la ranura de una sesión"""
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = LatestFrameSlot(self.deadline_ms)
+                self._slots[key] = slot
+            return slot
+
+    def discard(self, sid):
+        """Elimina todas las ranuras de una sesión desconectada"""
+        with self._lock:
+            for key in [k for k in self._slots if k[0] == sid]:
+                del self._slots[key]
+
+    def run(self, key, data, process):
+        """
+        Entrega el frame a la ranura y, si ningún otro hilo la está atendiendo,
+        procesa frames hasta vaciarla. process(data, dropped) recibe el frame
+        y el total de frames descartados en la sesión.
+        """
+        slot = self.slot(key)
+        if not slot.offer(data):
+            return
+
+        try:
+            while True:
+                data = slot.take()
+                if data is None:
+                    return
+                process(data, slot.dropped)
+        except Exception:
+            slot.abort()
+            raise
@@ -0,0 +1,237 @@
+"""
+Motor incremental de gestos de vivacidad (parpadeo, boca, giro de cabeza)
+Cada sesión guarda un anillo de tamaño fijo con las señales EAR/MAR/giro y una
+pequeña máquina de estados por gesto: cada frame cuesta O(1)
+"""
+
+import numpy as np
+
+from config import Config
+
+# Índice de cada señal en el anillo
+SIGNALS = {'ear': 0, 'mar': 1, 'yaw': 2}
+
+# Fases de la máquina de estados de cada gesto
+UNARMED, ARMED, ACTIVE, RELEASING, DONE = range(5)
+
+
+class GestureSpec:
+    """
+    Gesto definido sobre una señal con umbrales de histéresis: se activa al
+    cruzar 'enter' y se libera al volver más allá de 'exit', de modo que el
+    ruido alrededor de un único umbral no genera transiciones falsas.
+    mode: 'below' (EAR), 'above' (MAR) o 'abs_above' (giro a cualquier lado).
+    """
+
+    def __init__(self, name, label, signal, mode, enter, exit, prompt, messages,
+                 min_active=1, min_release=1):
+        self.name = name
+        self.label = label
+        self.signal = SIGNALS[signal]
+        self.mode = mode
+        self.enter = enter
+        self.exit = exit
+        self.prompt = prompt
+        self.messages = messages  # Mensaje por fase: (esperando, activo, liberando)
+        self.min_active = min_active
+        self.min_release = min_release
+
+    def is_active(self, value):
+        if self.mode == 'below':
+            return value < self.enter
+        if self.mode == 'above':
+            return value > self.enter
+        return abs(value) > self.enter
+
+    def is_released(self, value):
+        if self.mode == 'below':
+            return value >= self.exit
+        if self.mode == 'above':
+            return value <= self.exit
+        return abs(value) <= self.exit
+
+
+def default_gestures():
+    """Gestos disponibles con los umbrales de Config"""
+    return {
+        'blink': GestureSpec(
+            'blink', 'Parpadeo', 'ear', 'below', Config.LIVENESS_EAR_CLOSE, Config.LIVENESS_EAR_OPEN,
+            prompt='parpadea',
+            messages=("Esperando parpadeo...", "Cerrando ojos...", "Abriendo ojos..."),
+            min_active=1, min_release=2
+        ),
+        'mouth': GestureSpec(
+            'mouth', 'Boca', 'mar', 'above', Config.LIVENESS_MAR_OPEN, Config.LIVENESS_MAR_CLOSE,
+            prompt='abre y cierra la boca',
+            messages=("Abre la boca ampliamente...", "Boca abierta, ahora cierra!", "Cerrando boca..."),
+            min_active=1, min_release=1
+        ),
+        'head_turn': GestureSpec(
+            'head_turn', 'Giro', 'yaw', 'abs_above', Config.LIVENESS_YAW_TURN, Config.LIVENESS_YAW_CENTER,
+            prompt='gira la cabeza hacia un lado',
+            messages=("Gira la cabeza...", "Cabeza girada, vuelve al centro", "Volviendo al centro..."),
+            min_active=1, min_release=1
+        ),
+    }
+
+
+class GestureEngine:
+    """
+    Estado compacto de los gestos de una sesión: anillo float32 de señales,
+    sumas acumuladas para el suavizado y dos arrays pequeños de fases/contadores.
+    Con ordered=True los gestos deben completarse en el orden configurado.
+    """
+
+    def __init__(self, specs, ordered=False, window=1, capacity=32):
+        self.specs = list(specs)
+        self.ordered = ordered
+        self.window = max(1, min(window, capacity))
+
+        self._ring = np.zeros((capacity, len(SIGNALS)), dtype=np.float32)
+        self._sums = np.zeros(len(SIGNALS), dtype=np.float64)
+        self._phases = np.zeros(len(self.specs), dtype=np.int8)
+        self._counts = np.zeros(len(self.specs), dtype=np.int16)
+        self._pos = 0
+        self._filled = 0
+
+    @classmethod
+    def from_config(cls):
+        available = default_gestures()
+        names = [name.strip() for name in Config.LIVENESS_GESTURES.split(',') if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValueError(f"Gestos de vivacidad desconocidos: {unknown}")
+        return cls(
+            [available[name] for name in names],
+            ordered=Config.LIVENESS_GESTURES_ORDERED,
+            window=Config.LIVENESS_SMOOTHING_FRAMES
+        )
+
+    def reset(self):
+        self._sums[:] = 0
+        self._phases[:] = UNARMED
+        self._counts[:] = 0
+        self._pos = 0
+        self._filled = 0
+
+    def update(self, ear, mar, yaw=0.0):
+        """Añade las señales de un frame y retorna los gestos completados en él"""
+        values = np.array([ear, mar, yaw], dtype=np.float32)
+        capacity = len(self._ring)
+
+        # Una muestra degenerada (NaN/inf, p. ej. distancia nula entre ojos) dejaría
+        # la suma acumulada en NaN para siempre: se mantiene el valor anterior
+        invalid = ~np.isfinite(values)
+        if invalid.any():
+            if self._filled == 0:
+                return []
+            values[invalid] = self._ring[(self._pos - 1) % capacity][invalid]
+
+        # Media móvil en O(1): sumar el valor nuevo y restar el que sale de la ventana
+        self._sums += values
+        if self._filled >= self.window:
+            self._sums -= self._ring[(self._pos - self.window) % capacity]
+        self._ring[self._pos] = values
+        self._pos = (self._pos + 1) % capacity
+        self._filled = min(self._filled + 1, capacity)
+        smoothed = self._sums / min(self._filled, self.window)
+
+        completed = []
+        for i, spec in enumerate(self.specs):
+            if self._phases[i] == DONE:
+                continue
+            if self._step(i, spec, float(smoothed[spec.signal])):
+                completed.append(spec.name)
+            if self.ordered:
+                break  # Solo el primer gesto pendiente avanza
+        return completed
+
+    def _step(self, i, spec, value):
+        """Avanza la máquina de estados de un gesto; True si se completa"""
+        if not np.isfinite(value):
+            return False
+
+        phase = self._phases[i]
+        active = spec.is_active(value)
+        released = spec.is_released(value)
+
+        if phase == UNARMED:
+            # Hace falta ver antes el estado de reposo (p. ej. ojos abiertos)
+            if released:
+                self._phases[i] = ARMED
+        elif phase == ARMED:
+            if active:
+                self._phases[i] = ACTIVE
+                self._counts[i] = 1
+        elif phase == ACTIVE:
+            if active:
+                self._counts[i] += 1
+            elif released and self._counts[i] >= spec.min_active:
+                self._phases[i] = RELEASING
+                self._counts[i] = 1
+        elif phase == RELEASING:
+            if released:
+                self._counts[i] += 1
+            elif active:
+                self._phases[i] = ACTIVE
+                self._counts[i] = 1
+                return False
+
+        if self._phases[i] == RELEASING and self._counts[i] >= spec.min_release:
+            self._phases[i] = DONE
+            return True
+        return False
+
+    def done(self, name):
+        """True si el gesto ya se completó (False si no está configurado)"""
+        for i, spec in enumerate(self.specs):
+            if spec.name == name:
+                return bool(self._phases[i] == DONE)
+        return False
+
+    @property
+    def complete(self):
+        return bool(np.all(self._phases == DONE))
+
+    @property
+    def completed_count(self):
+        return int(np.count_nonzero(self._phases == DONE))
+
+    @property
+    def progress(self):
+        """Fracción (0-1) de gestos completados"""
+        return self.completed_count / len(self.specs) if self.specs else 1.0
+
+    def summary(self):
+        """{gesto: completado} para la respuesta al cliente"""
+        return {spec.name: bool(self._phases[i] == DONE) for i, spec in enumerate(self.specs)}
+
+    @property
+    def pending(self):
+        return [spec for i, spec in enumerate(self.specs) if self._phases[i] != DONE]
+
+    def status(self, name):
+        """Mensaje de progreso del gesto según su fase"""
+        for i, spec in enumerate(self.specs):
+            if spec.name == name:
+                phase = self._phases[i]
+                if phase == DONE:
+                    return "Completado"
+                if phase == ACTIVE:
+                    return spec.messages[1]
+                if phase == RELEASING:
+                    return spec.messages[2]
+                return spec.messages[0]
+        return ""
+
+    def prompt(self):
+        """Instrucción para el usuario con los gestos que faltan"""
+        pending = self.pending
+        if self.ordered:
+            pending = pending[:1]
+        if not pending:
+            return ""
+        text = " y ".join(spec.prompt for spec in pending)
+        if self.completed_count:
+            return f"Ahora {text}"
+        return text[0].upper() + text[1:]
@@ -0,0 +1,191 @@
+"""
+Gestión de modelos: paquete local verificado por checksum, tiempos de carga
+y calentamiento, y estado para la sonda de disponibilidad (/ready)
+
+Preparar el paquete (en la construcción de la imagen, con red):
+    python model_manager.py build
+Verificar un paquete existente sin red:
+    python model_manager.py verify
+"""
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+
+from config import Config
+
+MANIFEST_NAME = "manifest.json"
+
+
+class ModelBundleError(RuntimeError):
+    """Modelo ausente del paquete local o con checksum incorrecto"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelBundle:
+    """
+    Directorio de modelos descrito por un manifiesto (archivo -> url, sha256).
+    En ejecución solo se leen archivos locales; la descarga queda para 'build'
+    o, si se habilita explícitamente, como último recurso.
+    """
+
+    def __init__(self, directory=None, allow_download=None):
+        self.directory = directory or Config.MODEL_DIR
+        self.allow_download = Config.MODEL_ALLOW_DOWNLOAD if allow_download is None else allow_download
+        self.manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        self._verified = {}
+        self._lock = threading.Lock()
+
+        with open(self.manifest_path) as f:
+            self.manifest = json.load(f)
+
+    def path(self, filename):
+        """Ruta verificada de un modelo del paquete"""
+        with self._lock:
+            if filename in self._verified:
+                return self._verified[filename]
+
+            entry = self.manifest.get(filename)
+            if entry is None:
+                raise ModelBundleError(f"{filename} no está en el manifiesto de modelos")
+
+            expected = entry.get('sha256')
+            if not expected:
+                raise ModelBundleError(f"{filename} no tiene checksum fijado en el manifiesto")
+
+            path = os.path.join(self.directory, filename)
+            if not os.path.exists(path):
+                if not self.allow_download:
+                    raise ModelBundleError(
+                        f"Falta {path}: ejecuta 'python model_manager.py build' al construir la imagen"
+                    )
+                self._download(filename, entry, path)
+
+            actual = _sha256(path)
+            if actual != expected:
+                raise ModelBundleError(f"Checksum incorrecto en {filename}: {actual[:12]}… != {expected[:12]}…")
+
+            self._verified[filename] = path
+            return path
+
+    def _download(self, filename, entry, path):
+        """Descarga a un archivo parcial y solo lo instala si coincide con el checksum del manifiesto"""
+        print(f"📥 Descargando modelo {filename}...")
+        os.makedirs(self.directory, exist_ok=True)
+        partial = path + ".part"
+        urllib.request.urlretrieve(entry['url'], partial)
+
+        actual = _sha256(partial)
+        if actual != entry['sha256']:
+            os.remove(partial)
+            raise ModelBundleError(
+                f"Checksum incorrecto al descargar {filename}: {actual[:12]}… != {entry['sha256'][:12]}…"
+            )
+        os.replace(partial, path)
+
+    def build(self):
+        """Descarga y verifica los modelos que falten; los checksums se fijan a mano en el manifiesto"""
+        for filename in self.manifest:
+            self.path(filename)
+            print(f"✅ {filename}")
+
+    def verify(self):
+        """Verifica todos los modelos del manifiesto; retorna {archivo: error o None}"""
+        results = {}
+        for filename in self.manifest:
+            try:
+                self.path(filename)
+                results[filename] = None
+            except ModelBundleError as e:
+                results[filename] = str(e)
+        return results
+
+
+class ModelManager:
+    """Registro de tiempos de carga y calentamiento de cada modelo"""
+
+    def __init__(self):
+        self._status = {}
+        self._lock = threading.Lock()
+        self._bundle = None
+
+    @property
+    def bundle(self):
+        if self._bundle is None:
+            self._bundle = ModelBundle()
+        return self._bundle
+
+    def model_path(self, filename):
+        """Ruta verificada de un archivo del paquete de modelos"""
+        return self.bundle.path(filename)
+
+    def expect(self, name):
+        """Declara un modelo que debe calentarse antes de dar el proceso por disponible"""
+        with self._lock:
+            self._status.setdefault(name, {})
+
+    @contextmanager
+    def track(self, name, phase):
+        """Cronometra una fase ('load' o 'warmup') de un modelo y registra errores"""
+        self.expect(name)
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.fail(name, phase, e)
+            raise
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        with self._lock:
+            status = self._status[name]
+            status[f'{phase}_ms'] = round(status.get(f'{phase}_ms', 0) + elapsed_ms, 1)
+
+    def fail(self, name, phase, error):
+        """Marca un modelo como fallido (la sonda dejará de estar disponible)"""
+        self.expect(name)
+        with self._lock:
+            self._status[name]['error'] = f"{phase}: {error}"
+        print(f"⚠️ Modelo {name} ({phase}): {error}")
+
+    def report(self):
+        """Estado para la sonda de disponibilidad: listo cuando todo modelo se calentó sin errores"""
+        with self._lock:
+            models = {name: dict(status) for name, status in self._status.items()}
+        ready = bool(models) and all(
+            'warmup_ms' in status and 'error' not in status
+            for status in models.values()
+        )
+        return {'ready': ready, 'models': models}
+
+
+# Registro compartido por todos los subsistemas del proceso
+model_manager = ModelManager()
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    bundle = ModelBundle(allow_download=(command == 'build'))
+
+    if command == 'build':
+        bundle.build()
+    elif command == 'verify':
+        errors = {f: e for f, e in bundle.verify().items() if e}
+        for filename, error in errors.items():
+            print(f"❌ {error}")
+        if errors:
+            sys.exit(1)
+        print(f"✅ {len(bundle.manifest)} modelos verificados en {bundle.directory}")
+    else:
+        print(__doc__)
+        sys.exit(2)
@@ -0,0 +1,157 @@
+"""
+Registro de subsistemas con carga perezosa
+Los motores facial y de voz, junto con sus imports pesados (OpenCV, dlib,
+librosa, scipy...), se construyen en el primer uso o en un hilo de
+calentamiento en segundo plano, no al importar la aplicación.
+
+Informe del coste de importación de cada módulo (tiempo y memoria):
+    python services.py [modulo ...]
+"""
+
+import subprocess
+import sys
+import threading
+import time
+
+# Módulos medidos por defecto en el informe de importación
+REPORT_MODULES = [
+    'numpy', 'flask', 'flask_socketio', 'cv2', 'face_recognition',
+    'scipy.signal', 'librosa', 'av', 'sounddevice', 'speech_recognition', 'fastdtw',
+    'database', 'facial_auth', 'voice_auth',
+]
+
+
+class LazyService:
+    """
+    Subsistema que se construye la primera vez que se usa. Actúa como proxy:
+    cualquier atributo desconocido se resuelve en la instancia real.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.load_ms = None
+        self.warmup_ms = None
+        self.error = None
+        self._factory = factory
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._instance is not None
+
+    def get(self):
+        """Instancia real del subsistema (la construye si aún no existe)"""
+        instance = self._instance
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if self._instance is None:
+                print(f"⏳ Cargando {self.name}...")
+                start = time.perf_counter()
+                try:
+                    self._instance = self._factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.load_ms = round((time.perf_counter() - start) * 1000, 1)
+                print(f"✅ {self.name} cargado en {self.load_ms} ms")
+            return self._instance
+
+    def warm_up(self):
+        """Construye el subsistema y ejecuta su calentamiento si lo tiene"""
+        instance = self.get()
+        if self.warmup_ms is not None:
+            return
+        start = time.perf_counter()
+        if hasattr(instance, 'warm_up'):
+            instance.warm_up()
+        self.warmup_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
+
+class ServiceRegistry:
+    """Subsistemas registrados por la aplicación y su estado de carga"""
+
+    def __init__(self):
+        self._services = {}
+
+    def register(self, name, factory):
+        """Registra un subsistema perezoso y retorna su proxy"""
+        service = LazyService(name, factory)
+        self._services[name] = service
+        return service
+
+    def warm_up_all(self):
+        """Carga y calienta todos los subsistemas registrados, en orden"""
+        for service in self._services.values():
+            try:
+                service.warm_up()
+            except Exception as e:
+                service.error = str(e)
+                print(f"⚠️ Error en el calentamiento de {service.name}: {e}")
+
+    def start_background_warmup(self):
+        """Calienta los subsistemas en un hilo sin bloquear el arranque"""
+        thread = threading.Thread(target=self.warm_up_all, name='services-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """Estado de cada subsistema: cargado, tiempos y errores"""
+        return {
+            name: {
+                'loaded': service.loaded,
+                'load_ms': service.load_ms,
+                'warmup_ms': service.warmup_ms,
+                'error': service.error,
+            }
+            for name, service in self._services.items()
+        }
+
+
+_MEASURE = (
+    "import resource, sys, time\n"
+    "base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "elapsed = (time.perf_counter() - start) * 1000\n"
+    "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base\n"
+    "print(elapsed, rss * (1 if sys.platform == 'darwin' else 1024))\n"
+)
+
+
+def import_report(modules):
+    """
+    Mide cada módulo en un intérprete nuevo (sin caché de imports previos):
+    retorna [(módulo, ms, bytes de RSS, error)]
+    """
+    results = []
+    for module in modules:
+        proc = subprocess.run(
+            [sys.executable, "-c", _MEASURE.format(module=module)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            error = (proc.stderr.strip().splitlines() or ["error"])[-1]
+            results.append((module, None, None, error))
+            continue
+        elapsed, rss = proc.stdout.strip().splitlines()[-1].split()
+        results.append((module, float(elapsed), int(float(rss)), None))
+    return results
+
+
+if __name__ == '__main__':
+    modules = sys.argv[1:] or REPORT_MODULES
+
+    print(f"{'Módulo':<20} {'Import ms':>10} {'RSS MB':>8}")
+    print("-" * 40)
+    for module, elapsed, rss, error in import_report(modules):
+        if error:
+            print(f"{module:<20} {'—':>10} {'—':>8}  ({error})")
+        else:
+            print(f"{module:<20} {elapsed:>10.1f} {rss / 2**20:>8.1f}")
+    print("\nDetalle por dependencia: python -X importtime -c 'import <modulo>'")
@@ -0,0 +1,290 @@
+"""
+Backends de reconocimiento de voz para validar el desafío numérico
+Todos exponen transcribe(audio, sample_rate) y retornan el texto reconocido
+o None. El backend local reconoce dígitos en español sin red, comparando
+cada palabra con plantillas MFCC mediante DTW.
+
+Construir las plantillas a partir de grabaciones de una sola palabra
+(<dígito>_<nombre>.wav o <dígito>/<nombre>.wav, mono):
+    python speech_backends.py build <directorio_wav>
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+
+from config import Config
+from audio_ingestion import to_float32_mono
+from voice_features import VoiceFeatureEngine
+
+
+class SpeechBackend:
+    """Interfaz común de los backends de reconocimiento"""
+
+    name = None
+
+    def transcribe(self, audio, sample_rate):
+        raise NotImplementedError
+
+    def warm_up(self, sample_rate):
+        """Ejecuta una transcripción sobre ruido para cargar y cachear lo necesario"""
+        noise = np.random.default_rng(0).normal(0, 0.05, sample_rate).astype(np.float32)
+        self.transcribe(noise, sample_rate)
+
+
+class GoogleSpeechBackend(SpeechBackend):
+    """Google Speech Recognition (es-ES) a través de speech_recognition; requiere red"""
+
+    name = 'google'
+
+    def __init__(self, language='es-ES', ambient_noise_seconds=0.0, timeout=None):
+        import speech_recognition as sr
+
+        self._sr = sr
+        self.language = language
+        self.ambient_noise_seconds = ambient_noise_seconds
+
+        # Un único reconocedor reutilizado entre llamadas
+        self.recognizer = sr.Recognizer()
+        self.recognizer.energy_threshold = 300
+        self.recognizer.dynamic_energy_threshold = True
+        # Límite de la petición de red: una llamada colgada no retiene su hilo
+        self.recognizer.operation_timeout = timeout
+
+    def warm_up(self, sample_rate):
+        """Sin calentamiento: evita una petición de red al arrancar"""
+
+    def transcribe(self, audio, sample_rate):
+        # Convertir numpy array a WAV en memoria (int16)
+        peak = np.max(np.abs(audio))
+        if peak == 0:
+            return None
+
+        wav_io = io.BytesIO()
+        wavfile.write(wav_io, sample_rate, np.int16(audio / peak * 32767))
+        wav_io.seek(0)
+
+        with self._sr.AudioFile(wav_io) as source:
+            if self.ambient_noise_seconds > 0:
+                self.recognizer.adjust_for_ambient_noise(source, duration=self.ambient_noise_seconds)
+            audio_data = self.recognizer.record(source)
+
+        print("   🌐 Enviando audio a Google Speech Recognition...")
+        try:
+            return self.recognizer.recognize_google(audio_data, language=self.language)
+        except self._sr.UnknownValueError:
+            print("   ⚠️  Google Speech Recognition no pudo entender el audio")
+            return None
+        except self._sr.RequestError as e:
+            print(f"   ⚠️  Error del servicio de reconocimiento de Google: {e}")
+            print("   💡 Verifica conexión a internet o límites de API")
+            return None
+        except TimeoutError:
+            print(f"   ⚠️  Google Speech Recognition no respondió en {self.recognizer.operation_timeout}s")
+            return None
+
+
+def speech_segments(audio, sample_rate, window_seconds=0.02, threshold=0.02,
+                    min_gap_seconds=0.12, min_word_seconds=0.1):
+    """
+    Segmenta el audio en palabras por energía en ventanas de 20 ms: une los
+    tramos separados por pausas cortas (oclusivas dentro de una palabra) y
+    descarta los demasiado breves. Retorna [(inicio, fin)] en muestras
+    """
+    window = max(1, int(sample_rate * window_seconds))
+    n_windows = len(audio) // window
+    if n_windows == 0:
+        return []
+
+    windows = audio[:n_windows * window].reshape(n_windows, window)
+    energy = np.einsum('ij,ij->i', windows, windows)
+    if energy.max() <= 0:
+        return []
+    active = energy / energy.max() > threshold
+
+    # Flancos de subida y bajada de la máscara de voz
+    edges = np.diff(np.concatenate([[0], active.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_gap = int(min_gap_seconds / window_seconds)
+    segments = []
+    for start, end in zip(starts, ends):
+        if segments and start - segments[-1][1] < min_gap:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+
+    min_word = int(min_word_seconds / window_seconds)
+    return [(start * window, end * window) for start, end in segments if end - start >= min_word]
+
+
+def dtw_distances(query, templates, lengths):
+    """
+    Distancia DTW (normalizada por longitud) entre una secuencia (n, d) y un
+    lote de plantillas rellenadas a (K, M, d), todas a la vez recorriendo
+    las antidiagonales de la matriz de costes
+    """
+    n = len(query)
+    count, max_length, _ = templates.shape
+
+    cost = np.linalg.norm(templates[:, None, :, :] - query[None, :, None, :], axis=-1)
+    padding = np.arange(max_length)[None, None, :] >= lengths[:, None, None]
+    cost = np.where(padding, np.inf, cost)
+
+    acc = np.full((count, n + 1, max_length + 1), np.inf)
+    acc[:, 0, 0] = 0.0
+    for diagonal in range(2, n + max_length + 1):
+        i = np.arange(max(1, diagonal - max_length), min(n, diagonal - 1) + 1)
+        j = diagonal - i
+        acc[:, i, j] = cost[:, i - 1, j - 1] + np.minimum(
+            np.minimum(acc[:, i - 1, j], acc[:, i, j - 1]), acc[:, i - 1, j - 1]
+        )
+
+    return acc[np.arange(count), n, lengths] / (n + lengths)
+
+
+def digit_feature_engine(sample_rate):
+    """MFCC con ventanas de 32 ms y saltos de 10 ms, adecuados para palabras cortas"""
+    return VoiceFeatureEngine(sample_rate, n_mfcc=13, n_fft=512, hop_length=160, n_mels=40)
+
+
+def word_features(engine, audio):
+    """MFCC 1-12 por frame con la media del segmento restada, (frames, 12)"""
+    spectrogram = engine.spectrogram(np.asarray(audio, dtype=np.float32))
+    mfcc = engine.mfcc(spectrogram)[1:engine.n_mfcc].T
+    return (mfcc - mfcc.mean(axis=0)).astype(np.float32)
+
+
+class LocalDigitRecognizer(SpeechBackend):
+    """
+    Reconocedor de dígitos en español sin red: segmenta la locución en
+    palabras y asigna a cada una el dígito de la plantilla más cercana (DTW
+    sobre MFCC con normalización de media cepstral)
+    """
+
+    name = 'local'
+
+    def __init__(self, templates_path=None, sample_rate=None):
+        self.templates_path = templates_path or digit_templates_path()
+        self.sample_rate = sample_rate or Config.VOICE_SAMPLE_RATE
+        self.features = digit_feature_engine(self.sample_rate)
+
+        with np.load(self.templates_path) as data:
+            frames, lengths, self.labels = data['frames'], data['lengths'], data['labels']
+
+        # Plantillas rellenadas a la misma longitud para compararlas en lote
+        self.lengths = lengths.astype(int)
+        offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.templates = np.zeros((len(self.lengths), self.lengths.max(), frames.shape[1]), dtype=np.float32)
+        for k, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            self.templates[k, :end - start] = frames[start:end]
+
+    def recognize_word(self, audio):
+        """Dígito de la plantilla más cercana a un segmento de una palabra"""
+        distances = dtw_distances(word_features(self.features, audio), self.templates, self.lengths)
+        return int(self.labels[np.argmin(distances)])
+
+    def transcribe(self, audio, sample_rate):
+        if sample_rate != self.sample_rate:
+            audio = resample_poly(audio, self.sample_rate, sample_rate)
+        peak = np.max(np.abs(audio)) if len(audio) else 0
+        if peak == 0:
+            return None
+        audio = audio / peak
+
+        segments = speech_segments(audio, self.sample_rate)
+        if not segments:
+            return None
+
+        digits = [str(self.recognize_word(audio[start:end])) for start, end in segments]
+        return " ".join(digits)
+
+
+STT_BACKENDS = {
+    LocalDigitRecognizer.name: LocalDigitRecognizer,
+    GoogleSpeechBackend.name: GoogleSpeechBackend,
+}
+
+
+def digit_templates_path():
+    """Plantillas del reconocedor local (VOICE_DIGIT_TEMPLATES o <MODEL_DIR>/digit_templates.npz)"""
+    return Config.VOICE_DIGIT_TEMPLATES or os.path.join(Config.MODEL_DIR, "digit_templates.npz")
+
+
+def speech_backend_chain(primary, fallback=''):
+    """
+    Backends a cargar, en orden. Sin plantillas de dígitos el reconocedor
+    local no puede funcionar: se sustituye por Google, así una instalación
+    sin plantillas sigue validando el desafío como antes
+    """
+    chain = [name for name in (primary, fallback) if name]
+    if LocalDigitRecognizer.name in chain and not os.path.exists(digit_templates_path()):
+        print(f"⚠️ Sin plantillas de dígitos en {digit_templates_path()}: "
+              f"se usa Google para validar el desafío")
+        chain = [GoogleSpeechBackend.name if name == LocalDigitRecognizer.name else name for name in chain]
+    return list(dict.fromkeys(chain))
+
+
+def create_speech_backend(name):
+    """Instancia el backend indicado en Config (VOICE_STT_BACKEND / VOICE_STT_FALLBACK)"""
+    if name not in STT_BACKENDS:
+        raise ValueError(f"Backend de reconocimiento desconocido: {name}")
+    if name == GoogleSpeechBackend.name:
+        return GoogleSpeechBackend(ambient_noise_seconds=Config.VOICE_STT_AMBIENT_NOISE_SECONDS,
+                                   timeout=Config.VOICE_STT_TIMEOUT)
+    return STT_BACKENDS[name]()
+
+
+def _read_wav(path, sample_rate):
+    """WAV mono en float32 a la frecuencia de muestreo indicada"""
+    rate, audio = wavfile.read(path)
+    return to_float32_mono(audio, rate, sample_rate)
+
+
+def build_templates(directory, output_path, sample_rate):
+    """Extrae las plantillas de un directorio de grabaciones etiquetadas por dígito"""
+    engine = digit_feature_engine(sample_rate)
+
+    frames, lengths, labels = [], [], []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if not name.lower().endswith('.wav'):
+                continue
+            label = os.path.basename(root) if root != directory else name.split('_')[0]
+            if not (label.isdigit() and len(label) == 1):
+                print(f"⚠️ {name}: sin dígito en el nombre, se omite")
+                continue
+
+            audio = _read_wav(os.path.join(root, name), sample_rate)
+            audio = audio / max(np.max(np.abs(audio)), 1e-9)
+            segments = speech_segments(audio, sample_rate)
+            if not segments:
+                print(f"⚠️ {name}: sin voz detectada, se omite")
+                continue
+
+            # La palabra completa: del primer al último tramo con voz
+            features = word_features(engine, audio[segments[0][0]:segments[-1][1]])
+            frames.append(features)
+            lengths.append(len(features))
+            labels.append(int(label))
+
+    if not frames:
+        raise SystemExit(f"❌ No hay grabaciones válidas en {directory}")
+
+    np.savez_compressed(output_path, frames=np.vstack(frames),
+                        lengths=np.asarray(lengths), labels=np.asarray(labels))
+    counts = np.bincount(labels, minlength=10)
+    print(f"✅ {len(labels)} plantillas guardadas en {output_path} (por dígito: {counts.tolist()})")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'build':
+        print(__doc__)
+        sys.exit(2)
+
+    build_templates(sys.argv[2], digit_templates_path(), Config.VOICE_SAMPLE_RATE)
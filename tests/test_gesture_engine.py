@@ -0,0 +1,41 @@
+"""Máquina de estados de los gestos de vivacidad"""
+
+import numpy as np
+
+from gesture_engine import GestureEngine, default_gestures
+
+OPEN, CLOSED = 0.30, 0.05          # EAR
+SHUT, WIDE = 0.10, 0.40            # MAR
+CENTER, TURNED = 0.0, 0.5          # Giro
+
+
+def engine(*names, window=1):
+    available = default_gestures()
+    return GestureEngine([available[name] for name in names], window=window)
+
+
+def feed(gestures, frames):
+    completed = []
+    for ear, mar, yaw in frames:
+        completed += gestures.update(ear, mar, yaw)
+    return completed
+
+
+def test_blink_needs_open_closed_open():
+    gestures = engine('blink')
+    assert feed(gestures, [(CLOSED, SHUT, CENTER)] * 3) == []
+    assert feed(gestures, [(OPEN, SHUT, CENTER), (CLOSED, SHUT, CENTER), (OPEN, SHUT, CENTER), (OPEN, SHUT, CENTER)]) == ['blink']
+    assert gestures.complete
+
+
+def test_head_turn_survives_nan_yaw():
+    gestures = engine('head_turn', window=3)
+    frames = [(OPEN, SHUT, CENTER)] * 3 + [(OPEN, SHUT, np.nan)] + \
+             [(OPEN, SHUT, TURNED)] * 4 + [(OPEN, SHUT, CENTER)] * 4
+    assert feed(gestures, frames) == ['head_turn']
+
+
+def test_leading_nan_frame_is_ignored():
+    gestures = engine('head_turn')
+    frames = [(OPEN, SHUT, np.nan), (OPEN, SHUT, CENTER), (OPEN, SHUT, TURNED), (OPEN, SHUT, CENTER)]
+    assert feed(gestures, frames) == ['head_turn']
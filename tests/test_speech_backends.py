@@ -0,0 +1,111 @@
+"""Reconocedor local de dígitos: segmentación, DTW por lotes y transcripción"""
+
+import numpy as np
+import pytest
+from scipy.io import wavfile
+
+from speech_backends import LocalDigitRecognizer, build_templates, dtw_distances, speech_segments
+
+SAMPLE_RATE = 16000
+
+
+def naive_dtw(query, template):
+    """DTW de referencia, celda a celda, normalizada por longitud"""
+    n, m = len(query), len(template)
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            cost = np.linalg.norm(query[i - 1] - template[j - 1])
+            acc[i, j] = cost + min(acc[i - 1, j], acc[i, j - 1], acc[i - 1, j - 1])
+    return acc[n, m] / (n + m)
+
+
+def synthetic_digit(digit, seconds=0.35, seed=0):
+    """Palabra sintética: dos 'formantes' que se desplazan de forma distinta para cada dígito"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f1 = 300 + 80 * digit + 200 * t / seconds * (1 if digit % 2 else -1)
+    f2 = 1000 + 180 * digit
+    phase1 = 2 * np.pi * np.cumsum(f1) / SAMPLE_RATE
+    phase2 = 2 * np.pi * np.cumsum(np.full_like(t, f2)) / SAMPLE_RATE
+    envelope = np.hanning(t.size)
+    word = envelope * (np.sin(phase1) + 0.5 * np.sin(phase2))
+    return (0.5 * word + 0.005 * rng.normal(size=t.size)).astype(np.float32)
+
+
+def utterance(digits, pause_seconds=0.25, seed=1):
+    silence = np.zeros(int(SAMPLE_RATE * pause_seconds), dtype=np.float32)
+    parts = [silence]
+    for k, digit in enumerate(digits):
+        parts += [synthetic_digit(digit, seconds=0.3 + 0.02 * (k % 3), seed=seed + k), silence]
+    return np.concatenate(parts)
+
+
+@pytest.fixture(scope='module')
+def recognizer(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('digitos')
+    for digit in range(10):
+        for speaker in range(2):
+            audio = synthetic_digit(digit, seconds=0.33 + 0.04 * speaker, seed=100 + speaker)
+            wavfile.write(directory / f"{digit}_sintetico{speaker}.wav", SAMPLE_RATE, np.int16(audio * 32767))
+    templates = tmp_path_factory.mktemp('modelos') / 'digit_templates.npz'
+    build_templates(str(directory), str(templates), SAMPLE_RATE)
+    return LocalDigitRecognizer(str(templates), SAMPLE_RATE)
+
+
+def test_speech_segments_finds_each_word():
+    audio = utterance([1, 2, 3, 4])
+    segments = speech_segments(audio / np.abs(audio).max(), SAMPLE_RATE)
+    assert len(segments) == 4
+    assert all(start < end for start, end in segments)
+    assert all(prev[1] <= nxt[0] for prev, nxt in zip(segments, segments[1:]))
+
+
+def test_speech_segments_silence():
+    assert speech_segments(np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE) == []
+
+
+def test_dtw_distances_matches_naive():
+    rng = np.random.default_rng(0)
+    query = rng.normal(size=(17, 12))
+    lengths = np.array([9, 23, 17, 1])
+    templates = np.zeros((len(lengths), lengths.max(), 12))
+    for k, length in enumerate(lengths):
+        templates[k, :length] = rng.normal(size=(length, 12))
+
+    expected = [naive_dtw(query, templates[k, :length]) for k, length in enumerate(lengths)]
+    np.testing.assert_allclose(dtw_distances(query, templates, lengths), expected, rtol=1e-10)
+
+
+def test_recognizer_transcribes_digits(recognizer):
+    digits = [3, 7, 0, 9, 1, 5]
+    assert recognizer.transcribe(utterance(digits), SAMPLE_RATE) == " ".join(map(str, digits))
+
+
+def test_recognizer_resamples_input(recognizer):
+    from scipy.signal import resample_poly
+
+    audio = resample_poly(utterance([2, 8]), 3, 1)
+    assert recognizer.transcribe(audio, SAMPLE_RATE * 3) == "2 8"
+
+
+def test_recognizer_silence(recognizer):
+    assert recognizer.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), SAMPLE_RATE) is None
+
+
+def test_backend_chain_falls_back_to_google_without_templates(monkeypatch, tmp_path):
+    from config import Config
+    from speech_backends import speech_backend_chain
+
+    monkeypatch.setattr(Config, 'VOICE_DIGIT_TEMPLATES', str(tmp_path / 'no_existe.npz'))
+    assert speech_backend_chain('local', '') == ['google']
+    assert speech_backend_chain('local', 'google') == ['google']
+
+
+def test_backend_chain_keeps_local_with_templates(monkeypatch, recognizer):
+    from config import Config
+    from speech_backends import speech_backend_chain
+
+    monkeypatch.setattr(Config, 'VOICE_DIGIT_TEMPLATES', recognizer.templates_path)
+    assert speech_backend_chain('local', 'google') == ['local', 'google']
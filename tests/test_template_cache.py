@@ -0,0 +1,55 @@
+import threading
+
+from database import DatabaseManager, TemplateCache
+
+
+def test_put_after_invalidate_is_discarded():
+    cache = TemplateCache()
+    generation = cache.generation(('face', 'ana'))
+    cache.invalidate(('face', 'ana'))
+
+    assert cache.put(('face', 'ana'), 'old', generation) is False
+    assert cache.get(('face', 'ana')) is TemplateCache._MISSING
+
+
+def test_put_without_invalidate_is_stored():
+    cache = TemplateCache()
+    generation = cache.generation(('face', 'ana'))
+
+    assert cache.put(('face', 'ana'), 'new', generation) is True
+    assert cache.get(('face', 'ana')) == 'new'
+
+
+def test_reenrollment_during_read_is_not_masked(tmp_path, monkeypatch):
+    db = DatabaseManager(str(tmp_path / 'users.db'))
+    db.register_user('ana', 'secreto')
+    db.save_voice_sample('ana', {'version': 'old'})
+
+    # El guardado de una nueva muestra ocurre entre la lectura de SQLite y el put
+    read_done, saved = threading.Event(), threading.Event()
+    original_put = db.template_cache.put
+
+    def slow_put(*args):
+        read_done.set()
+        saved.wait(5)
+        return original_put(*args)
+
+    monkeypatch.setattr(db.template_cache, 'put', slow_put)
+    reader = threading.Thread(target=db.get_voice_sample, args=('ana',))
+    reader.start()
+    read_done.wait(5)
+    db.save_voice_sample('ana', {'version': 'new'})
+    saved.set()
+    reader.join(5)
+    monkeypatch.undo()
+
+    assert db.get_voice_sample('ana') == {'version': 'new'}
+
+
+def test_stats_counts_hits_and_misses():
+    cache = TemplateCache()
+    cache.get('a')
+    cache.put('a', 1)
+    cache.get('a')
+
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'hit_rate': 50.0}
@@ -0,0 +1,56 @@
+"""Paridad del motor de características de voz con librosa (se omite si no está instalado)"""
+
+import numpy as np
+import pytest
+
+from voice_features import VoiceFeatureEngine
+
+librosa = pytest.importorskip('librosa')
+
+SAMPLE_RATE = 16000
+N_MFCC, N_FFT, HOP_LENGTH = 13, 2048, 512
+
+
+def voiced_clip(f0_base, seconds=3.0, seed=0):
+    """Tono con armónicos, vibrato y pausas, como en benchmark_voice_features.py"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLE_RATE * seconds)) / SAMPLE_RATE
+    f0 = f0_base + 15 * np.sin(2 * np.pi * 4 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = (np.sin(2 * np.pi * 1.5 * t) > -0.3).astype(float)
+    return 0.3 * voice * envelope + 0.01 * rng.normal(size=t.size)
+
+
+@pytest.fixture(params=[(110, np.float64), (170, np.float64), (140, np.float32)],
+                ids=['110hz', '170hz', '140hz-float32'])
+def clip(request):
+    f0_base, dtype = request.param
+    return voiced_clip(f0_base, seed=f0_base).astype(dtype)
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return VoiceFeatureEngine(SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
+
+
+def test_mfcc_and_deltas_match_librosa(engine, clip):
+    mfcc = librosa.feature.mfcc(y=clip, sr=SAMPLE_RATE, n_mfcc=N_MFCC, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    expected = np.vstack([mfcc, librosa.feature.delta(mfcc), librosa.feature.delta(mfcc, order=2)])
+    np.testing.assert_allclose(engine.analyze(clip)['mfcc'], expected, rtol=1e-4, atol=1e-3)
+
+
+def test_rms_matches_librosa(engine, clip):
+    expected = librosa.feature.rms(y=clip, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+    np.testing.assert_allclose(engine.rms(engine.spectrogram(clip)), expected, rtol=1e-4, atol=1e-6)
+
+
+def test_zcr_matches_librosa(engine, clip):
+    expected = librosa.feature.zero_crossing_rate(clip, frame_length=N_FFT, hop_length=HOP_LENGTH)[0]
+    np.testing.assert_array_equal(engine.zcr(clip), expected)
+
+
+def test_pitch_matches_piptrack(engine, clip):
+    pitches, magnitudes = librosa.piptrack(y=clip, sr=SAMPLE_RATE, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    expected = pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+    np.testing.assert_allclose(engine.pitch(engine.spectrogram(clip)), expected, rtol=1e-4, atol=1e-2)
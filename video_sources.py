@@ -0,0 +1,162 @@
+"""
+Fuentes de video para los flujos de terminal
+La lectura se hace en un hilo propio para solapar la E/S de la cámara con la
+detección y el encoding. Además de la cámara se pueden reproducir un archivo
+de video o un directorio de imágenes, sin hardware ni ventana.
+"""
+
+import os
+import threading
+import time
+
+import cv2
+
+from config import Config
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class DirectoryReplaySource:
+    """Imágenes de un directorio, en orden alfabético, con la interfaz de cv2.VideoCapture"""
+
+    def __init__(self, directory):
+        self.files = sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        self._index = 0
+
+    def isOpened(self):
+        return bool(self.files)
+
+    def read(self):
+        while self._index < len(self.files):
+            frame = cv2.imread(self.files[self._index])
+            self._index += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        self._index = len(self.files)
+
+
+class ThreadedCapture:
+    """
+    Lee frames de otra fuente en segundo plano. Por defecto solo conserva el
+    último frame (los que no se llegan a procesar se descartan); con keep_all
+    entrega todos en orden, decodificando el siguiente mientras se procesa
+    el actual. pace_fps reproduce una grabación a su velocidad original.
+    """
+
+    def __init__(self, reader, keep_all=False, pace_fps=None):
+        self._reader = reader
+        self.keep_all = keep_all
+        self._interval = 1.0 / pace_fps if pace_fps else 0.0
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0        # Frames publicados por el lector
+        self._taken = 0      # Último frame entregado a quien consume
+        self._ended = False
+        self._running = True
+
+        self.frames = 0      # Frames entregados
+        self.dropped = 0     # Frames leídos y sustituidos antes de entregarse
+        self._started_at = None
+
+        self._thread = threading.Thread(target=self._run, name='capture-reader', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        next_at = time.perf_counter()
+        try:
+            while self._running:
+                ret, frame = self._reader.read()
+                if not ret:
+                    break
+
+                with self._cond:
+                    if self.keep_all:
+                        # Esperar a que se consuma el frame anterior
+                        self._cond.wait_for(lambda: self._seq == self._taken or not self._running)
+                    elif self._seq > self._taken:
+                        self.dropped += 1
+                    self._frame = frame
+                    self._seq += 1
+                    self._cond.notify_all()
+
+                if self._interval:
+                    next_at += self._interval
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+        finally:
+            with self._cond:
+                self._ended = True
+                self._cond.notify_all()
+
+    def isOpened(self):
+        return self._reader.isOpened()
+
+    def read(self, timeout=None):
+        """
+        Siguiente frame no entregado todavía: (True, frame) o (False, None) al
+        terminar. Como cv2.VideoCapture.read, sin timeout espera lo necesario
+        (cámaras lentas en arrancar); con timeout (s) se rinde pasado ese plazo
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > self._taken or self._ended, timeout)
+            if self._seq == self._taken:
+                return False, None
+
+            self._taken = self._seq
+            frame = self._frame
+            self._cond.notify_all()
+
+        if self._started_at is None:
+            self._started_at = time.perf_counter()
+        self.frames += 1
+        return True, frame
+
+    @property
+    def fps(self):
+        """Frames entregados por segundo desde el primero"""
+        if self._started_at is None or self.frames < 2:
+            return 0.0
+        elapsed = time.perf_counter() - self._started_at
+        return (self.frames - 1) / elapsed if elapsed > 0 else 0.0
+
+    def release(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+        self._reader.release()
+
+
+def open_video_source(source=None, realtime=None):
+    """
+    Abre la fuente indicada (por defecto Config.FACE_VIDEO_SOURCE):
+    índice de cámara, archivo de video o directorio de imágenes.
+    Las grabaciones se entregan completas salvo en modo realtime, donde
+    se reproducen a su FPS y se comportan como una cámara.
+    """
+    source = str(Config.FACE_VIDEO_SOURCE if source is None else source)
+    realtime = Config.FACE_REPLAY_REALTIME if realtime is None else realtime
+
+    if source.isdigit():
+        cap = cv2.VideoCapture(int(source))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)  # Resolución reducida para fluidez
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        cap.set(cv2.CAP_PROP_FPS, 30)
+        return ThreadedCapture(cap)
+
+    if os.path.isdir(source):
+        reader = DirectoryReplaySource(source)
+        fps = Config.FACE_REPLAY_FPS
+    else:
+        reader = cv2.VideoCapture(source)
+        fps = reader.get(cv2.CAP_PROP_FPS) or Config.FACE_REPLAY_FPS
+
+    if realtime:
+        return ThreadedCapture(reader, pace_fps=fps)
+    return ThreadedCapture(reader, keep_all=True)
@@ -5,14 +5,15 @@ Genera frases aleatorias en cada verificación para prevenir ataques de replay
 
 import numpy as np
 import sounddevice as sd
-from scipy.signal import butter, filtfilt
 from scipy.spatial.distance import euclidean
 from fastdtw import fastdtw
-import librosa
-import speech_recognition as sr
-import io
-from scipy.io import wavfile
 from config import Config
+from model_manager import model_manager
+from voice_features import VoiceFeatureEngine
+from audio_preprocessing import PreprocessingPipeline, STAGE_LABELS
+from audio_ingestion import AudioDecoder
+from speech_backends import create_speech_backend, speech_backend_chain
+from voice_verification import VoiceVerificationPipeline
 from challenge_generator import ChallengeGenerator
 
 
@@ -35,12 +36,60 @@ class VoiceAuthChallenge:
         self.n_fft = 2048
         self.hop_length = 512
 
+        # Grabaciones del navegador decodificadas en memoria, sin archivos temporales
+        with model_manager.track('audio_decoder', 'load'):
+            self.decoder = AudioDecoder(self.sample_rate, Config.VOICE_AUDIO_DECODER)
+
+        # Preprocesamiento: cada etapa se aplica una sola vez por clip
+        self.preprocessor = PreprocessingPipeline(self.sample_rate)
+
+        # Motor de características: una sola STFT por clip para MFCC, RMS, ZCR y pitch
+        self.features = VoiceFeatureEngine(
+            self.sample_rate,
+            n_mfcc=self.n_mfcc,
+            n_fft=self.n_fft,
+            hop_length=self.hop_length
+        )
+
+        # Reconocimiento de los dígitos del desafío: local por defecto, sin red
+        # (Google mientras no se hayan construido las plantillas de dígitos)
+        chain = speech_backend_chain(Config.VOICE_STT_BACKEND, Config.VOICE_STT_FALLBACK) + [None]
+        self.stt = self._load_speech_backend(chain[0])
+        self.stt_fallback = self._load_speech_backend(chain[1]) if chain[1] else None
+
         # Parámetros de detección de vivacidad
         self.enable_liveness = getattr(Config, 'VOICE_ENABLE_LIVENESS', True)
         self.energy_variance_threshold = getattr(Config, 'VOICE_MIN_ENERGY_VARIANCE', 0.005)
         self.zcr_variance_threshold = getattr(Config, 'VOICE_MIN_ZCR_VARIANCE', 0.0005)
         self.pitch_variance_threshold = getattr(Config, 'VOICE_MIN_PITCH_VARIANCE', 2)
 
+        # Verificación web por etapas concurrentes (desafío y hablante en paralelo)
+        self.verification = VoiceVerificationPipeline(self)
+
+    def warm_up(self):
+        """
+        Extrae características de un segundo de ruido para construir el banco
+        de filtros mel, la DCT y la ventana antes de la primera muestra real
+        """
+        audio = np.random.default_rng(0).normal(0, 0.05, self.sample_rate).astype(np.float32)
+        with model_manager.track('voice_features', 'warmup'):
+            analysis = self.features.analyze(audio)
+            self._extract_speaker_embedding(analysis['mfcc'])
+            self._extract_prosodic_features(audio, analysis)
+
+        for backend in (self.stt, self.stt_fallback):
+            if backend is not None:
+                with model_manager.track(f'stt_{backend.name}', 'warmup'):
+                    backend.warm_up(self.sample_rate)
+
+    def _load_speech_backend(self, name):
+        """Crea un backend de reconocimiento; None si no se pudo cargar (queda en /ready)"""
+        try:
+            with model_manager.track(f'stt_{name}', 'load'):
+                return create_speech_backend(name)
+        except Exception:
+            return None
+
     def generate_challenge(self):
         """
         Genera una frase de desafío aleatoria
@@ -49,73 +98,12 @@ class VoiceAuthChallenge:
         challenge_text, display_format = ChallengeGenerator.generate_challenge(self.challenge_type)
         return challenge_text
     
-    def _apply_bandpass_filter(self, audio, lowcut=300, highcut=3400):
-        """Aplica filtro pasabanda para voz humana"""
-        nyquist = self.sample_rate / 2
-        low = lowcut / nyquist
-        high = highcut / nyquist
-        b, a = butter(4, [low, high], btype='band')
-        filtered = filtfilt(b, a, audio)
-        return filtered
-    
-    def _normalize_audio(self, audio):
-        """Normaliza el audio al rango [-1, 1]"""
-        audio = audio.astype(np.float32)
-        max_val = np.max(np.abs(audio))
-        if max_val > 0:
-            audio = audio / max_val
-        return audio
-    
-    def _remove_silence(self, audio, threshold=0.01):
-        """Elimina silencios del inicio y final con umbral más permisivo"""
-        window_size = int(self.sample_rate * 0.02)
-
-        # Si el audio es muy corto, no procesar
-        if len(audio) < window_size * 2:
-            return audio
-
-        energy = np.array([
-            np.sum(audio[i:i+window_size]**2)
-            for i in range(0, len(audio) - window_size, window_size)
-        ])
-
-        if np.max(energy) > 0:
-            energy = energy / np.max(energy)
-
-        voice_indices = np.where(energy > threshold)[0]
-
-        # Si no hay suficientes índices, retornar audio completo
-        if len(voice_indices) == 0:
-            return audio
-
-        # Añadir margen para no cortar demasiado
-        start_idx = max(0, (voice_indices[0] - 1) * window_size)
-        end_idx = min(len(audio), (voice_indices[-1] + 2) * window_size)
-
-        trimmed_audio = audio[start_idx:end_idx]
-
-        # Asegurar que el audio resultante no sea demasiado corto
-        if len(trimmed_audio) < self.sample_rate * 0.5:  # Al menos 0.5 segundos
-            return audio
-
-        return trimmed_audio
-    
-    def _extract_mfcc_features(self, audio):
-        """Extrae características MFCC + deltas y calcula estadísticas"""
-        mfcc = librosa.feature.mfcc(
-            y=audio,
-            sr=self.sample_rate,
-            n_mfcc=self.n_mfcc,
-            n_fft=self.n_fft,
-            hop_length=self.hop_length
-        )
-
-        mfcc_delta = librosa.feature.delta(mfcc)
-        mfcc_delta2 = librosa.feature.delta(mfcc, order=2)
-
-        features = np.vstack([mfcc, mfcc_delta, mfcc_delta2])
-
-        return features
+    def preprocess(self, audio, on_stage=None):
+        """
+        Normaliza, filtra y recorta silencios, omitiendo las etapas ya
+        registradas en el buffer. Retorna un AudioBuffer
+        """
+        return self.preprocessor.run(audio, on_stage=on_stage)
 
     def _extract_speaker_embedding(self, mfcc_features):
         """
@@ -134,11 +122,10 @@ class VoiceAuthChallenge:
         std = np.std(mfcc_base, axis=1)
 
         # Percentiles para capturar la distribución de las características del hablante
-        percentile_10 = np.percentile(mfcc_base, 10, axis=1)
-        percentile_25 = np.percentile(mfcc_base, 25, axis=1)
-        percentile_50 = np.percentile(mfcc_base, 50, axis=1)
-        percentile_75 = np.percentile(mfcc_base, 75, axis=1)
-        percentile_90 = np.percentile(mfcc_base, 90, axis=1)
+        # (una sola llamada: cada fila se ordena una vez para los cinco)
+        percentile_10, percentile_25, percentile_50, percentile_75, percentile_90 = np.percentile(
+            mfcc_base, [10, 25, 50, 75, 90], axis=1
+        )
 
         # Rango intercuartílico - captura variabilidad
         iqr = percentile_75 - percentile_25
@@ -169,34 +156,14 @@ class VoiceAuthChallenge:
         # Vector de 130 dimensiones (13 * 10)
         return embedding
     
-    def _extract_prosodic_features(self, audio):
-        """Extrae características prosódicas"""
-        rms = librosa.feature.rms(
-            y=audio,
-            frame_length=self.n_fft,
-            hop_length=self.hop_length
-        )[0]
-        
-        zcr = librosa.feature.zero_crossing_rate(
-            audio,
-            frame_length=self.n_fft,
-            hop_length=self.hop_length
-        )[0]
-        
-        try:
-            pitches, magnitudes = librosa.piptrack(
-                y=audio,
-                sr=self.sample_rate,
-                n_fft=self.n_fft,
-                hop_length=self.hop_length
-            )
-            pitch = []
-            for t in range(pitches.shape[1]):
-                index = magnitudes[:, t].argmax()
-                pitch.append(pitches[index, t])
-            pitch = np.array(pitch)
-        except:
-            pitch = np.zeros(len(rms))
+    def _extract_prosodic_features(self, audio, analysis=None):
+        """Extrae características prosódicas (reutiliza el análisis del clip si se pasa)"""
+        if analysis is None:
+            analysis = self.features.analyze(audio, mfcc=False)
+
+        rms = analysis['rms']
+        zcr = analysis['zcr']
+        pitch = analysis['pitch']
         
         return {
             'rms': rms,
@@ -310,67 +277,83 @@ class VoiceAuthChallenge:
             print(f"\n   ⚠️  Error en comparación DTW: {e}")
             return 0.0, float('inf')
 
-    def _transcribe_audio_to_text(self, audio):
+    def _compare_with_sample(self, mfcc_features, speaker_embedding, sample, use_embeddings):
+        """Similitud con una muestra almacenada: embeddings (v2) o DTW sobre MFCC (v1)"""
+        if use_embeddings and 'embedding' in sample:
+            return self._compare_embeddings(speaker_embedding, sample['embedding'])
+        similarity, _ = self._compare_features_dtw(mfcc_features, sample['mfcc'])
+        return similarity
+
+    def _evaluate_similarities(self, similarities):
         """
-        Transcribe audio a texto usando Google Speech Recognition (español)
-        Retorna el texto transcrito o None si falla
+        Decisión multi-capa sobre las similitudes con cada muestra del perfil
+        Retorna (is_match, final_similarity, messages)
         """
-        try:
-            print(f"   🎤 Procesando audio para STT...")
-            print(f"   📊 Longitud del audio: {len(audio)} muestras ({len(audio)/self.sample_rate:.2f}s)")
-            print(f"   📈 Energía RMS: {np.sqrt(np.mean(audio**2)):.6f}")
-
-            # Verificar que el audio no esté vacío o sea silencio
-            audio_energy = np.sqrt(np.mean(audio**2))
-            if audio_energy < 0.001:
-                print("   ⚠️  Audio con energía muy baja (posible silencio)")
-
-            # Convertir numpy array a WAV en memoria
-            wav_io = io.BytesIO()
-
-            # Normalizar audio a int16 para WAV
-            if np.max(np.abs(audio)) > 0:
-                audio_normalized = np.int16(audio / np.max(np.abs(audio)) * 32767)
-            else:
-                print("   ⚠️  Audio vacío o silencio completo")
-                return None
-
-            wavfile.write(wav_io, self.sample_rate, audio_normalized)
-            wav_io.seek(0)
-
-            # Usar SpeechRecognition
-            recognizer = sr.Recognizer()
-
-            # Ajustar parámetros para mejorar reconocimiento
-            recognizer.energy_threshold = 300
-            recognizer.dynamic_energy_threshold = True
-
-            with sr.AudioFile(wav_io) as source:
-                # Ajustar ruido ambiente
-                recognizer.adjust_for_ambient_noise(source, duration=0.5)
-                audio_data = recognizer.record(source)
+        # Usar el promedio de las 3 mejores como similitud final
+        final_similarity = float(np.mean(sorted(similarities, reverse=True)[:3]))
+
+        # Umbrales ajustados para distancia euclidiana (rango 30-62% vs antiguo 80-99%)
+        # Usuario legítimo: ~58-62%, impostor: ~30%
+        high_similarity_45 = sum(1 for s in similarities if s >= 0.45)  # Ajustado de 80% a 45%
+        high_similarity_50 = sum(1 for s in similarities if s >= 0.50)  # Ajustado de 85% a 50%
+        std_dev = np.std(similarities)
+
+        check1 = final_similarity >= self.similarity_threshold
+        check2 = high_similarity_45 >= 4  # Al menos 4 de 5 muestras >= 45%
+        check3 = high_similarity_50 >= 3  # Al menos 3 de 5 muestras >= 50%
+        check4 = std_dev < 0.12  # Relajado de 0.08 a 0.12 para distancia euclidiana
+
+        messages = [
+            f"Promedio general: {np.mean(similarities)*100:.2f}%",
+            f"Máxima: {np.max(similarities)*100:.2f}%",
+            f"Mínima: {np.min(similarities)*100:.2f}%",
+            f"[{'✓' if check1 else '❌'}] Similitud promedio top-3 >= {self.similarity_threshold*100:.0f}%: {final_similarity*100:.2f}%",
+            f"[{'✓' if check2 else '❌'}] Al menos 4 de 5 muestras >= 45%: {high_similarity_45}/5",
+            f"[{'✓' if check3 else '❌'}] Al menos 3 de 5 muestras >= 50%: {high_similarity_50}/5",
+            f"[{'✓' if check4 else '❌'}] Alta consistencia (std < 0.12): {std_dev:.3f}",
+        ]
+        return check1 and check2 and check3 and check4, final_similarity, messages
+
+    def _transcribe_audio_to_text(self, audio, cancel=None):
+        """
+        Transcribe audio a texto con el backend configurado (VOICE_STT_BACKEND)
+        y, si no lo entiende, con el alternativo (VOICE_STT_FALLBACK).
+        Retorna el texto transcrito o None si falla. Si el evento cancel se
+        activa (otra etapa ya rechazó el audio) no se prueba el alternativo
+        """
+        print(f"   🎤 Procesando audio para STT...")
+        print(f"   📊 Longitud del audio: {len(audio)} muestras ({len(audio)/self.sample_rate:.2f}s)")
+
+        # Verificar que el audio no esté vacío o sea silencio
+        audio_energy = np.sqrt(np.mean(audio**2))
+        print(f"   📈 Energía RMS: {audio_energy:.6f}")
+        if audio_energy < 0.001:
+            print("   ⚠️  Audio con energía muy baja (posible silencio)")
+        if np.max(np.abs(audio)) == 0:
+            print("   ⚠️  Audio vacío o silencio completo")
+            return None
 
-            print("   🌐 Enviando audio a Google Speech Recognition...")
+        backends = [backend for backend in (self.stt, self.stt_fallback) if backend is not None]
+        if not backends:
+            print("   ⚠️  No hay ningún reconocedor de voz disponible")
+            return None
 
-            # Reconocer con Google Speech Recognition en español
-            text = recognizer.recognize_google(audio_data, language='es-ES')
+        for backend in backends:
+            if cancel is not None and cancel.is_set():
+                return None
+            try:
+                text = backend.transcribe(audio, self.sample_rate)
+            except Exception as e:
+                print(f"   ⚠️  Error inesperado en transcripción ({backend.name}): {e}")
+                continue
 
-            print(f"   ✅ Transcripción exitosa: \"{text}\"")
-            return text.lower().strip()
+            if text:
+                print(f"   ✅ Transcripción exitosa ({backend.name}): \"{text}\"")
+                return text.lower().strip()
+            print(f"   ⚠️  El reconocedor {backend.name} no pudo entender el audio")
 
-        except sr.UnknownValueError:
-            print("   ⚠️  Google Speech Recognition no pudo entender el audio")
-            print("   💡 Posibles causas: audio muy bajo, ruido excesivo, o idioma no detectado")
-            return None
-        except sr.RequestError as e:
-            print(f"   ⚠️  Error del servicio de reconocimiento de Google: {e}")
-            print("   💡 Verifica conexión a internet o límites de API")
-            return None
-        except Exception as e:
-            print(f"   ⚠️  Error inesperado en transcripción: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+        print("   💡 Posibles causas: audio muy bajo, ruido excesivo, o idioma no detectado")
+        return None
 
     def _extract_numbers_from_spanish_text(self, text):
         """
@@ -409,7 +392,7 @@ class VoiceAuthChallenge:
 
         return ''.join(digits)
 
-    def _validate_challenge_response(self, audio, expected_challenge):
+    def _validate_challenge_response(self, audio, expected_challenge, cancel=None):
         """
         Valida que el usuario haya dicho los números correctos del desafío
         Retorna (is_valid, transcribed_text, extracted_numbers)
@@ -419,7 +402,7 @@ class VoiceAuthChallenge:
         print(f"{'─'*60}")
 
         # Transcribir audio
-        transcribed_text = self._transcribe_audio_to_text(audio)
+        transcribed_text = self._transcribe_audio_to_text(audio, cancel)
 
         if transcribed_text is None:
             print("   ❌ No se pudo transcribir el audio")
@@ -476,17 +459,17 @@ class VoiceAuthChallenge:
         return recording.flatten()
     
     def _process_audio(self, audio):
-        """Pipeline completo de procesamiento"""
+        """
+        Pipeline completo de procesamiento. Acepta audio crudo o un AudioBuffer
+        ya preprocesado: las etapas registradas no se repiten
+        """
         print("   🔄 Procesando audio...")
 
-        audio = self._normalize_audio(audio)
-        print("      ✓ Normalizado")
-
-        audio = self._apply_bandpass_filter(audio)
-        print("      ✓ Filtrado")
-
-        audio = self._remove_silence(audio)
-        print(f"      ✓ Silencios eliminados (duración: {len(audio)/self.sample_rate:.2f}s)")
+        buffer = self.preprocess(
+            audio,
+            on_stage=lambda stage, buf: print(f"      ✓ {STAGE_LABELS[stage]} (duración: {buf.duration:.2f}s)")
+        )
+        audio = buffer.samples
 
         # Reducir umbral mínimo a 0.5 segundos (antes era 1.0)
         min_length = self.sample_rate * 0.5
@@ -494,14 +477,16 @@ class VoiceAuthChallenge:
             print(f"      ⚠️  Audio muy corto: {len(audio)/self.sample_rate:.2f}s (mínimo: 0.5s)")
             return None, None, None
 
-        mfcc_features = self._extract_mfcc_features(audio)
+        # Un único espectrograma para MFCC y características prosódicas
+        analysis = self.features.analyze(audio)
+        mfcc_features = analysis['mfcc']
         print(f"      ✓ MFCC extraídos ({mfcc_features.shape})")
 
         # Extraer embedding del hablante (independiente del texto)
         speaker_embedding = self._extract_speaker_embedding(mfcc_features)
         print(f"      ✓ Embedding del hablante extraído ({speaker_embedding.shape[0]} dims)")
 
-        prosodic_features = self._extract_prosodic_features(audio)
+        prosodic_features = self._extract_prosodic_features(audio, analysis)
         print("      ✓ Características prosódicas extraídas")
 
         return mfcc_features, speaker_embedding, prosodic_features
@@ -680,15 +665,7 @@ class VoiceAuthChallenge:
         use_embeddings = version == 'challenge-response-v2'
 
         for idx, sample in enumerate(stored_samples):
-            if use_embeddings and 'embedding' in sample:
-                # Comparar embeddings usando distancia coseno
-                stored_embedding = sample['embedding']
-                similarity = self._compare_embeddings(speaker_embedding, stored_embedding)
-            else:
-                # Fallback a comparación DTW de MFCC
-                stored_mfcc = sample['mfcc']
-                similarity, _ = self._compare_features_dtw(mfcc_features, stored_mfcc)
-
+            similarity = self._compare_with_sample(mfcc_features, speaker_embedding, sample, use_embeddings)
             similarities.append(similarity)
             print(f"   Muestra {idx+1}: {similarity*100:.2f}%")
         
@@ -0,0 +1,190 @@
+"""
+Motor de características de voz sobre un único espectrograma por clip
+MFCC (con deltas), RMS, ZCR y pitch se derivan del mismo enmarcado y la misma
+STFT, con el banco de filtros mel, la DCT y la ventana cacheados por
+configuración. Reproduce los valores de librosa (mfcc, delta, rms,
+zero_crossing_rate y piptrack con sus parámetros por defecto); ver
+benchmark_voice_features.py.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.fft import dct
+from scipy.signal import get_window, savgol_filter
+
+
+def _readonly(array):
+    array.setflags(write=False)
+    return array
+
+
+def _hz_to_mel(frequencies):
+    """Escala mel de Slaney: lineal hasta 1 kHz y logarítmica por encima"""
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = frequencies / f_sp
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_t = frequencies >= min_log_hz
+    mels[log_t] = min_log_mel + np.log(frequencies[log_t] / min_log_hz) / logstep
+    return mels
+
+
+def _mel_to_hz(mels):
+    mels = np.asarray(mels, dtype=np.float64)
+    f_sp = 200.0 / 3
+    freqs = f_sp * mels
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    log_t = mels >= min_log_mel
+    freqs[log_t] = min_log_hz * np.exp(logstep * (mels[log_t] - min_log_mel))
+    return freqs
+
+
+@lru_cache(maxsize=8)
+def mel_filterbank(sample_rate, n_fft, n_mels, fmin=0.0, fmax=None):
+    """Banco de filtros mel triangular normalizado (Slaney), (n_mels, 1 + n_fft/2)"""
+    fmax = sample_rate / 2.0 if fmax is None else fmax
+    fft_freqs = np.fft.rfftfreq(n=n_fft, d=1.0 / sample_rate)
+    min_mel, max_mel = _hz_to_mel([fmin, fmax])
+    mel_f = _mel_to_hz(np.linspace(min_mel, max_mel, n_mels + 2))
+
+    fdiff = np.diff(mel_f)
+    ramps = np.subtract.outer(mel_f, fft_freqs)
+    lower = -ramps[:-2] / fdiff[:-1, None]
+    upper = ramps[2:] / fdiff[1:, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+
+    enorm = 2.0 / (mel_f[2:n_mels + 2] - mel_f[:n_mels])
+    weights *= enorm[:, None]
+    return _readonly(weights.astype(np.float32))
+
+
+@lru_cache(maxsize=8)
+def dct_matrix(n_mels, n_mfcc):
+    """Filas de la DCT-II ortonormal: mfcc = matriz @ log-mel"""
+    return _readonly(dct(np.eye(n_mels), type=2, norm='ortho', axis=0)[:n_mfcc])
+
+
+@lru_cache(maxsize=8)
+def hann_window(n_fft):
+    return _readonly(get_window('hann', n_fft, fftbins=True))
+
+
+def _frame(signal, frame_length, hop_length):
+    """Vista (frames, frame_length) sin copia"""
+    windows = np.lib.stride_tricks.sliding_window_view(signal, frame_length)
+    return windows[::hop_length]
+
+
+class VoiceFeatureEngine:
+    """Extrae todas las características de un clip con una sola STFT"""
+
+    def __init__(self, sample_rate, n_mfcc=13, n_fft=2048, hop_length=512, n_mels=128,
+                 fmin_pitch=150.0, fmax_pitch=4000.0, pitch_threshold=0.1):
+        self.sample_rate = sample_rate
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.fmin_pitch = fmin_pitch
+        self.fmax_pitch = min(fmax_pitch, sample_rate / 2.0)
+        self.pitch_threshold = pitch_threshold
+
+    def spectrogram(self, audio):
+        """
+        Enmarcado centrado (relleno con ceros) y STFT con ventana Hann.
+        Retorna {'frames': (T, n_fft), 'magnitude': (F, T), 'power': (F, T)}
+        """
+        pad = self.n_fft // 2
+        frames = _frame(np.pad(audio, pad, mode='constant'), self.n_fft, self.hop_length)
+
+        complex_dtype = np.complex64 if audio.dtype == np.float32 else np.complex128
+        stft = np.fft.rfft(frames * hann_window(self.n_fft), axis=1).astype(complex_dtype, copy=False).T
+        magnitude = np.abs(stft)
+        return {'frames': frames, 'magnitude': magnitude, 'power': magnitude ** 2}
+
+    def mfcc(self, spectrogram):
+        """MFCC + deltas + delta-deltas, (3 * n_mfcc, T)"""
+        mel_basis = mel_filterbank(self.sample_rate, self.n_fft, self.n_mels)
+        mel = mel_basis @ spectrogram['power']
+
+        # Potencia a dB (ref=1, amin=1e-10, top_db=80)
+        log_mel = 10.0 * np.log10(np.maximum(1e-10, mel))
+        log_mel = np.maximum(log_mel, log_mel.max() - 80.0)
+
+        mfcc = dct_matrix(self.n_mels, self.n_mfcc) @ log_mel
+        delta = savgol_filter(mfcc, 9, deriv=1, polyorder=1, axis=-1, mode='interp')
+        delta2 = savgol_filter(mfcc, 9, deriv=2, polyorder=2, axis=-1, mode='interp')
+        return np.vstack([mfcc, delta, delta2])
+
+    def rms(self, spectrogram):
+        """Energía RMS por frame sobre el mismo enmarcado de la STFT"""
+        return np.sqrt(np.mean(np.square(spectrogram['frames'], dtype=np.float32), axis=1))
+
+    def zcr(self, audio):
+        """
+        Tasa de cruces por cero por frame (relleno replicando los bordes):
+        los cruces se cuentan una vez sobre la señal y se suman por frame con
+        una suma acumulada en vez de recorrer cada frame
+        """
+        pad = self.n_fft // 2
+        padded = np.pad(audio, pad, mode='edge')
+        padded = np.where(np.abs(padded) <= 1e-10, 0, padded)
+
+        signs = np.signbit(padded)
+        crossings = np.concatenate([[0], np.cumsum(signs[1:] != signs[:-1])])
+
+        # Cruces internos de cada frame: entre las muestras start..start+n_fft-1
+        starts = np.arange(0, len(padded) - self.n_fft + 1, self.hop_length)
+        counts = crossings[starts + self.n_fft - 1] - crossings[starts]
+        return counts / self.n_fft
+
+    def pitch(self, spectrogram):
+        """
+        Pitch por frame: pico del espectro (interpolación parabólica) de
+        mayor magnitud entre fmin y fmax, como piptrack + argmax por frame
+        """
+        S = spectrogram['magnitude']
+        n_bins, n_frames = S.shape
+
+        # Interpolación parabólica de cada bin con sus vecinos
+        a = np.zeros_like(S)
+        b = np.zeros_like(S)
+        a[1:-1] = S[2:] + S[:-2] - 2 * S[1:-1]
+        b[1:-1] = (S[2:] - S[:-2]) / 2
+        shift = np.zeros_like(S)
+        usable = np.abs(b) < np.abs(a)
+        shift[usable] = -b[usable] / a[usable]
+        dskew = 0.5 * np.gradient(S, axis=0) * shift
+
+        # Máximos locales por encima del umbral relativo, dentro del rango de voz
+        fft_freqs = np.fft.rfftfreq(n=self.n_fft, d=1.0 / self.sample_rate)
+        freq_mask = (self.fmin_pitch <= fft_freqs) & (fft_freqs < self.fmax_pitch)
+        masked = S * (S > self.pitch_threshold * S.max(axis=0, keepdims=True))
+        padded = np.pad(masked, [(1, 1), (0, 0)], mode='edge')
+        peaks = (masked > padded[:-2]) & (masked >= padded[2:]) & freq_mask[:, None]
+
+        magnitudes = np.where(peaks, S + dskew, 0)
+        best = magnitudes.argmax(axis=0)
+        columns = np.arange(n_frames)
+        return np.where(
+            peaks[best, columns],
+            (best + shift[best, columns]) * float(self.sample_rate) / self.n_fft,
+            0
+        ).astype(S.dtype)
+
+    def analyze(self, audio, mfcc=True):
+        """Todas las características del clip a partir de un único espectrograma"""
+        spectrogram = self.spectrogram(audio)
+        features = {
+            'rms': self.rms(spectrogram),
+            'zcr': self.zcr(audio),
+            'pitch': self.pitch(spectrogram),
+        }
+        if mfcc:
+            features['mfcc'] = self.mfcc(spectrogram)
+        return features
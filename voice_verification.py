@@ -0,0 +1,208 @@
+"""
+Verificación de voz por etapas concurrentes
+El reconocimiento de los dígitos del desafío y la extracción de
+características del hablante se ejecutan en paralelo: la latencia es la de la
+rama más lenta y no la suma de todas. La primera etapa que falla (energía,
+desafío, vivacidad o hablante) decide el resultado sin esperar al resto, que
+se abandona en su siguiente punto de control.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from audio_preprocessing import STAGE_LABELS as PREPROCESSING_LABELS
+
+# Etapas de la verificación y su texto para el cliente
+STAGES = ('energy', 'challenge', 'liveness', 'speaker')
+STAGE_LABELS = {
+    'energy': "Audio con voz",
+    'challenge': "Números del desafío",
+    'liveness': "Vivacidad",
+    'speaker': "Identidad del hablante",
+}
+
+
+class VerificationCancelled(Exception):
+    """Otra etapa ya decidió el resultado de la verificación"""
+
+
+class VoiceVerificationPipeline:
+    """
+    Ejecuta las dos ramas de una verificación (desafío y hablante) y entrega
+    cada etapa en cuanto termina. Cada rama tiene su propio pool: una
+    transcripción de red lenta o abandonada no deja sin hilos a la extracción
+    de características de otras verificaciones
+    """
+
+    def __init__(self, voice_auth, max_workers=None, timeout=None):
+        self.voice_auth = voice_auth
+        self.timeout = timeout or Config.VOICE_VERIFICATION_TIMEOUT
+        max_workers = max_workers or Config.VOICE_VERIFICATION_WORKERS
+        self._challenge_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                      thread_name_prefix='voice-challenge')
+        self._speaker_executor = ThreadPoolExecutor(max_workers=max_workers,
+                                                    thread_name_prefix='voice-speaker')
+
+    def run(self, audio, profile, expected_challenge=None, on_stage=None):
+        """
+        Verifica el audio contra el perfil almacenado. on_stage(resultado) se
+        llama en el hilo de quien invoca cada vez que termina una etapa, así
+        puede emitir por Socket.IO. Retorna un dict con success, stage (la
+        etapa que rechazó el audio o None), message, similarity y elapsed
+        """
+        started = time.perf_counter()
+        results = queue.Queue()
+        cancel = threading.Event()
+
+        def report(stage, passed, message, details=(), **data):
+            # Punto de control: si otra etapa ya falló, esta rama termina aquí
+            if cancel.is_set():
+                raise VerificationCancelled()
+            results.put(dict(stage=stage, label=STAGE_LABELS[stage], passed=bool(passed),
+                             message=message, details=list(details), **data))
+
+        def guarded(branch, *args):
+            try:
+                branch(report, cancel, *args)
+            except VerificationCancelled:
+                pass
+            except Exception as e:
+                results.put({'stage': None, 'error': e})
+
+        futures = [
+            self._challenge_executor.submit(guarded, self._challenge_branch, audio, expected_challenge),
+            self._speaker_executor.submit(guarded, self._speaker_branch, audio, profile),
+        ]
+
+        pending = set(STAGES)
+        similarity = None
+        try:
+            while pending:
+                remaining = self.timeout - (time.perf_counter() - started)
+                try:
+                    result = results.get(timeout=max(remaining, 0.0))
+                except queue.Empty:
+                    return self._outcome(False, 'timeout', "Tiempo de verificación agotado", started)
+
+                if result.get('error') is not None:
+                    raise result['error']
+
+                pending.discard(result['stage'])
+                result['completed'] = len(STAGES) - len(pending)
+                result['total'] = len(STAGES)
+                if on_stage:
+                    on_stage(result)
+
+                if not result['passed']:
+                    return self._outcome(False, result['stage'], result['message'], started,
+                                         result.get('similarity'))
+                similarity = result.get('similarity', similarity)
+
+            return self._outcome(True, None, "Verificación exitosa", started, similarity)
+        finally:
+            # Las ramas aún en curso se detienen en su siguiente punto de control
+            cancel.set()
+            for future in futures:
+                future.cancel()
+
+    @staticmethod
+    def _outcome(success, stage, message, started, similarity=None):
+        return {
+            'success': success,
+            'stage': stage,
+            'message': message,
+            'similarity': similarity,
+            'elapsed': time.perf_counter() - started,
+        }
+
+    def _challenge_branch(self, report, cancel, audio, expected_challenge):
+        """Rama de red/CPU ligera: transcripción y comparación de los dígitos"""
+        if expected_challenge is None:
+            report('challenge', True, "No se recibió desafío - validación de números omitida", skipped=True)
+            return
+
+        is_valid, transcription, extracted_nums = self.voice_auth._validate_challenge_response(
+            audio, expected_challenge, cancel)
+
+        details = [f"Desafío esperado: {expected_challenge}"]
+        if transcription:
+            details += [f"Transcripción: \"{transcription}\"", f"Números extraídos: {extracted_nums}"]
+
+        if is_valid:
+            report('challenge', True, "Números validados correctamente", details)
+        else:
+            report('challenge', False,
+                   f'Los números pronunciados no coinciden con el desafío. '
+                   f'Transcripción: "{transcription if transcription else "No detectada"}"',
+                   details)
+
+    def _speaker_branch(self, report, cancel, audio, profile):
+        """Rama de CPU: energía, características, vivacidad y comparación con el perfil"""
+        voice_auth = self.voice_auth
+
+        # Puerta de energía: silencio o volumen demasiado bajo
+        rms = float(np.sqrt(np.mean(np.square(audio)))) if len(audio) else 0.0
+        details = [f"Energía RMS: {rms:.6f}"]
+        if rms < Config.VOICE_MIN_RMS:
+            report('energy', False, "No se detectó voz en la grabación (silencio o volumen muy bajo)", details)
+            return
+
+        # Normalizar, filtrar y recortar silencios una sola vez (el buffer registra
+        # las etapas aplicadas y _process_audio no las repite)
+        buffer = voice_auth.preprocess(
+            audio,
+            on_stage=lambda stage, buf: details.append(f"{PREPROCESSING_LABELS[stage]}: {buf.duration:.2f}s")
+        )
+        mfcc_features, speaker_embedding, prosodic_features = voice_auth._process_audio(buffer)
+        if mfcc_features is None:
+            report('energy', False, "Audio muy corto o inválido", details)
+            return
+
+        details += [f"MFCC features extraídos: {mfcc_features.shape}",
+                    f"Speaker embedding extraído: {speaker_embedding.shape}"]
+        report('energy', True, f"Voz detectada ({buffer.duration:.2f}s)", details)
+
+        if voice_auth.enable_liveness:
+            is_live, confidence, messages = voice_auth._check_liveness(prosodic_features)
+            details = [f"Confianza: {confidence*100:.1f}%"] + messages
+            if not is_live:
+                report('liveness', False,
+                       f'Detección de vivacidad falló - posible audio sintético o grabación '
+                       f'(confianza: {confidence*100:.1f}%)', details)
+                return
+            report('liveness', True, "Voz en vivo", details)
+        else:
+            report('liveness', True, "Verificación de vivacidad DESHABILITADA", skipped=True)
+
+        version = profile.get('version', 'unknown')
+        stored_samples = profile.get('samples', [])
+        use_embeddings = version == 'challenge-response-v2'
+        details = [f"Versión del perfil: {version}",
+                   f"Método de comparación: {'Speaker Embeddings' if use_embeddings else 'DTW sobre MFCC'}"]
+
+        similarities = []
+        for idx, sample in enumerate(stored_samples):
+            # DTW sobre MFCC (perfiles v1) es costoso: comprobar entre muestras
+            if cancel.is_set():
+                raise VerificationCancelled()
+            similarity = voice_auth._compare_with_sample(mfcc_features, speaker_embedding, sample, use_embeddings)
+            similarities.append(similarity)
+            details.append(f"Muestra {idx+1}: {similarity*100:.2f}%")
+
+        if not similarities:
+            report('speaker', False, "Error en comparación de voz", details)
+            return
+
+        is_match, final_similarity, messages = voice_auth._evaluate_similarities(similarities)
+        details += messages
+        if is_match:
+            report('speaker', True, f"Identidad confirmada ({final_similarity*100:.2f}%)", details,
+                   similarity=final_similarity)
+        else:
+            report('speaker', False, f"Similitud insuficiente ({final_similarity*100:.2f}%)", details,
+                   similarity=final_similarity)